@@ -0,0 +1,15 @@
+"""
+回放录制的 HTTP 响应，参见 idhagnbot.http_replay。
+
+python scripts/http_replay.py <录制目录> [--latency 秒] [--failure-rate 比例]
+"""
+
+import nonebot
+
+# 导入 idhagnbot 包时会用到 NoneBot 的驱动器，必须在导入之前初始化
+nonebot.init()
+
+from idhagnbot.http_replay import main
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,15 @@
+"""
+比较静态图编码格式的大小和耗时，参见 idhagnbot.image.benchmark。
+
+python scripts/image_benchmark.py [图片文件...] [--adapter 适配器]
+"""
+
+import nonebot
+
+# 导入 idhagnbot 包时会用到 NoneBot 的驱动器，必须在导入之前初始化
+nonebot.init()
+
+from idhagnbot.image.benchmark import main
+
+if __name__ == "__main__":
+  main()
@@ -1,24 +1,51 @@
-from collections.abc import Awaitable, Callable, Iterable, Mapping
-from contextlib import AbstractAsyncContextManager, AbstractContextManager
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable, Hashable, Iterable, Mapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import AbstractAsyncContextManager, AbstractContextManager, nullcontext
 from dataclasses import dataclass
+from functools import partial
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 from types import TracebackType
-from typing import Any, Generic, Literal, TypeVar, cast, overload
+from typing import Any, ClassVar, Generic, Literal, TypeVar, cast, overload
 
 import anyio
+import anyio.from_thread
+import anyio.lowlevel
 import nonebot
 from anyio.to_thread import run_sync
 from nonebot import logger
+from PIL import Image
+from pydantic import BaseModel, Field
 from typing_extensions import override
 
+from idhagnbot.cache import LRUCache
+from idhagnbot.config import SharedConfig
+
 __all__ = [
   "AsyncContextWrapper",
+  "FairLimiter",
+  "Limit",
+  "SharedImage",
+  "SingleFlight",
+  "SingleFlightStats",
   "background_exception_handler",
+  "before_process_fork",
   "create_background_task",
   "first",
   "first_success",
   "gather",
   "gather_map",
   "gather_seq",
+  "get_limiter",
+  "process_initializer",
+  "run_process",
 ]
 _T = TypeVar("_T")
 _T1 = TypeVar("_T1")
@@ -27,6 +54,14 @@ _T3 = TypeVar("_T3")
 _T4 = TypeVar("_T4")
 _T5 = TypeVar("_T5")
 _T6 = TypeVar("_T6")
+
+
+class Config(BaseModel):
+  process_workers: int = 0
+  limits: dict[str, int] = Field(default_factory=dict)
+
+
+CONFIG = SharedConfig("asyncio", Config)
 _driver = nonebot.get_driver()
 BackgroundExceptionHandler = Callable[[Exception], Awaitable[None]]
 TBackgroundExceptionHandler = TypeVar(
@@ -59,12 +94,184 @@ def background_exception_handler(func: TBackgroundExceptionHandler) -> TBackgrou
   return func
 
 
+class FairLimiter:
+  """
+  具名的共享并发限制器。等待中的任务按键（例如群号或域名）分组，释放名额时在各组之间轮流分配，
+  防止某一个键的突发请求占满名额、饿死其他键。总名额可以被配置文件中 limits 的同名项覆盖。
+  """
+
+  all: ClassVar[dict[str, "FairLimiter"]] = {}
+  """所有已创建的限制器，用于统计。"""
+
+  def __init__(self, name: str, total: int) -> None:
+    """
+    创建限制器，通常应该使用 get_limiter 获取共享的限制器。
+
+    :param name: 限制器名称，也是配置文件中 limits 的键。
+    :param total: 默认总名额。
+    """
+    self.__name = name
+    self.__default_total = total
+    self.__total = total
+    self.__borrowed = 0
+    self.__waiters = OrderedDict[Hashable, deque[anyio.Event]]()
+    self.all[name] = self
+
+  @property
+  def name(self) -> str:
+    return self.__name
+
+  @property
+  def default_total(self) -> int:
+    return self.__default_total
+
+  @property
+  def total(self) -> int:
+    return self.__total
+
+  @total.setter
+  def total(self, value: int) -> None:
+    self.__total = value
+    while self.__borrowed < self.__total and self.__waiters:
+      self.__borrowed += 1
+      self.__wake_next()
+
+  @property
+  def borrowed(self) -> int:
+    """正在使用的名额数。"""
+    return self.__borrowed
+
+  @property
+  def waiting(self) -> int:
+    """正在等待的任务数。"""
+    return sum(len(queue) for queue in self.__waiters.values())
+
+  def waiting_by_key(self) -> dict[Hashable, int]:
+    """
+    按键统计正在等待的任务数。
+
+    :return: 键到等待任务数的字典。
+    """
+    return {key: len(queue) for key, queue in self.__waiters.items()}
+
+  async def acquire(self, key: Hashable = None) -> None:
+    """
+    获取一个名额，没有空闲名额时等待。
+
+    :param key: 公平分配使用的键。
+    """
+    CONFIG()  # 触发配置的重新加载，更新总名额
+    if self.__borrowed < self.__total and not self.__waiters:
+      self.__borrowed += 1
+      return
+    event = anyio.Event()
+    self.__waiters.setdefault(key, deque()).append(event)
+    try:
+      await event.wait()
+    except BaseException:
+      if event.is_set():
+        # 名额已经转交给当前任务，但任务被取消了，转交给下一个
+        self.release()
+      else:
+        queue = self.__waiters[key]
+        queue.remove(event)
+        if not queue:
+          del self.__waiters[key]
+      raise
+
+  def release(self) -> None:
+    """归还一个名额，如果有任务在等待则直接转交给它。"""
+    if self.__borrowed > self.__total or not self.__waiters:
+      self.__borrowed -= 1
+    else:
+      self.__wake_next()
+
+  def __wake_next(self) -> None:
+    key, queue = next(iter(self.__waiters.items()))
+    event = queue.popleft()
+    # 把当前键移到末尾，实现各键之间的轮转
+    del self.__waiters[key]
+    if queue:
+      self.__waiters[key] = queue
+    event.set()
+
+  def __call__(self, key: Hashable) -> "FairLimiterKey":
+    """
+    绑定公平分配使用的键，返回可重复使用的异步上下文管理器。
+
+    :param key: 键。
+    :return: 上下文管理器。
+    """
+    return FairLimiterKey(self, key)
+
+  async def __aenter__(self) -> None:
+    await self.acquire()
+
+  async def __aexit__(
+    self,
+    exc_type: type[BaseException] | None,
+    exc_value: BaseException | None,
+    traceback: TracebackType | None,
+  ) -> None:
+    self.release()
+
+
+@dataclass(frozen=True)
+class FairLimiterKey:
+  limiter: FairLimiter
+  key: Hashable
+
+  async def __aenter__(self) -> None:
+    await self.limiter.acquire(self.key)
+
+  async def __aexit__(
+    self,
+    exc_type: type[BaseException] | None,
+    exc_value: BaseException | None,
+    traceback: TracebackType | None,
+  ) -> None:
+    self.limiter.release()
+
+
+Limit = int | anyio.CapacityLimiter | FairLimiter | FairLimiterKey
+
+
+def get_limiter(name: str, total: int) -> FairLimiter:
+  """
+  获取共享的具名限制器，不存在时创建。
+
+  :param name: 限制器名称。
+  :param total: 默认总名额，配置文件中 limits 的同名项优先。
+  :return: 限制器。
+  """
+  if limiter := FairLimiter.all.get(name):
+    return limiter
+  limiter = FairLimiter(name, total)
+  limiter.total = CONFIG().limits.get(name, total)
+  return limiter
+
+
+@CONFIG.onload
+def _(prev: Config | None, curr: Config) -> None:
+  for limiter in FairLimiter.all.values():
+    limiter.total = curr.limits.get(limiter.name, limiter.default_total)
+
+
+def _limit_context(limit: Limit | None) -> AbstractAsyncContextManager[Any]:
+  if limit is None:
+    return nullcontext()
+  if isinstance(limit, int):
+    return anyio.CapacityLimiter(limit)
+  return cast("AbstractAsyncContextManager[Any]", limit)
+
+
 @overload
 async def gather(
   coro_or_future1: Awaitable[_T1],
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1]: ...
 @overload
 async def gather(
@@ -73,6 +280,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1, _T2]: ...
 @overload
 async def gather(
@@ -82,6 +290,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1, _T2, _T3]: ...
 @overload
 async def gather(
@@ -92,6 +301,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1, _T2, _T3, _T4]: ...
 @overload
 async def gather(
@@ -103,6 +313,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1, _T2, _T3, _T4, _T5]: ...
 @overload
 async def gather(
@@ -115,11 +326,13 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T1, _T2, _T3, _T4, _T5, _T6]: ...
 @overload
 async def gather(
   *coros: Awaitable[_T],
   return_exceptions: Literal[False] = False,
+  limit: Limit | None = None,
 ) -> tuple[_T, ...]: ...
 @overload
 async def gather(
@@ -127,6 +340,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[_T1 | BaseException]: ...
 @overload
 async def gather(
@@ -135,6 +349,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[
   _T1 | BaseException,
   _T2 | BaseException,
@@ -147,6 +362,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[
   _T1 | BaseException,
   _T2 | BaseException,
@@ -161,6 +377,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[
   _T1 | BaseException,
   _T2 | BaseException,
@@ -177,6 +394,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[
   _T1 | BaseException,
   _T2 | BaseException,
@@ -195,6 +413,7 @@ async def gather(
   /,
   *,
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[
   _T1 | BaseException,
   _T2 | BaseException,
@@ -207,14 +426,17 @@ async def gather(
 async def gather(
   *coros: Awaitable[_T],
   return_exceptions: Literal[True],
+  limit: Limit | None = None,
 ) -> tuple[_T | BaseException, ...]: ...
 async def gather(
   *coros: Awaitable[_T],
   return_exceptions: bool = False,
+  limit: Limit | None = None,
 ) -> tuple[_T, ...] | tuple[_T | BaseException, ...]:
   async def wrapper(i: int, coro: Awaitable[_T]) -> None:
     try:
-      results[i] = await coro
+      async with context:
+        results[i] = await coro
     except BaseException as e:
       if return_exceptions:
         results[i] = e
@@ -222,6 +444,7 @@ async def gather(
         raise
 
   results: list[_T | BaseException | None] = [None for _ in coros]
+  context = _limit_context(limit)
 
   async with anyio.create_task_group() as tg:
     for i, coro in enumerate(coros):
@@ -234,36 +457,49 @@ async def gather(
 async def gather_seq(
   coros: Iterable[Awaitable[_T]],
   return_exceptions: Literal[False] = False,
+  *,
+  limit: Limit | None = None,
 ) -> tuple[_T, ...]: ...
 @overload
 async def gather_seq(
   coros: Iterable[Awaitable[_T]],
   return_exceptions: Literal[True],
+  *,
+  limit: Limit | None = None,
 ) -> tuple[_T, ...]: ...
 async def gather_seq(
   coros: Iterable[Awaitable[_T]],
   return_exceptions: bool = False,
+  *,
+  limit: Limit | None = None,
 ) -> tuple[_T, ...] | tuple[_T | BaseException, ...]:
-  return await gather(*coros, return_exceptions=return_exceptions)  # ty:ignore[no-matching-overload]
+  return await gather(*coros, return_exceptions=return_exceptions, limit=limit)  # ty:ignore[no-matching-overload]
 
 
 @overload
 async def gather_map(
   coros: Mapping[_T1, Awaitable[_T2]],
   return_exceptions: Literal[False] = False,
+  *,
+  limit: Limit | None = None,
 ) -> dict[_T1, _T2]: ...
 @overload
 async def gather_map(
   coros: Mapping[_T1, Awaitable[_T2]],
   return_exceptions: Literal[True],
+  *,
+  limit: Limit | None = None,
 ) -> dict[_T1, _T2 | BaseException]: ...
 async def gather_map(
   coros: Mapping[_T1, Awaitable[_T2]],
   return_exceptions: bool = False,
+  *,
+  limit: Limit | None = None,
 ) -> dict[_T1, _T2] | dict[_T1, _T2 | BaseException]:
   async def wrapper(k: _T1, coro: Awaitable[_T2]) -> None:
     try:
-      results[k] = await coro
+      async with context:
+        results[k] = await coro
     except BaseException as e:
       if return_exceptions:
         results[k] = e
@@ -271,6 +507,7 @@ async def gather_map(
         raise
 
   results: dict[_T1, _T2 | BaseException | None] = dict.fromkeys(coros)
+  context = _limit_context(limit)
 
   async with anyio.create_task_group() as tg:
     for k, coro in coros.items():
@@ -380,3 +617,393 @@ async def first_success(*coros: Awaitable[_T]) -> _T | None:
     raise BaseExceptionGroup("所有任务都失败了", exceptions)
 
   return result.value
+
+
+class _Flight(Generic[_T]):
+  __slots__ = ("cancelled", "done", "exception", "result")
+
+  def __init__(self) -> None:
+    self.done = anyio.Event()
+    self.cancelled = False
+    self.exception: BaseException | None = None
+    self.result: _T | None = None
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+  """SingleFlight 统计信息。"""
+
+  calls: int
+  """实际执行的调用次数。"""
+
+  coalesced: int
+  """等待其他调用结果而省去的调用次数。"""
+
+  cached: int
+  """命中结果缓存而省去的调用次数。"""
+
+  @property
+  def saved(self) -> int:
+    """省去的调用总数。"""
+    return self.coalesced + self.cached
+
+
+class SingleFlight(Generic[_T]):
+  """
+  按键合并并发调用：同一个键同时只有一个调用在执行，其他调用者等待并共享它的结果或异常。
+  可选地把结果缓存一段时间，让紧接着的重复调用也直接返回。
+  """
+
+  all: ClassVar[dict[str, "SingleFlight[Any]"]] = {}
+  """所有已创建的 SingleFlight，用于统计。"""
+
+  def __init__(self, name: str, ttl: float = 0, max_size: int = 256) -> None:
+    """
+    创建 SingleFlight。
+
+    :param name: 名称，用于统计。
+    :param ttl: 结果缓存的秒数，为 0 时只合并同时进行的调用。
+    :param max_size: 最多缓存的结果数。
+    """
+    self.__name = name
+    self.__ttl = ttl
+    self.__flights = dict[Hashable, _Flight[_T]]()
+    self.__results = LRUCache[Hashable, tuple[_T, float]](f"singleflight:{name}", max_size)
+    self.__calls = 0
+    self.__coalesced = 0
+    self.__cached = 0
+    self.all[name] = self
+
+  @property
+  def name(self) -> str:
+    return self.__name
+
+  async def __call__(self, key: Hashable, func: Callable[[], Awaitable[_T]]) -> _T:
+    """
+    执行调用，如果同一个键的调用正在进行或结果仍在缓存中，则直接使用它的结果。
+
+    :param key: 键。
+    :param func: 实际执行调用的函数。
+    :return: 调用结果。
+    """
+    while True:
+      if self.__ttl > 0 and (item := self.__results.get(key)):
+        result, expire = item
+        if time.monotonic() < expire:
+          self.__cached += 1
+          return result
+        self.__results.pop(key)
+      flight = self.__flights.get(key)
+      if flight is None:
+        break
+      self.__coalesced += 1
+      await flight.done.wait()
+      if flight.cancelled:
+        # 执行调用的任务被取消了，由当前任务重新执行
+        self.__coalesced -= 1
+        continue
+      if flight.exception:
+        raise flight.exception
+      return cast("_T", flight.result)
+
+    flight = _Flight[_T]()
+    self.__flights[key] = flight
+    self.__calls += 1
+    try:
+      result = await func()
+    except Exception as e:
+      flight.exception = e
+      raise
+    except BaseException:
+      flight.cancelled = True
+      raise
+    else:
+      flight.result = result
+      if self.__ttl > 0:
+        self.__results.put(key, (result, time.monotonic() + self.__ttl))
+      return result
+    finally:
+      del self.__flights[key]
+      flight.done.set()
+
+  def forget(self, key: Hashable) -> None:
+    """
+    移除缓存的结果，不影响正在进行的调用。
+
+    :param key: 键。
+    """
+    self.__results.pop(key)
+
+  def stats(self) -> SingleFlightStats:
+    """
+    获取统计信息。
+
+    :return: 统计信息。
+    """
+    return SingleFlightStats(self.__calls, self.__coalesced, self.__cached)
+
+
+_process_initializers = list[Callable[[], None]]()
+_before_process_fork = list[Callable[[], Awaitable[None]]]()
+_process_pool: ProcessPoolExecutor | None = None
+
+
+_SHARED_VIEW_MODES = {
+  "1": "L",
+  "L": "L",
+  "P": "P",
+  "I;16": "I;16",
+  "I;16L": "I;16L",
+  "I;16B": "I;16B",
+  "I;16N": "I;16N",
+}
+"""图片在共享内存中的视图模式，其他模式的每个像素在 Pillow 内部都占 4 字节，映射为 RGBA。"""
+
+_VIEW_PIXEL_SIZES = {"L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2, "RGBA": 4}
+
+
+def _copy_shared(shm: SharedMemory, im: Image.Image, *, to_shared: bool) -> None:
+  # 把共享内存映射为与 im 内部布局相同的图片，直接调用底层的 paste 复制像素，
+  # Image.paste 会因为映射的图片只读而先复制一份，而且不能在不同模式之间复制
+  view_mode = _SHARED_VIEW_MODES.get(im.mode, "RGBA")
+  view = Image.frombuffer(view_mode, im.size, shm.buf, "raw", view_mode, 0, 1)
+  try:
+    if to_shared:
+      view.im.paste(im.im, (0, 0, *im.size))
+    else:
+      im.im.paste(view.im, (0, 0, *im.size))
+  finally:
+    # 映射的图片不释放时无法关闭共享内存
+    del view
+
+
+class SharedImage:
+  """
+  通过共享内存在进程间传递的 Pillow 图片，pickle 时只传递共享内存的名称和图片的元数据。
+  创建者直接把像素写入共享内存后即关闭映射，并把所有权交给接收者，
+  接收者读取（open）后负责释放共享内存。
+  """
+
+  name: str | None
+  mode: str
+  size: tuple[int, int]
+  palette: tuple[str, bytes] | None
+  info: dict[str, Any]
+
+  def __init__(self, im: Image.Image) -> None:
+    super().__init__()
+    im.load()
+    self.mode = im.mode
+    self.size = im.size
+    self.palette = (im.palette.mode, im.palette.tobytes()) if im.palette else None
+    self.info = im.info
+    if not im.width or not im.height:
+      self.name = None
+      return
+    view_mode = _SHARED_VIEW_MODES.get(im.mode, "RGBA")
+    shm = SharedMemory(create=True, size=im.width * im.height * _VIEW_PIXEL_SIZES[view_mode])
+    try:
+      _copy_shared(shm, im, to_shared=True)
+    except BaseException:
+      shm.close()
+      shm.unlink()
+      raise
+    shm.close()
+    # 共享内存由接收者释放，不取消注册的话创建者的 resource_tracker 会在退出时报告泄漏
+    resource_tracker.unregister(shm._name, "shared_memory")
+    self.name = shm.name
+
+  def open(self) -> Image.Image:
+    """
+    从共享内存中复制出图片并释放共享内存，只能调用一次。
+
+    :return: 图片。
+    """
+    im = Image.new(self.mode, self.size)
+    if self.name is not None:
+      shm = SharedMemory(self.name)
+      try:
+        _copy_shared(shm, im, to_shared=False)
+      finally:
+        shm.close()
+        shm.unlink()
+      self.name = None
+    if self.palette:
+      im.putpalette(self.palette[1], self.palette[0])
+    im.info.update(self.info)
+    return im
+
+  def release(self) -> None:
+    """释放尚未被读取的共享内存，用于任务被取消或失败的情况。"""
+    if self.name is None:
+      return
+    try:
+      shm = SharedMemory(self.name)
+    except FileNotFoundError:
+      pass
+    else:
+      shm.close()
+      shm.unlink()
+    self.name = None
+
+
+def _share(value: Any) -> Any:
+  if isinstance(value, Image.Image):
+    return SharedImage(value)
+  if isinstance(value, list | tuple) and value and all(isinstance(x, Image.Image) for x in value):
+    return type(value)(SharedImage(x) for x in value)
+  return value
+
+
+def _unshare(value: Any) -> Any:
+  if isinstance(value, SharedImage):
+    return value.open()
+  if isinstance(value, list | tuple) and value and all(isinstance(x, SharedImage) for x in value):
+    return type(value)(x.open() for x in value)
+  return value
+
+
+def _release(value: Any) -> None:
+  if isinstance(value, SharedImage):
+    value.release()
+  elif isinstance(value, list | tuple):
+    for x in value:
+      if isinstance(x, SharedImage):
+        x.release()
+
+
+def _release_future(future: Future[Any]) -> None:
+  if not future.cancelled() and future.exception() is None:
+    _release(future.result())
+
+
+def _process_init(initializers: list[Callable[[], None]]) -> None:
+  # Ctrl+C 由主进程处理，工作进程随执行器一起退出
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  for initializer in initializers:
+    try:
+      initializer()
+    except Exception:
+      logger.exception(f"运行工作进程初始化函数 {initializer} 时出错")
+
+
+def _process_call(func: Callable[..., Any], args: tuple[Any, ...], kw: dict[str, Any]) -> Any:
+  args = tuple(_unshare(arg) for arg in args)
+  kw = {k: _unshare(v) for k, v in kw.items()}
+  return _share(func(*args, **kw))
+
+
+def process_initializer(func: Callable[[], None]) -> Callable[[], None]:
+  """
+  注册工作进程的初始化函数，每个工作进程启动时都会调用，用于预加载字体、素材等。
+  需要在机器人启动（进程池创建）之前注册。
+  """
+  _process_initializers.append(func)
+  return func
+
+
+async def _wait_future(future: Future[_T]) -> _T:
+  # 与 asyncio.wrap_future 相同，但不依赖具体的事件循环，取消等待时也取消尚未开始的任务
+  event = anyio.Event()
+  token = anyio.lowlevel.current_token()
+  loop_thread = threading.get_ident()
+  waiting = True
+
+  def done(_: Future[_T]) -> None:
+    if not waiting:
+      # 等待已经被取消，不需要回到事件循环，避免阻塞执行器的管理线程
+      return
+    if threading.get_ident() == loop_thread:
+      event.set()
+      return
+    try:
+      anyio.from_thread.run_sync(event.set, token=token)
+    except RuntimeError:
+      # 事件循环已经结束，没有人在等待了
+      pass
+
+  future.add_done_callback(done)
+  try:
+    await event.wait()
+  except anyio.get_cancelled_exc_class():
+    waiting = False
+    future.cancel()
+    raise
+  return future.result()
+
+
+def before_process_fork(func: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+  """
+  注册机器人启动时、创建工作进程之前在主进程中运行的异步函数，用于预加载素材等数据，
+  工作进程 fork 时会继承这些数据。没有配置进程池时也会运行。
+  """
+  _before_process_fork.append(func)
+  return func
+
+
+def _create_process_pool() -> ProcessPoolExecutor | None:
+  workers = CONFIG().process_workers
+  if workers <= 0:
+    return None
+  if "fork" not in multiprocessing.get_all_start_methods():
+    # 插件模块依赖已初始化的 NoneBot，只能通过 fork 继承到工作进程中
+    logger.warning("当前平台不支持 fork，进程池已禁用，渲染任务将在线程中运行")
+    return None
+  return ProcessPoolExecutor(
+    min(workers, os.cpu_count() or 1),
+    multiprocessing.get_context("fork"),
+    _process_init,
+    (list(_process_initializers),),
+  )
+
+
+@_driver.on_startup
+async def _() -> None:
+  global _process_pool
+  for func in _before_process_fork:
+    try:
+      await func()
+    except Exception:
+      logger.exception(f"运行创建工作进程前的函数 {func} 时出错")
+  _process_pool = _create_process_pool()
+  if _process_pool:
+    # fork 方式的进程池在第一次提交任务时创建所有工作进程，趁启动时线程较少尽早创建
+    await _wait_future(_process_pool.submit(int))
+
+
+@_driver.on_shutdown
+async def _() -> None:
+  global _process_pool
+  if _process_pool:
+    _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_pool = None
+
+
+async def run_process(func: Callable[..., _T], *args: Any, **kw: Any) -> _T:
+  """
+  在进程池中运行 CPU 密集的同步函数，不占用主进程的 GIL。
+  参数和返回值中的图片（或图片列表）通过共享内存传递，其他值需要能被 pickle。
+  函数必须定义在模块顶层。未配置进程池时，退化为在线程中运行（anyio.to_thread.run_sync）。
+  """
+  global _process_pool
+  if _process_pool is None:
+    return await run_sync(partial(func, *args, **kw))
+  pool = _process_pool
+  shared_args = tuple(_share(arg) for arg in args)
+  shared_kw = {k: _share(v) for k, v in kw.items()}
+  future: Future[Any] | None = None
+  try:
+    future = pool.submit(_process_call, func, shared_args, shared_kw)
+    result = await _wait_future(future)
+  except BaseException as e:
+    # 任务被取消或失败时，工作进程可能还没有读取参数，结果也不会再被读取
+    for arg in (*shared_args, *shared_kw.values()):
+      _release(arg)
+    if future:
+      future.add_done_callback(_release_future)
+    if isinstance(e, BrokenProcessPool) and _process_pool is pool:
+      logger.exception("工作进程意外退出，正在重建进程池")
+      pool.shutdown(wait=False, cancel_futures=True)
+      _process_pool = _create_process_pool()
+    raise
+  return _unshare(result)
@@ -0,0 +1,287 @@
+"""带容量预算的线程安全 LRU 缓存，以及磁盘缓存目录的淘汰。"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, ClassVar, Generic, TypeVar
+
+from PIL import Image
+
+__all__ = ["CacheStats", "DirectoryEvictor", "LRUCache", "sizeof_image"]
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class CacheStats:
+  """缓存统计信息。"""
+
+  hits: int
+  """命中次数。"""
+
+  misses: int
+  """未命中次数。"""
+
+  evictions: int
+  """因超出容量而被淘汰的条目数。"""
+
+  size: int
+  """当前占用的容量。"""
+
+  max_size: int
+  """容量上限。"""
+
+  count: int
+  """当前条目数。"""
+
+  @property
+  def hit_rate(self) -> float:
+    """
+    命中率，没有任何访问时为 0。
+
+    :return: 命中率，范围 0 - 1。
+    """
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
+
+
+class LRUCache(Generic[K, V]):
+  """
+  按最近最少使用淘汰的缓存，容量由 sizeof 计算的大小之和限制（例如字节数）。
+  所有操作都加锁，可以在 run_sync 的工作线程中使用。
+  """
+
+  all: ClassVar[dict[str, "LRUCache[Any, Any]"]] = {}
+  """所有已创建的缓存，用于统计。"""
+
+  __slots__ = (
+    "__evictions",
+    "__hits",
+    "__items",
+    "__lock",
+    "__max_size",
+    "__misses",
+    "__name",
+    "__size",
+    "__sizeof",
+  )
+
+  def __init__(self, name: str, max_size: int, sizeof: Callable[[V], int] = lambda _: 1) -> None:
+    """
+    创建缓存。
+
+    :param name: 缓存名称，用于统计。
+    :param max_size: 容量上限，为 0 时禁用缓存。
+    :param sizeof: 计算单个条目大小的函数，默认每个条目大小为 1（即按条目数限制）。
+    """
+    self.__name = name
+    self.__max_size = max_size
+    self.__sizeof = sizeof
+    self.__items = OrderedDict[K, tuple[V, int]]()
+    self.__lock = Lock()
+    self.__size = 0
+    self.__hits = 0
+    self.__misses = 0
+    self.__evictions = 0
+    self.all[name] = self
+
+  @property
+  def name(self) -> str:
+    return self.__name
+
+  @property
+  def max_size(self) -> int:
+    return self.__max_size
+
+  @max_size.setter
+  def max_size(self, value: int) -> None:
+    with self.__lock:
+      self.__max_size = value
+      self.__evict()
+
+  def __len__(self) -> int:
+    return len(self.__items)
+
+  def __contains__(self, key: K) -> bool:
+    return key in self.__items
+
+  def get(self, key: K) -> V | None:
+    """
+    获取缓存条目，并将其标记为最近使用。
+
+    :param key: 键。
+    :return: 缓存的值，不存在时为 None。
+    """
+    with self.__lock:
+      item = self.__items.get(key)
+      if item is None:
+        self.__misses += 1
+        return None
+      self.__items.move_to_end(key)
+      self.__hits += 1
+      return item[0]
+
+  def put(self, key: K, value: V) -> None:
+    """
+    放入缓存条目，必要时淘汰最久未使用的条目。大于容量上限的条目不会被缓存。
+
+    :param key: 键。
+    :param value: 值。
+    """
+    size = self.__sizeof(value)
+    with self.__lock:
+      if old := self.__items.pop(key, None):
+        self.__size -= old[1]
+      if size > self.__max_size:
+        return
+      self.__items[key] = (value, size)
+      self.__size += size
+      self.__evict()
+
+  def pop(self, key: K) -> V | None:
+    """
+    移除缓存条目。
+
+    :param key: 键。
+    :return: 被移除的值，不存在时为 None。
+    """
+    with self.__lock:
+      item = self.__items.pop(key, None)
+      if item is None:
+        return None
+      self.__size -= item[1]
+      return item[0]
+
+  def clear(self) -> None:
+    """清空缓存，不重置统计信息。"""
+    with self.__lock:
+      self.__items.clear()
+      self.__size = 0
+
+  def stats(self) -> CacheStats:
+    """
+    获取统计信息。
+
+    :return: 统计信息。
+    """
+    with self.__lock:
+      return CacheStats(
+        self.__hits,
+        self.__misses,
+        self.__evictions,
+        self.__size,
+        self.__max_size,
+        len(self.__items),
+      )
+
+  def reset_stats(self) -> None:
+    """重置命中、未命中和淘汰计数。"""
+    with self.__lock:
+      self.__hits = 0
+      self.__misses = 0
+      self.__evictions = 0
+
+  def __evict(self) -> None:
+    while self.__size > self.__max_size and self.__items:
+      _, (_, size) = self.__items.popitem(last=False)
+      self.__size -= size
+      self.__evictions += 1
+
+
+def sizeof_image(im: Image.Image) -> int:
+  """
+  估算 Pillow 图片占用的内存字节数。
+
+  :param im: 图片。
+  :return: 字节数。
+  """
+  return im.width * im.height * len(im.getbands())
+
+
+class DirectoryEvictor:
+  """
+  按访问时间淘汰磁盘缓存目录中的文件，使总大小不超过上限。
+  为了避免每次写入都扫描整个目录，只有累计写入的字节数超过上限的一定比例，
+  或者距离上次扫描超过一定时间时才会扫描，因此目录大小可能暂时略微超过上限。
+  扫描时跳过 .tmp 结尾的临时文件（可能有其他线程正在写入）。
+  """
+
+  __slots__ = ("__directory", "__grace", "__interval", "__last", "__lock", "__pending", "__ratio")
+
+  def __init__(
+    self,
+    directory: Path,
+    *,
+    interval: float = 300,
+    ratio: float = 1 / 16,
+    grace: float = 0,
+  ) -> None:
+    """
+    创建淘汰器。
+
+    :param directory: 缓存目录。
+    :param interval: 两次扫描之间的最长秒数。
+    :param ratio: 累计写入超过上限的这个比例时扫描。
+    :param grace: 最近这么多秒内访问过的文件不会被淘汰。
+    """
+    self.__directory = directory
+    self.__interval = interval
+    self.__ratio = ratio
+    self.__grace = grace
+    self.__lock = Lock()
+    self.__pending = 0
+    self.__last = time.monotonic()
+
+  def written(self, size: int, limit: int, keep: Path | None = None) -> None:
+    """
+    记录一次写入，到期时扫描并淘汰文件。这个函数可能会阻塞，应该在线程中调用。
+
+    :param size: 写入的字节数。
+    :param limit: 目录总字节数上限。
+    :param keep: 不能淘汰的文件，通常是刚写入的文件。
+    """
+    with self.__lock:
+      self.__pending += size
+      now = time.monotonic()
+      if self.__pending < limit * self.__ratio and now - self.__last < self.__interval:
+        return
+      self.__pending = 0
+      self.__last = now
+    self.evict(limit, keep)
+
+  def evict(self, limit: int, keep: Path | None = None) -> None:
+    """
+    立即扫描目录并淘汰最久未访问的文件，直到总大小不超过上限。
+
+    :param limit: 目录总字节数上限。
+    :param keep: 不能淘汰的文件。
+    """
+    entries = list[tuple[float, int, Path]]()
+    total = 0
+    try:
+      it = list(self.__directory.iterdir())
+    except FileNotFoundError:
+      return
+    for entry in it:
+      if entry.suffix == ".tmp":
+        continue
+      try:
+        stat = entry.stat()
+      except FileNotFoundError:
+        continue
+      entries.append((stat.st_atime, stat.st_size, entry))
+      total += stat.st_size
+    if total <= limit:
+      return
+    deadline = time.time() - self.__grace
+    entries.sort(key=lambda x: x[0])
+    for atime, size, entry in entries:
+      if entry == keep or atime > deadline:
+        continue
+      entry.unlink(missing_ok=True)
+      total -= size
+      if total <= limit:
+        break
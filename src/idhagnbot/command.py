@@ -1,3 +1,4 @@
+from collections.abc import Callable, Iterable
 from typing import Any, Self, cast
 
 import nonebot
@@ -6,6 +7,7 @@ from nonebot.exception import FinishedException
 from nonebot.message import event_preprocessor
 from nonebot.typing import T_State
 
+from idhagnbot.context import SceneIdOnePrivate
 from idhagnbot.help import CategoryItem, CommandItem, CommandName, CommonData
 from idhagnbot.message import UniMsg
 from idhagnbot.permission import DEFAULT, permission
@@ -23,6 +25,108 @@ from nonebot_plugin_alconna import (
 )
 
 config.command_max_count = 1000
+COMMAND_KEY = "_idhagnbot_command"
+COMMAND_LIKE_KEY = "_idhagnbot_command_like"
+CANDIDATES_KEY = "_idhagnbot_command_candidates"
+DRIVER = nonebot.get_driver()
+TEXT_REWRITERS = list[Callable[[str, str], str | None]]()
+"""
+查找候选命令之前改写消息文本的函数，参数是场景 ID（SceneIdOnePrivate）和第一个文本段，
+返回改写后的文本，不需要改写时返回 None。例如别名插件用它把别名替换成实际的命令。
+"""
+
+
+class CommandIndex:
+  """
+  由 CommandBuilder 创建的命令的命令头（前缀加名字或别名）到命令的索引，
+  用于根据消息的第一个词直接找出可能匹配的命令，不需要让每条消息都经过所有命令的解析。
+  前缀取自命令实际的 prefixes，因此无论是否使用 NoneBot 的命令起始符都能正确索引。
+  紧凑命令（名字后面可以直接接参数）按前缀匹配，前缀不是字符串的命令和有快捷命令的命令总是作为候选。
+  """
+
+  __exact: dict[str, set[str]]
+  __compact: dict[str, set[str]]
+  __always: set[str]
+  __commands: dict[str, Alconna[Any]]
+
+  def __init__(self) -> None:
+    self.__exact = {}
+    self.__compact = {}
+    self.__always = set()
+    self.__commands = {}
+
+  def add(self, parser: Alconna[Any], aliases: Iterable[str]) -> None:
+    """
+    添加命令。
+
+    :param parser: 命令。
+    :param aliases: 命令的别名。
+    """
+    self.__commands[parser.path] = parser
+    prefixes = list(parser.prefixes) or [""]
+    if not all(isinstance(prefix, str) for prefix in prefixes):
+      self.__always.add(parser.path)
+      return
+    table = self.__compact if parser.meta.compact else self.__exact
+    for name in (parser.name, *aliases):
+      # 名字里有空格时只取第一个词，找出的命令只会多不会少
+      if words := name.split(None, 1):
+        for prefix in prefixes:
+          table.setdefault(prefix + words[0], set()).add(parser.path)
+
+  def remove(self, parser: Alconna[Any]) -> None:
+    """
+    移除命令。
+
+    :param parser: 命令。
+    """
+    self.__commands.pop(parser.path, None)
+    self.__always.discard(parser.path)
+    for table in (self.__exact, self.__compact):
+      for word in [word for word, paths in table.items() if parser.path in paths]:
+        table[word].discard(parser.path)
+        if not table[word]:
+          del table[word]
+
+  def __contains__(self, parser: Alconna[Any]) -> bool:
+    return parser.path in self.__commands
+
+  def candidates(self, word: str) -> set[str]:
+    """
+    查找可能匹配的命令。
+
+    :param word: 消息的第一个词（包括命令前缀）。
+    :return: 可能匹配的命令的路径。
+    """
+    result = set(self.__always)
+    result.update(self.__exact.get(word, ()))
+    for header, paths in self.__compact.items():
+      if word.startswith(header):
+        result.update(paths)
+    # 快捷命令可以在运行时通过内置的 --shortcut 选项添加，而且键是正则表达式，无法预先索引
+    for path, parser in self.__commands.items():
+      if path not in result and _has_shortcut(parser):
+        result.add(path)
+    return result
+
+  def commands(self, paths: Iterable[str]) -> list[Alconna[Any]]:
+    """
+    根据路径获取命令。
+
+    :param paths: 命令的路径。
+    :return: 命令。
+    """
+    return [self.__commands[path] for path in paths if path in self.__commands]
+
+
+def _has_shortcut(parser: Alconna[Any]) -> bool:
+  try:
+    return bool(command_manager.get_shortcut(parser))
+  except ValueError:
+    return False
+
+
+COMMAND_INDEX = CommandIndex()
 
 
 async def send_output(result: CommandResult) -> None:
@@ -102,8 +206,15 @@ class CommandBuilder:
       ),
     )
     CategoryItem.find(self.__category, create=True).add(item)
+    path = parser.path
+
+    async def is_candidate(state: T_State) -> bool:
+      # 预处理没有运行（例如不是消息事件）时不进行筛选
+      return (candidates := state.get(CANDIDATES_KEY)) is None or path in candidates
+
     matcher = on_alconna(
       parser,
+      rule=is_candidate,
       aliases=set(self.__aliases),
       extensions=self.__extensions,
       permission=permission(self.__node, self.__default_grant_to),
@@ -116,29 +227,40 @@ class CommandBuilder:
 
     def destroy() -> None:
       item.remove_self()
+      COMMAND_INDEX.remove(parser)
       matcher.clean()
 
     matcher.destroy = destroy  # ty:ignore[invalid-assignment]
     if self.__auto_reject:
       matcher.handle()(send_output)
+    COMMAND_INDEX.add(parser, self.__aliases)
     return matcher
 
 
-COMMAND_KEY = "_idhagnbot_command"
-COMMAND_LIKE_KEY = "_idhagnbot_command_like"
-DRIVER = nonebot.get_driver()
+def _first_word(text: str) -> str:
+  splited = text.split(None, 1)
+  return splited[0] if splited else ""
 
 
 @event_preprocessor
-async def _(message: UniMsg, state: T_State) -> None:
-  if command_manager.test(message):
+async def _(message: UniMsg, scene_id: SceneIdOnePrivate, state: T_State) -> None:
+  segment = next((segment for segment in message if isinstance(segment, Text)), None)
+  text = segment.text if segment else ""
+  first = _first_word(text)
+  candidates = COMMAND_INDEX.candidates(first)
+  # 事件预处理器是并发运行的，别名等改写可能还没有应用到消息上，改写前后的命令都要作为候选
+  for rewriter in TEXT_REWRITERS:
+    if (rewritten := rewriter(scene_id, text)) is not None:
+      candidates |= COMMAND_INDEX.candidates(_first_word(rewritten))
+  state[CANDIDATES_KEY] = candidates
+  # 不是由 CommandBuilder 创建的命令不在索引中，仍然需要逐个尝试
+  commands = COMMAND_INDEX.commands(candidates)
+  commands.extend(cmd for cmd in command_manager.get_commands() if cmd not in COMMAND_INDEX)
+  if any((result := cmd.parse(message)) and result.matched for cmd in commands):
     state[COMMAND_KEY] = True
-  if message and isinstance(segment := message[0], Text):
-    longest_prefix_len = 0
-    splited = segment.text.split(None, 1)
-    first = splited[0] if splited else ""
-    for prefix in DRIVER.config.command_start:
-      if prefix and first.startswith(prefix):
-        longest_prefix_len = max(longest_prefix_len, len(prefix))
-    if longest_prefix_len:
-      state[COMMAND_LIKE_KEY] = (first[:longest_prefix_len], first[longest_prefix_len:])
+  longest_prefix_len = 0
+  for prefix in DRIVER.config.command_start:
+    if prefix and first.startswith(prefix):
+      longest_prefix_len = max(longest_prefix_len, len(prefix))
+  if longest_prefix_len and message[0] is segment:
+    state[COMMAND_LIKE_KEY] = (first[:longest_prefix_len], first[longest_prefix_len:])
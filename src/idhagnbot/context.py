@@ -1,15 +1,17 @@
-import re
-from collections.abc import Awaitable, Callable
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Annotated
+from typing import Annotated, Literal, cast
 
 import nonebot
 from nonebot.adapters import Bot
 from nonebot.params import Depends
 from pydantic import BaseModel, Field
 
+from idhagnbot.cache import LRUCache
 from idhagnbot.config import SharedData
+from idhagnbot.directory import get_member, get_user
 
 nonebot.require("nonebot_plugin_alconna")
 nonebot.require("nonebot_plugin_uninfo")
@@ -36,13 +38,111 @@ PRIVATE = "private"
 NON_PRIVATE = "non_private"
 GROUP = "group"
 GUILD = "guild"
-PRIVATE_RE = re.compile(r"^(?P<platform>[^:]+):private:(?P<private>[^:]+)$")
-GROUP_RE = re.compile(r"^(?P<platform>[^:]+):group:(?P<group>[^:]+)$")
-GUILD_RE = re.compile(r"^(?P<platform>[^:]+):guild:(?P<guild>[^:]+)$")
-CHANNEL_RE = re.compile(r"^(?P<platform>[^:]+):channel:(?P<channel>[^:]+)$")
-GUILD_CHANNEL_RE = re.compile(
-  r"^(?P<platform>[^:]+):guild:(?P<guild>[^:]+):channel:(?P<channel>[^:]+)$",
-)
+SceneKind = Literal["private", "group", "guild", "channel"]
+SCENE_TYPES: dict[SceneKind, SceneType] = {
+  "private": SceneType.PRIVATE,
+  "group": SceneType.GROUP,
+  "guild": SceneType.GUILD,
+  "channel": SceneType.CHANNEL_TEXT,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedSceneId:
+  """
+  解析后的场景 ID，由 parse_scene_id 创建，相同的 ID 共享同一个对象。
+  相等和哈希只比较原始字符串。
+  """
+
+  raw: str
+  """原始场景 ID，例如 `qq:group:123`、`discord:guild:1:channel:2`。"""
+
+  platform: str = field(compare=False)
+  """平台，即 uninfo 的 scope。"""
+
+  kind: SceneKind = field(compare=False)
+  """场景种类，频道无论是否属于服务器都是 channel。"""
+
+  id: str = field(compare=False)
+  """场景本身的 ID，对于频道是频道 ID。"""
+
+  parent_id: str | None = field(compare=False)
+  """服务器中的频道所属服务器的 ID，其他场景为 None。"""
+
+  @property
+  def type(self) -> SceneType:
+    return SCENE_TYPES[self.kind]
+
+
+_parsed_scene_ids = LRUCache[str, ParsedSceneId]("scene_id", 4096)
+
+
+def _parse_scene_id(scene_id: str) -> ParsedSceneId | None:
+  parts = scene_id.split(":")
+  if not all(parts):
+    return None
+  if len(parts) == 3 and parts[1] in SCENE_TYPES:
+    return ParsedSceneId(scene_id, parts[0], cast("SceneKind", parts[1]), parts[2], None)
+  if len(parts) == 5 and parts[1] == "guild" and parts[3] == "channel":
+    return ParsedSceneId(scene_id, parts[0], "channel", parts[4], parts[2])
+  return None
+
+
+def parse_scene_id(scene_id: str) -> ParsedSceneId:
+  """
+  解析场景 ID，结果会被缓存。
+
+  :param scene_id: 场景 ID。
+  :return: 解析后的场景 ID。
+  :raises ValueError: 场景 ID 无效。
+  """
+  if (parsed := _parsed_scene_ids.get(scene_id)) is None:
+    if (parsed := _parse_scene_id(scene_id)) is None:
+      raise ValueError("无效场景 ID")
+    _parsed_scene_ids.put(scene_id, parsed)
+  return parsed
+
+
+def _try_parse_scene_id(scene_id: str) -> ParsedSceneId | None:
+  try:
+    return parse_scene_id(scene_id)
+  except ValueError:
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class SceneMatcher:
+  """
+  预先编译的场景集合，用于反复判断场景是否属于同一个集合。
+  集合中除了具体的场景 ID 之外，还可以包含 private、group、guild 三个特殊值，
+  分别匹配所有私聊、所有群聊、所有服务器和频道。
+  """
+
+  scene_ids: frozenset[str]
+  """集合中的具体场景 ID 和特殊值。"""
+
+  kinds: frozenset[SceneKind]
+  """由特殊值展开的、匹配所有场景的场景种类。"""
+
+  @classmethod
+  def compile(cls, scene_ids: Iterable[str]) -> "SceneMatcher":
+    scene_ids = frozenset(scene_ids)
+    kinds = set[SceneKind]()
+    if PRIVATE in scene_ids:
+      kinds.add("private")
+    if GROUP in scene_ids:
+      kinds.add("group")
+    if GUILD in scene_ids:
+      kinds.update(("guild", "channel"))
+    return cls(scene_ids, frozenset(kinds))
+
+  def __contains__(self, scene_id: str) -> bool:
+    if scene_id in self.scene_ids:
+      return True
+    if not self.kinds:
+      return False
+    parsed = _try_parse_scene_id(scene_id)
+    return parsed is not None and parsed.kind in self.kinds
 
 
 def get_scene_id_raw(session: Uninfo) -> str:
@@ -121,34 +221,20 @@ def _uninfo_selector(platform: str) -> Callable[[Target, Bot], Awaitable[bool]]:
 
 
 def get_target(scene_id: str) -> Target:
-  if match := PRIVATE_RE.match(scene_id):
-    return Target(match["private"], private=True, selector=_uninfo_selector(match["platform"]))
-  if match := GROUP_RE.match(scene_id):
-    return Target(match["group"], selector=_uninfo_selector(match["platform"]))
-  if match := CHANNEL_RE.match(scene_id):
-    return Target(match["channel"], channel=True, selector=_uninfo_selector(match["platform"]))
-  if match := GUILD_CHANNEL_RE.match(scene_id):
-    return Target(
-      match["channel"],
-      match["guild"],
-      channel=True,
-      selector=_uninfo_selector(match["platform"]),
-    )
+  parsed = parse_scene_id(scene_id)
+  selector = _uninfo_selector(parsed.platform)
+  if parsed.kind == "private":
+    return Target(parsed.id, private=True, selector=selector)
+  if parsed.kind == "group":
+    return Target(parsed.id, selector=selector)
+  if parsed.kind == "channel":
+    return Target(parsed.id, parsed.parent_id or "", channel=True, selector=selector)
   raise ValueError("无效场景 ID")
 
 
 def unpack_scene_id(scene_id: str) -> tuple[str, SceneType, str, str | None]:
-  if match := PRIVATE_RE.match(scene_id):
-    return match["platform"], SceneType.PRIVATE, match["private"], None
-  if match := GROUP_RE.match(scene_id):
-    return match["platform"], SceneType.GROUP, match["group"], None
-  if match := GUILD_RE.match(scene_id):
-    return match["platform"], SceneType.GUILD, match["guild"], None
-  if match := CHANNEL_RE.match(scene_id):
-    return match["platform"], SceneType.CHANNEL_TEXT, match["channel"], None
-  if match := GUILD_CHANNEL_RE.match(scene_id):
-    return match["platform"], SceneType.CHANNEL_TEXT, match["channel"], match["guild"]
-  raise ValueError("无效场景 ID")
+  parsed = parse_scene_id(scene_id)
+  return parsed.platform, parsed.type, parsed.id, parsed.parent_id
 
 
 async def get_scene(scene_id: str) -> Scene | None:
@@ -160,16 +246,20 @@ async def get_scene(scene_id: str) -> Scene | None:
   return await interface.get_scene(scene_type, current_id, parent_scene_id=parent_id)
 
 
-def in_scene(scene_id: str, scene_ids: set[str]) -> bool:
+def in_scene(scene_id: str, scene_ids: set[str] | SceneMatcher) -> bool:
+  if isinstance(scene_ids, SceneMatcher):
+    return scene_id in scene_ids
   if scene_id in scene_ids:
     return True
-  if PRIVATE in scene_ids and PRIVATE_RE.match(scene_id):
-    return True
-  if GROUP in scene_ids and GROUP_RE.match(scene_id):
-    return True
-  return GUILD in scene_ids and bool(
-    GUILD_RE.match(scene_id) or CHANNEL_RE.match(scene_id) or GUILD_CHANNEL_RE.match(scene_id),
-  )
+  if not (PRIVATE in scene_ids or GROUP in scene_ids or GUILD in scene_ids):
+    return False
+  if (parsed := _try_parse_scene_id(scene_id)) is None:
+    return False
+  if parsed.kind == "private":
+    return PRIVATE in scene_ids
+  if parsed.kind == "group":
+    return GROUP in scene_ids
+  return GUILD in scene_ids
 
 
 async def get_bot_id(bot: Bot) -> str:
@@ -190,14 +280,14 @@ async def get_bot_member_or_user(
   while toplevel_scene.parent:
     toplevel_scene = toplevel_scene.parent
   if session.scene is not toplevel_scene and (
-    member := await interface.get_member(toplevel_scene.type, toplevel_scene.id, self_id)
+    member := await get_member(interface, toplevel_scene.type, toplevel_scene.id, self_id)
   ):
     return member
   if session.scene.type != SceneType.PRIVATE and (
-    member := await interface.get_member(session.scene.type, session.scene.id, self_id)
+    member := await get_member(interface, session.scene.type, session.scene.id, self_id)
   ):
     return member
-  if user := await interface.get_user(self_id):
+  if user := await get_user(interface, self_id):
     return user
   return None
 
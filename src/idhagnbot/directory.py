@@ -0,0 +1,309 @@
+"""
+带缓存的 uninfo 成员和用户查询，查询结果（包括不存在的结果）会缓存一段时间。
+需要查询同一个场景中的多个成员时可以用 get_members_of 一次性获取整个成员列表。
+收到通知事件时会清除相关成员的缓存，收到消息时发现昵称变化也会清除。
+"""
+
+import time
+from collections.abc import Hashable, Iterable
+
+import nonebot
+from nonebot.adapters import Bot, Event
+from nonebot.exception import ActionFailed
+from nonebot.message import event_preprocessor
+from pydantic import BaseModel
+
+from idhagnbot.asyncio import SingleFlight, gather_map
+from idhagnbot.cache import CacheStats, LRUCache
+from idhagnbot.config import SharedConfig
+
+nonebot.require("nonebot_plugin_uninfo")
+from nonebot_plugin_uninfo import Interface, Member, SceneType, Uninfo, User
+
+__all__ = [
+  "CONFIG",
+  "Config",
+  "cache_stats",
+  "forget_member",
+  "forget_scene",
+  "get_member",
+  "get_members",
+  "get_members_of",
+  "get_user",
+  "invalidate",
+]
+
+
+class Config(BaseModel):
+  ttl: float = 600
+  """
+  成功查询到的成员和用户信息缓存的秒数，0 代表不缓存。
+  可选，默认为 600。
+  """
+
+  negative_ttl: float = 60
+  """
+  查询不到（成员不存在或已退出）时缓存的秒数，0 代表不缓存。
+  可选，默认为 60。
+  """
+
+  max_entries: int = 16384
+  """
+  最多缓存的成员和用户数量，超过时淘汰最久未使用的。
+  可选，默认为 16384。
+  """
+
+  bulk_threshold: int = 4
+  """
+  get_members_of 中未缓存的成员达到这个数量时改为获取整个成员列表。
+  可选，默认为 4。
+  """
+
+
+CONFIG = SharedConfig("directory", Config)
+_entries = LRUCache[Hashable, tuple[Member | User | None, float]]("directory", 16384)
+_member_lists = LRUCache[Hashable, tuple[list[Member], float]]("directory_members", 64)
+_flights = SingleFlight[object]("directory")
+
+
+@CONFIG.onload
+def _(prev: Config | None, curr: Config) -> None:
+  _entries.max_size = curr.max_entries
+  invalidate()
+
+
+def invalidate() -> None:
+  """清空所有缓存，重新加载配置时会自动调用。"""
+  _entries.clear()
+  _member_lists.clear()
+
+
+def cache_stats() -> CacheStats:
+  """
+  获取成员和用户缓存的统计信息。
+
+  :return: 统计信息。
+  """
+  return _entries.stats()
+
+
+def _bot_key(bot: Bot) -> tuple[str, str]:
+  return bot.adapter.get_name(), bot.self_id
+
+
+def _member_key(
+  interface: Interface,
+  scene_type: SceneType,
+  scene_id: str,
+  user_id: str,
+) -> Hashable:
+  return *_bot_key(interface.bot), int(scene_type), scene_id, user_id
+
+
+def _scene_key(interface: Interface, scene_type: SceneType, scene_id: str) -> Hashable:
+  return *_bot_key(interface.bot), int(scene_type), scene_id
+
+
+def _user_key(interface: Interface, user_id: str) -> Hashable:
+  return *_bot_key(interface.bot), user_id
+
+
+def _lookup(key: Hashable) -> tuple[bool, Member | User | None]:
+  if (item := _entries.get(key)) is None:
+    return False, None
+  value, expire = item
+  if time.monotonic() >= expire:
+    _entries.pop(key)
+    return False, None
+  return True, value
+
+
+def _store(key: Hashable, value: Member | User | None, config: Config) -> None:
+  ttl = config.ttl if value is not None else config.negative_ttl
+  if ttl > 0:
+    _entries.put(key, (value, time.monotonic() + ttl))
+
+
+async def get_member(
+  interface: Interface,
+  scene_type: SceneType,
+  scene_id: str,
+  user_id: str,
+) -> Member | None:
+  """
+  获取成员信息，优先使用缓存。查询失败时返回 None，但不会缓存失败的结果。
+
+  :param interface: uninfo 接口。
+  :param scene_type: 场景类型，对于频道应该传入所属服务器。
+  :param scene_id: 场景 ID。
+  :param user_id: 用户 ID。
+  :return: 成员信息，不存在时为 None。
+  """
+  key = _member_key(interface, scene_type, scene_id, user_id)
+  found, value = _lookup(key)
+  if found:
+    return value if isinstance(value, Member) else None
+
+  async def fetch() -> Member | None:
+    member = await interface.get_member(scene_type, scene_id, user_id)
+    _store(key, member, CONFIG())
+    return member
+
+  try:
+    return await _flights(key, fetch)
+  except (ActionFailed, NotImplementedError, ValueError):
+    return None
+
+
+async def get_user(interface: Interface, user_id: str) -> User | None:
+  """
+  获取用户信息，优先使用缓存。查询失败时返回 None，但不会缓存失败的结果。
+
+  :param interface: uninfo 接口。
+  :param user_id: 用户 ID。
+  :return: 用户信息，不存在时为 None。
+  """
+  key = _user_key(interface, user_id)
+  found, value = _lookup(key)
+  if found:
+    return value if isinstance(value, User) else None
+
+  async def fetch() -> User | None:
+    user = await interface.get_user(user_id)
+    _store(key, user, CONFIG())
+    return user
+
+  try:
+    return await _flights(key, fetch)
+  except (ActionFailed, NotImplementedError, ValueError):
+    return None
+
+
+async def get_members(interface: Interface, scene_type: SceneType, scene_id: str) -> list[Member]:
+  """
+  获取场景中的所有成员，整个列表和其中的每个成员都会被缓存。查询失败时返回空列表。
+
+  :param interface: uninfo 接口。
+  :param scene_type: 场景类型。
+  :param scene_id: 场景 ID。
+  :return: 成员列表。
+  """
+  key = _scene_key(interface, scene_type, scene_id)
+  if (item := _member_lists.get(key)) is not None:
+    members, expire = item
+    if time.monotonic() < expire:
+      return members
+    _member_lists.pop(key)
+
+  async def fetch() -> list[Member]:
+    members = await interface.get_members(scene_type, scene_id)
+    config = CONFIG()
+    if config.ttl > 0:
+      _member_lists.put(key, (members, time.monotonic() + config.ttl))
+    for member in members:
+      _store(_member_key(interface, scene_type, scene_id, member.user.id), member, config)
+    return members
+
+  try:
+    return await _flights(("members", key), fetch)
+  except (ActionFailed, NotImplementedError, ValueError):
+    return []
+
+
+async def get_members_of(
+  interface: Interface,
+  scene_type: SceneType,
+  scene_id: str,
+  user_ids: Iterable[str],
+) -> dict[str, Member | None]:
+  """
+  批量获取成员信息。未缓存的成员较多时获取一次整个成员列表，
+  较少时逐个查询，用于排行榜等需要显示很多成员的地方。
+
+  :param interface: uninfo 接口。
+  :param scene_type: 场景类型。
+  :param scene_id: 场景 ID。
+  :param user_ids: 用户 ID。
+  :return: 用户 ID 到成员信息的映射，不存在的成员为 None。
+  """
+  result = dict[str, Member | None]()
+  missing = list[str]()
+  for user_id in user_ids:
+    found, value = _lookup(_member_key(interface, scene_type, scene_id, user_id))
+    if found:
+      result[user_id] = value if isinstance(value, Member) else None
+    else:
+      missing.append(user_id)
+  if not missing:
+    return result
+  config = CONFIG()
+  if len(missing) >= config.bulk_threshold and (
+    members := await get_members(interface, scene_type, scene_id)
+  ):
+    by_id = {member.user.id: member for member in members}
+    for user_id in missing:
+      member = by_id.get(user_id)
+      if member is None:
+        _store(_member_key(interface, scene_type, scene_id, user_id), None, config)
+      result[user_id] = member
+    return result
+  result.update(
+    await gather_map(
+      {user_id: get_member(interface, scene_type, scene_id, user_id) for user_id in missing},
+    ),
+  )
+  return result
+
+
+def forget_member(
+  interface: Interface,
+  scene_type: SceneType,
+  scene_id: str,
+  user_id: str,
+) -> None:
+  """
+  清除成员的缓存，包括所在场景的成员列表。
+
+  :param interface: uninfo 接口。
+  :param scene_type: 场景类型。
+  :param scene_id: 场景 ID。
+  :param user_id: 用户 ID。
+  """
+  _entries.pop(_member_key(interface, scene_type, scene_id, user_id))
+  _entries.pop(_user_key(interface, user_id))
+  _member_lists.pop(_scene_key(interface, scene_type, scene_id))
+
+
+def forget_scene(interface: Interface, scene_type: SceneType, scene_id: str) -> None:
+  """
+  清除场景的成员列表缓存，单个成员的缓存会在过期后自然失效。
+
+  :param interface: uninfo 接口。
+  :param scene_type: 场景类型。
+  :param scene_id: 场景 ID。
+  """
+  _member_lists.pop(_scene_key(interface, scene_type, scene_id))
+
+
+@event_preprocessor
+async def _(bot: Bot, event: Event, session: Uninfo) -> None:
+  if session.scene.type == SceneType.PRIVATE:
+    return
+  scene = session.scene
+  while scene.parent:
+    scene = scene.parent
+  bot_key = _bot_key(bot)
+  key = (*bot_key, int(scene.type), scene.id, session.user.id)
+  scene_key = (*bot_key, int(scene.type), scene.id)
+  if event.get_type() == "notice":
+    # 入群、退群、改名片等通知，直接清除缓存
+    _entries.pop(key)
+    _entries.pop((*bot_key, session.user.id))
+    _member_lists.pop(scene_key)
+    return
+  if not session.member:
+    return
+  found, value = _lookup(key)
+  if found and isinstance(value, Member) and value.nick != session.member.nick:
+    _entries.pop(key)
+    _member_lists.pop(scene_key)
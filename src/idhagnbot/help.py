@@ -1,6 +1,7 @@
 import math
 from collections.abc import Callable
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Any, ClassVar, cast
 
 import nonebot
@@ -9,7 +10,7 @@ from pypinyin import lazy_pinyin
 from typing_extensions import override
 
 from idhagnbot.config import SharedConfig
-from idhagnbot.context import in_scene
+from idhagnbot.context import SceneMatcher
 from idhagnbot.i18n import apply_i18n, bound_lang, get_current_locale, get_fallback
 from idhagnbot.itertools import batched
 from idhagnbot.permission import (
@@ -47,6 +48,11 @@ class CommonData(BaseModel):
   default_grant_to: set[str] = Field(default_factory=lambda: {"default"})
   condition: Callable[["Context"], bool] = noop_condition
 
+  @cached_property
+  def scene_matcher(self) -> SceneMatcher:
+    # 每次显示帮助都要对每个帮助项检查一次，预先编译
+    return SceneMatcher.compile(self.in_scene)
+
   @property
   def parsed_node(self) -> Node:
     return parse_node(self.node)
@@ -146,7 +152,7 @@ class Item:
       return False
     if self.data.scope and ctx.scope != self.data.scope:
       return False
-    if self.data.in_scene and not in_scene(ctx.current_scene, self.data.in_scene):
+    if self.data.in_scene and ctx.current_scene not in self.data.scene_matcher:
       return False
     if self.data.has_scene and not any(i in self.data.has_scene for i in ctx.available_scenes):
       return False
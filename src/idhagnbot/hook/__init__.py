@@ -5,6 +5,8 @@ from nonebot.adapters import Bot
 from idhagnbot.hook.common import (
   CALLED_API_REGISTRY,
   CALLING_API_REGISTRY,
+  MEDIA_CALLED_API_REGISTRY,
+  MEDIA_CALLING_API_REGISTRY,
   MESSAGE_SEND_FAILED_HOOKS,
   MESSAGE_SENDING_HOOKS,
   MESSAGE_SENT_HOOKS,
@@ -42,7 +44,11 @@ T_MessageSendFailedHook = TypeVar("T_MessageSendFailedHook", bound=MessageSendFa
 
 @Bot.on_calling_api
 async def _(bot: Bot, api: str, data: dict[str, Any]) -> None:
-  if MESSAGE_SENDING_HOOKS and (hook := CALLING_API_REGISTRY.get(bot.adapter.get_name())):
+  adapter = bot.adapter.get_name()
+  if MESSAGE_SENDING_HOOKS and (hook := CALLING_API_REGISTRY.get(adapter)):
+    await hook(bot, api, data)
+  # 替换媒体会修改 data，必须在消息钩子解析完原始消息之后
+  if hook := MEDIA_CALLING_API_REGISTRY.get(adapter):
     await hook(bot, api, data)
 
 
@@ -54,8 +60,11 @@ async def _(
   data: dict[str, Any],
   result: Any,
 ) -> None:
+  adapter = bot.adapter.get_name()
+  if hook := MEDIA_CALLED_API_REGISTRY.get(adapter):
+    await hook(bot, e, api, data, result)
   if (MESSAGE_SENT_HOOKS or MESSAGE_SEND_FAILED_HOOKS) and (
-    hook := CALLED_API_REGISTRY.get(bot.adapter.get_name())
+    hook := CALLED_API_REGISTRY.get(adapter)
   ):
     await hook(bot, e, api, data, result)
 
@@ -27,6 +27,8 @@ MessageSentHook = Callable[[Bot, UniMessage[Segment], list[SentMessage], Target]
 MessageSendFailedHook = Callable[[Bot, UniMessage[Segment], Target, Exception], Awaitable[None]]
 CALLING_API_REGISTRY = dict[str, T_CallingAPIHook]()
 CALLED_API_REGISTRY = dict[str, T_CalledAPIHook]()
+MEDIA_CALLING_API_REGISTRY = dict[str, T_CallingAPIHook]()
+MEDIA_CALLED_API_REGISTRY = dict[str, T_CalledAPIHook]()
 MESSAGE_SENDING_HOOKS = list[MessageSendingHook]()
 MESSAGE_SENT_HOOKS = list[MessageSentHook]()
 MESSAGE_SEND_FAILED_HOOKS = list[MessageSendFailedHook]()
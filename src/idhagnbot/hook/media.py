@@ -0,0 +1,156 @@
+"""
+按内容哈希复用已经上传到平台的媒体，重复发送相同的图片等文件时不再重新上传。
+Telegram 复用返回的 file_id，OneBot 则把 base64 文件写入本地文件后改为发送路径。
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import nonebot
+from nonebot.adapters import Bot
+from pydantic import BaseModel, Field
+
+from idhagnbot.cache import DirectoryEvictor
+from idhagnbot.config import CACHE_DIR, SharedCache, SharedConfig
+
+__all__ = [
+  "CACHE",
+  "CONFIG",
+  "MEDIA_DIR",
+  "Cache",
+  "Config",
+  "forget_handle",
+  "get_handle",
+  "local_file",
+  "media_digest",
+  "put_handle",
+]
+MEDIA_DIR = CACHE_DIR / "media"
+# 最近一分钟内用到的文件可能正在发送，不能淘汰
+_evictor = DirectoryEvictor(MEDIA_DIR, grace=60)
+
+
+class Config(BaseModel):
+  max_handles: int = 4096
+  """
+  每个适配器最多记住的远程文件标识数量，超过时淘汰最久未使用的，0 代表禁用复用。
+  可选，默认为 4096。
+  """
+
+  onebot_local_files: bool = False
+  """
+  OneBot 发送 base64 媒体时是否改为写入本地文件并发送 file:// 路径。
+  只有 OneBot 实现与机器人运行在同一台机器（或共享该目录）时才能开启。
+  可选，默认为 false。
+  """
+
+  local_files_size: int = 512 * 1024 * 1024
+  """
+  本地媒体文件的总字节数上限，超过时删除最久未使用的文件。
+  可选，默认为 512MiB。
+  """
+
+
+class Cache(BaseModel):
+  handles: dict[str, dict[str, str]] = Field(default_factory=dict)
+  """键为 `适配器:机器人 ID`，值为内容哈希到远程文件标识的映射，按使用时间从旧到新排序。"""
+
+
+CONFIG = SharedConfig("media", Config)
+CACHE = SharedCache("media", Cache)
+driver = nonebot.get_driver()
+
+
+@driver.on_shutdown
+async def _() -> None:
+  if CACHE().handles:
+    CACHE.dump()
+
+
+def media_digest(data: bytes) -> str:
+  """
+  计算媒体内容的哈希。
+
+  :param data: 文件内容。
+  :return: 十六进制哈希。
+  """
+  return hashlib.sha256(data).hexdigest()
+
+
+def _bot_key(bot: Bot) -> str:
+  return f"{bot.adapter.get_name()}:{bot.self_id}"
+
+
+def get_handle(bot: Bot, digest: str) -> str | None:
+  """
+  获取机器人上传过的媒体对应的远程文件标识。
+
+  :param bot: 要发送媒体的机器人，不同机器人的文件标识不通用。
+  :param digest: 媒体内容的哈希。
+  :return: 远程文件标识，没有上传过时为 None。
+  """
+  handles = CACHE().handles.get(_bot_key(bot))
+  if not handles or (handle := handles.pop(digest, None)) is None:
+    return None
+  handles[digest] = handle
+  return handle
+
+
+def put_handle(bot: Bot, digest: str, handle: str) -> None:
+  """
+  记住上传后的远程文件标识。
+
+  :param bot: 上传媒体的机器人。
+  :param digest: 媒体内容的哈希。
+  :param handle: 平台返回的远程文件标识。
+  """
+  max_handles = CONFIG().max_handles
+  if not max_handles:
+    return
+  handles = CACHE().handles.setdefault(_bot_key(bot), {})
+  handles.pop(digest, None)
+  handles[digest] = handle
+  while len(handles) > max_handles:
+    del handles[next(iter(handles))]
+
+
+def forget_handle(bot: Bot, handle: str) -> None:
+  """
+  忘记失效的远程文件标识，下次发送时会重新上传。
+
+  :param bot: 使用该标识发送失败的机器人。
+  :param handle: 远程文件标识。
+  """
+  handles = CACHE().handles.get(_bot_key(bot))
+  if not handles:
+    return
+  for digest in [digest for digest, value in handles.items() if value == handle]:
+    del handles[digest]
+
+
+def local_file(data: bytes, suffix: str = "") -> Path:
+  """
+  把媒体内容写入以哈希命名的本地文件，内容相同时直接返回已有的文件。
+  这个函数会阻塞，应该在 run_sync 中调用。
+
+  :param data: 文件内容。
+  :param suffix: 文件拓展名，例如 `.png`。
+  :return: 文件的绝对路径。
+  """
+  path = MEDIA_DIR / f"{media_digest(data)}{suffix}"
+  try:
+    os.utime(path)
+  except FileNotFoundError:
+    pass
+  else:
+    return path.resolve()
+  MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+  # 同样的内容可能同时被多个线程写入，每个线程使用自己的临时文件
+  with tempfile.NamedTemporaryFile(dir=MEDIA_DIR, suffix=".tmp", delete=False) as f:
+    f.write(data)
+  Path(f.name).replace(path)
+  # 刚写入的文件马上就要发送，不能删除
+  _evictor.written(len(data), CONFIG().local_files_size, path)
+  return path.resolve()
@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Any
 
 import nonebot
+from anyio.to_thread import run_sync
 from nonebot.adapters import Bot as BaseBot
 from nonebot.adapters.onebot.v11 import Adapter, Bot, Message, MessageSegment
 from pydantic import TypeAdapter
@@ -10,11 +11,14 @@ from pydantic import TypeAdapter
 from idhagnbot.hook.common import (
   CALLED_API_REGISTRY,
   CALLING_API_REGISTRY,
+  MEDIA_CALLING_API_REGISTRY,
   SentMessage,
   call_message_send_failed_hook,
   call_message_sending_hook,
   call_message_sent_hook,
 )
+from idhagnbot.hook.media import CONFIG as MEDIA_CONFIG
+from idhagnbot.hook.media import local_file
 from idhagnbot.message import unimsg_of
 from idhagnbot.url import path_from_url
 
@@ -132,6 +136,33 @@ async def on_called_api(
       await call_message_sent_hook(bot, message, messages, target)
 
 
+async def _localize_media(message: Message) -> None:
+  for seg in message:
+    if seg.type == "node" and isinstance(content := seg.data.get("content"), Message):
+      await _localize_media(content)
+    elif seg.type in ("image", "record", "video") and (
+      (file := seg.data.get("file")) and isinstance(file, str) and file.startswith("base64://")
+    ):
+      raw = base64.b64decode(file[9:])
+      path = await run_sync(local_file, raw)
+      seg.data["file"] = path.as_uri()
+
+
+async def on_calling_api_media(bot: BaseBot, api: str, data: dict[str, Any]) -> None:
+  if not MEDIA_CONFIG().onebot_local_files:
+    return
+  if api in ("send_private_msg", "send_group_msg", "send_msg"):
+    key = "message"
+  elif api in ("send_private_forward_msg", "send_group_forward_msg", "send_forward_msg"):
+    key = "messages"
+  else:
+    return
+  message = _normalize_message(data[key])
+  await _localize_media(message)
+  data[key] = message
+
+
 def register() -> None:
   CALLING_API_REGISTRY[Adapter.get_name()] = on_calling_api
   CALLED_API_REGISTRY[Adapter.get_name()] = on_called_api
+  MEDIA_CALLING_API_REGISTRY[Adapter.get_name()] = on_calling_api_media
@@ -11,11 +11,14 @@ from pydantic_core import to_jsonable_python
 from idhagnbot.hook.common import (
   CALLED_API_REGISTRY,
   CALLING_API_REGISTRY,
+  MEDIA_CALLED_API_REGISTRY,
+  MEDIA_CALLING_API_REGISTRY,
   SentMessage,
   call_message_send_failed_hook,
   call_message_sending_hook,
   call_message_sent_hook,
 )
+from idhagnbot.hook.media import forget_handle, get_handle, media_digest, put_handle
 from idhagnbot.message import unimsg_of
 from idhagnbot.url import path_from_url
 
@@ -23,6 +26,17 @@ nonebot.require("nonebot_plugin_alconna")
 from nonebot_plugin_alconna import Segment, SupportScope, Target, UniMessage
 from nonebot_plugin_alconna.uniseg.segment import Media
 
+MEDIA_APIS = {
+  "send_photo": "photo",
+  "send_audio": "audio",
+  "send_document": "document",
+  "send_video": "video",
+  "send_animation": "animation",
+  "send_voice": "voice",
+  "send_video_note": "video_note",
+  "send_sticker": "sticker",
+}
+
 
 def _normalize_entities(entities: list[MessageEntity | dict[str, Any]]) -> list[dict[str, Any]]:
   return [
@@ -258,6 +272,49 @@ async def on_called_api(
     await call_message_send_failed_hook(bot, message, target, e)
 
 
+def _media_content(file: Any) -> bytes | None:
+  if isinstance(file, bytes):
+    return file
+  if isinstance(file, tuple) and isinstance(file[-1], bytes):
+    return file[-1]
+  return None
+
+
+async def on_calling_api_media(bot: Bot, api: str, data: dict[str, Any]) -> None:
+  if (
+    (key := MEDIA_APIS.get(api))
+    and (content := _media_content(data.get(key)))
+    and (handle := get_handle(bot, media_digest(content)))
+  ):
+    data[key] = handle
+
+
+async def on_called_api_media(
+  bot: Bot,
+  e: Exception | None,
+  api: str,
+  data: dict[str, Any],
+  result: Any,
+) -> None:
+  if not (key := MEDIA_APIS.get(api)):
+    return
+  file = data.get(key)
+  if e:
+    if isinstance(file, str):
+      forget_handle(bot, file)
+    return
+  if (content := _media_content(file)) is None:
+    return
+  media = result.get(key)
+  if key == "photo":
+    # 照片会返回多个尺寸，复用最大的一个，也就是原图
+    media = media[-1] if media else None
+  if isinstance(media, dict) and (file_id := media.get("file_id")):
+    put_handle(bot, media_digest(content), file_id)
+
+
 def register() -> None:
   CALLING_API_REGISTRY[Adapter.get_name()] = on_calling_api
   CALLED_API_REGISTRY[Adapter.get_name()] = on_called_api
+  MEDIA_CALLING_API_REGISTRY[Adapter.get_name()] = on_calling_api_media
+  MEDIA_CALLED_API_REGISTRY[Adapter.get_name()] = on_called_api_media
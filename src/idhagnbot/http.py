@@ -1,20 +1,683 @@
+import hashlib
+import json
+import random
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, ClassVar
+from uuid import uuid4
+
 import aiohttp
+import anyio
 import nonebot
+from nonebot import logger
+from pydantic import BaseModel, Field, ValidationError
+from yarl import URL
+
+from idhagnbot.asyncio import SingleFlight
+from idhagnbot.config import CACHE_DIR, Reloadable, SharedConfig
+from idhagnbot.http_replay import ReplayServer, recording_response_class, replay_request_class
 
-__all__ = ["BROWSER_UA", "get_session"]
-_session: aiohttp.ClientSession | None = None
+__all__ = [
+  "BROWSER_UA",
+  "CachedResponse",
+  "CircuitBreaker",
+  "CircuitOpenError",
+  "CircuitState",
+  "HostStats",
+  "RetryPolicy",
+  "SessionConfig",
+  "fetch_cached",
+  "get_session",
+  "host_stats",
+  "request",
+]
 _driver = nonebot.get_driver()
 BROWSER_UA = "Mozilla/5.0 (X11; Linux x86_64; rv:139.0) Gecko/20100101 Firefox/139.0"
 
 
-def get_session() -> aiohttp.ClientSession:
-  global _session
-  if _session is None:
-    _session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar())
-  return _session
+class SessionConfig(BaseModel):
+  """
+  一个具名会话的连接池、超时和代理配置。aiohttp 的超时和代理只能按会话或按请求设置，
+  因此按上游（例如 booru、steam、bilibili）划分会话，每个会话通常只访问一个或几个主机。
+  """
+
+  limit: int = 100
+  """总连接数上限。"""
+
+  limit_per_host: int = 10
+  """单个主机的连接数上限，防止一个慢速的上游占满所有连接。"""
+
+  dns_cache_ttl: int | None = 300
+  """DNS 缓存秒数，为 None 时永久缓存。"""
+
+  keepalive_timeout: float = 15
+  """空闲连接保留的秒数。"""
+
+  timeout: float | None = 300
+  """单个请求（包括读取响应）的总超时秒数，为 None 时不限制。"""
+
+  connect_timeout: float | None = 10
+  """
+  建立 TCP 连接的超时秒数，不包括等待连接池的时间，
+  向同一主机的大量并发请求排队时只受总超时限制。
+  """
+
+  read_timeout: float | None = 60
+  """两次读取之间的超时秒数。"""
+
+  proxy: str | None = None
+  """默认代理，请求中指定的 proxy 参数优先。"""
+
+
+class Config(BaseModel):
+  default: SessionConfig = Field(default_factory=SessionConfig)
+  sessions: dict[str, SessionConfig] = Field(default_factory=dict)
+  """按名称覆盖的会话配置，例如 booru、steam、bilibili。"""
+
+  breaker_threshold: int = 5
+  """同一主机连续失败多少次后断路，为 0 时禁用断路器。"""
+
+  breaker_timeout: float = 30
+  """断路后多少秒再尝试一次请求。"""
+
+  retry_ratio: float = 0.2
+  """重试预算，每个主机的重试次数最多约为请求次数的多少倍。"""
+
+  retry_burst: int = 10
+  """重试预算的上限，即短时间内最多允许多少次重试。"""
+
+  record_dir: Path | None = None
+  """把读取过的响应录制到这个目录，参见 idhagnbot.http_replay。"""
+
+  replay_dir: Path | None = None
+  """启动内置的回放服务器，所有请求都由这个目录中录制的响应回答。"""
+
+  replay_url: str | None = None
+  """把所有请求发送到这个外部回放服务器，优先于 replay_dir。"""
+
+  replay_latency: float = 0
+  """内置回放服务器的固定延迟秒数。"""
+
+  replay_jitter: float = 0
+  """内置回放服务器的随机延迟秒数。"""
+
+  replay_failure_rate: float = 0
+  """内置回放服务器随机返回 503 的比例。"""
+
+
+CONFIG = SharedConfig("http", Config, Reloadable.FALSE)
+
+
+@dataclass
+class HostStats:
+  """单个主机的请求统计。"""
+
+  requests: int = 0
+  """完成的请求数（收到响应头）。"""
+
+  errors: int = 0
+  """出错（超时、连接失败等）的请求数。"""
+
+  bad_statuses: int = 0
+  """状态码不低于 400 的响应数。"""
+
+  bytes_sent: int = 0
+  """发送的请求体字节数。"""
+
+  bytes_received: int = 0
+  """接收的响应体字节数。"""
+
+  total_latency: float = 0
+  """从发起请求到收到响应头的总秒数。"""
+
+  max_latency: float = 0
+  """从发起请求到收到响应头的最大秒数。"""
+
+  retries: int = 0
+  """request 重试的次数。"""
+
+  rejected: int = 0
+  """因断路而直接失败的请求数。"""
+
+  @property
+  def average_latency(self) -> float:
+    """
+    平均延迟，没有请求时为 0。
+
+    :return: 平均延迟秒数。
+    """
+    return self.total_latency / self.requests if self.requests else 0.0
+
+
+@dataclass
+class CachedResponse:
+  """fetch_cached 的结果。"""
+
+  url: str
+  body: bytes
+  content_type: str
+  validated: datetime
+  """上一次确认内容没有过时的时间。"""
+
+  from_cache: bool
+  """内容是否来自本地缓存（没有过期或服务器返回 304）。"""
+
+  stale: bool
+  """请求失败，内容是可能过时的旧数据。"""
+
+  def text(self, encoding: str = "utf-8") -> str:
+    return self.body.decode(encoding)
+
+  def json(self) -> Any:
+    return json.loads(self.body)
+
+
+class _CacheMeta(BaseModel):
+  url: str
+  etag: str | None = None
+  last_modified: str | None = None
+  content_type: str = "application/octet-stream"
+  validated: datetime
+
+
+_sessions = dict[str, aiohttp.ClientSession]()
+_replay_server: ReplayServer | None = None
+_replay_base: URL | None = None
+_host_stats = dict[str, HostStats]()
+_cache_dir = anyio.Path(CACHE_DIR / "http")
+_cache_flight = SingleFlight[CachedResponse]("http_cache")
+
+
+def _stats_for(url: URL) -> HostStats:
+  return _stats_for_host(url.host or "")
+
+
+def _stats_for_host(host: str) -> HostStats:
+  if (stats := _host_stats.get(host)) is None:
+    stats = _host_stats[host] = HostStats()
+  return stats
+
+
+async def _on_request_start(
+  session: aiohttp.ClientSession,
+  ctx: SimpleNamespace,
+  params: aiohttp.TraceRequestStartParams,
+) -> None:
+  ctx.start = time.perf_counter()
+  # 同一个请求的所有回调共享 ctx，后续回调中的 URL 可能已经被回放改写到回放服务器，
+  # 统计要记在原始的主机上
+  ctx.stats = _stats_for(params.url)
+
+
+async def _on_request_end(
+  session: aiohttp.ClientSession,
+  ctx: SimpleNamespace,
+  params: aiohttp.TraceRequestEndParams,
+) -> None:
+  stats: HostStats = ctx.stats
+  latency = time.perf_counter() - ctx.start
+  stats.requests += 1
+  stats.total_latency += latency
+  stats.max_latency = max(stats.max_latency, latency)
+  if params.response.status >= 400:
+    stats.bad_statuses += 1
+
+
+async def _on_request_exception(
+  session: aiohttp.ClientSession,
+  ctx: SimpleNamespace,
+  params: aiohttp.TraceRequestExceptionParams,
+) -> None:
+  ctx.stats.errors += 1
+
+
+async def _on_request_chunk_sent(
+  session: aiohttp.ClientSession,
+  ctx: SimpleNamespace,
+  params: aiohttp.TraceRequestChunkSentParams,
+) -> None:
+  ctx.stats.bytes_sent += len(params.chunk)
+
+
+async def _on_response_chunk_received(
+  session: aiohttp.ClientSession,
+  ctx: SimpleNamespace,
+  params: aiohttp.TraceResponseChunkReceivedParams,
+) -> None:
+  ctx.stats.bytes_received += len(params.chunk)
+
+
+def _create_trace_config() -> aiohttp.TraceConfig:
+  trace_config = aiohttp.TraceConfig()
+  trace_config.on_request_start.append(_on_request_start)
+  trace_config.on_request_end.append(_on_request_end)
+  trace_config.on_request_exception.append(_on_request_exception)
+  trace_config.on_request_chunk_sent.append(_on_request_chunk_sent)
+  trace_config.on_response_chunk_received.append(_on_response_chunk_received)
+  return trace_config
+
+
+def _create_session(config: SessionConfig) -> aiohttp.ClientSession:
+  kw = dict[str, Any]()
+  if config.proxy:
+    kw["proxy"] = config.proxy
+  if record_dir := CONFIG().record_dir:
+    kw["response_class"] = recording_response_class(record_dir)
+  if _replay_base:
+    kw["request_class"] = replay_request_class(_replay_base)
+  connector = aiohttp.TCPConnector(
+    limit=config.limit,
+    limit_per_host=config.limit_per_host,
+    ttl_dns_cache=config.dns_cache_ttl,
+    keepalive_timeout=config.keepalive_timeout,
+  )
+  timeout = aiohttp.ClientTimeout(
+    total=config.timeout,
+    sock_connect=config.connect_timeout,
+    sock_read=config.read_timeout,
+  )
+  return aiohttp.ClientSession(
+    connector=connector,
+    timeout=timeout,
+    cookie_jar=aiohttp.DummyCookieJar(),
+    trace_configs=[_create_trace_config()],
+    **kw,
+  )
+
+
+def get_session(name: str = "default") -> aiohttp.ClientSession:
+  """
+  获取共享的 HTTP 会话。不同名称的会话使用独立的连接池，
+  可以在配置文件中分别设置连接数、超时和代理，一个上游变慢时不会影响其他会话。
+
+  :param name: 会话名称，配置文件中没有对应项时使用默认配置。
+  :return: 会话。
+  """
+  if (session := _sessions.get(name)) is None or session.closed:
+    config = CONFIG()
+    session = _sessions[name] = _create_session(config.sessions.get(name, config.default))
+  return session
+
+
+def host_stats() -> dict[str, HostStats]:
+  """
+  获取各个主机的请求统计。
+
+  :return: 主机名到统计信息的字典。
+  """
+  return dict(_host_stats)
+
+
+class CircuitOpenError(aiohttp.ClientError):
+  def __init__(self, host: str, retry_after: float) -> None:
+    super().__init__(f"{host} 的断路器已打开，{retry_after:.1f} 秒后重试")
+    self.host = host
+    self.retry_after = retry_after
+
+
+class CircuitState(Enum):
+  CLOSED = "closed"
+  OPEN = "open"
+  HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+  """
+  单个主机的断路器和重试预算。连续失败达到阈值后断路，一段时间内的请求直接失败，
+  而不是等待超时；之后放行一个请求试探，成功则恢复。
+  """
+
+  all: ClassVar[dict[str, "CircuitBreaker"]] = {}
+  """所有主机的断路器，用于统计。"""
+
+  def __init__(self, host: str) -> None:
+    self.host = host
+    self.state = CircuitState.CLOSED
+    self.failures = 0
+    self.opened_at = 0.0
+    config = CONFIG()
+    self.retry_tokens = float(config.retry_burst)
+    self.all[host] = self
+
+  @staticmethod
+  def get(host: str) -> "CircuitBreaker":
+    if (breaker := CircuitBreaker.all.get(host)) is None:
+      breaker = CircuitBreaker(host)
+    return breaker
+
+  def check(self, retry: bool = False) -> None:
+    """
+    检查是否允许请求，断路时抛出 CircuitOpenError。
+
+    :param retry: 是否是重试，只有新的请求才会补充重试预算。
+    """
+    config = CONFIG()
+    if self.state is CircuitState.CLOSED:
+      if not retry:
+        self.retry_tokens = min(self.retry_tokens + config.retry_ratio, config.retry_burst)
+      return
+    elapsed = time.monotonic() - self.opened_at
+    if self.state is CircuitState.OPEN and elapsed >= config.breaker_timeout:
+      # 放行一个请求试探，其他请求在结果出来之前仍然直接失败
+      self.state = CircuitState.HALF_OPEN
+      return
+    _stats_for_host(self.host).rejected += 1
+    raise CircuitOpenError(self.host, max(config.breaker_timeout - elapsed, 0))
+
+  def success(self) -> None:
+    self.state = CircuitState.CLOSED
+    self.failures = 0
+
+  def failure(self) -> None:
+    config = CONFIG()
+    self.failures += 1
+    if config.breaker_threshold and (
+      self.state is CircuitState.HALF_OPEN or self.failures >= config.breaker_threshold
+    ):
+      if self.state is not CircuitState.OPEN:
+        logger.warning(
+          f"{self.host} 连续失败 {self.failures} 次，断路 {config.breaker_timeout} 秒",
+        )
+      self.state = CircuitState.OPEN
+      self.opened_at = time.monotonic()
+
+  def abort(self) -> None:
+    """试探请求因为其他原因（例如被取消）没有结果时重新断路，等下一次超时后再试探。"""
+    if self.state is CircuitState.HALF_OPEN:
+      self.state = CircuitState.OPEN
+      self.opened_at = time.monotonic()
+
+  def take_retry(self) -> bool:
+    """
+    从重试预算中取出一次重试。
+
+    :return: 预算是否足够。
+    """
+    if self.retry_tokens < 1:
+      return False
+    self.retry_tokens -= 1
+    return True
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+  """request 的重试策略。"""
+
+  attempts: int = 3
+  """最多尝试的次数（包括第一次）。"""
+
+  base_delay: float = 0.5
+  """第一次重试前的最长等待秒数，之后每次翻倍。"""
+
+  max_delay: float = 30
+  """重试前的最长等待秒数。"""
+
+  statuses: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+  """需要重试的状态码。"""
+
+  unsafe: bool = False
+  """是否重试 POST 等非幂等请求，需要请求体能被重复发送。"""
+
+  def delay(self, attempt: int) -> float:
+    """
+    计算第 attempt 次重试（从 0 开始）前的等待秒数，使用完全随机抖动，避免多个请求同时重试。
+
+    :param attempt: 重试序号。
+    :return: 等待秒数。
+    """
+    return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+DEFAULT_RETRY = RetryPolicy()
+NO_RETRY = RetryPolicy(attempts=1)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> float | None:
+  try:
+    return float(response.headers.get("Retry-After", ""))
+  except ValueError:
+    return None
+
+
+@asynccontextmanager
+async def request(
+  method: str,
+  url: str,
+  *,
+  session: str = "default",
+  retry: RetryPolicy = DEFAULT_RETRY,
+  raise_for_status: bool = False,
+  **kw: Any,
+) -> AsyncGenerator[aiohttp.ClientResponse, None]:
+  """
+  发送请求，网络错误或特定状态码时按策略重试，并经过目标主机的断路器。
+  重试次数同时受主机的重试预算限制，上游整体故障时不会成倍放大请求。
+
+  :param method: 请求方法。
+  :param url: URL。
+  :param session: 使用的会话名称，参见 get_session。
+  :param retry: 重试策略。
+  :param raise_for_status: 重试结束后状态码不低于 400 时是否抛出 ClientResponseError。
+  :param kw: 传给 aiohttp.ClientSession.request 的其他参数。
+  :return: 响应的异步上下文管理器。
+  """
+  http = get_session(session)
+  breaker = CircuitBreaker.get(URL(url).host or "")
+  attempts = retry.attempts if retry.unsafe or method.upper() in IDEMPOTENT_METHODS else 1
+  attempt = 0
+  while True:
+    breaker.check(retry=attempt > 0)
+    last = attempt + 1 >= attempts
+    try:
+      response = await http.request(method, url, **kw)
+    except (aiohttp.ClientConnectionError, TimeoutError):
+      breaker.failure()
+      if last or not breaker.take_retry():
+        raise
+      delay = retry.delay(attempt)
+    except BaseException:
+      breaker.abort()
+      raise
+    else:
+      if response.status < 500:
+        breaker.success()
+      else:
+        breaker.failure()
+      if response.status not in retry.statuses or last or not breaker.take_retry():
+        break
+      delay = retry.delay(attempt)
+      if (retry_after := _retry_after(response)) is not None:
+        delay = min(max(delay, retry_after), retry.max_delay)
+      response.release()
+    _stats_for_host(breaker.host).retries += 1
+    attempt += 1
+    await anyio.sleep(delay)
+  if raise_for_status:
+    response.raise_for_status()
+  try:
+    yield response
+  finally:
+    response.release()
+
+
+def _cache_paths(url: str) -> tuple[anyio.Path, anyio.Path]:
+  name = hashlib.sha256(url.encode()).hexdigest()
+  return _cache_dir / f"{name}.json", _cache_dir / f"{name}.body"
+
+
+async def _load_cache_meta(meta_path: anyio.Path, body_path: anyio.Path) -> _CacheMeta | None:
+  if not (await meta_path.exists() and await body_path.exists()):
+    return None
+  try:
+    return _CacheMeta.model_validate_json(await meta_path.read_bytes())
+  except ValidationError:
+    return None
+
+
+async def _write_atomic(path: anyio.Path, data: bytes) -> None:
+  # 同一个 URL 可能有多个使用不同参数的请求同时写入，每个请求使用自己的临时文件
+  temp_path = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+  try:
+    await temp_path.write_bytes(data)
+    await temp_path.replace(path)
+  finally:
+    await temp_path.unlink(missing_ok=True)
+
+
+async def _read_body(body_path: anyio.Path) -> bytes | None:
+  try:
+    return await body_path.read_bytes()
+  except FileNotFoundError:
+    return None
+
+
+async def _fetch_cached(
+  url: str,
+  session: str,
+  max_age: timedelta,
+  stale_if_error: bool,
+  headers: dict[str, str],
+  proxy: str | None,
+  *,
+  conditional: bool = True,
+) -> CachedResponse:
+  meta_path, body_path = _cache_paths(url)
+  meta = await _load_cache_meta(meta_path, body_path) if conditional else None
+  now = datetime.now(UTC)
+  if meta and now - meta.validated < max_age and (body := await _read_body(body_path)) is not None:
+    return CachedResponse(
+      url,
+      body,
+      meta.content_type,
+      meta.validated,
+      from_cache=True,
+      stale=False,
+    )
+  request_headers = dict(headers)
+  if meta and meta.etag:
+    request_headers["If-None-Match"] = meta.etag
+  if meta and meta.last_modified:
+    request_headers["If-Modified-Since"] = meta.last_modified
+  try:
+    async with request(
+      "GET",
+      url,
+      session=session,
+      headers=request_headers,
+      proxy=proxy,
+    ) as response:
+      if meta and response.status == 304:
+        body = await _read_body(body_path)
+        if body is not None:
+          meta.validated = now
+          await _write_atomic(meta_path, meta.model_dump_json().encode())
+          return CachedResponse(url, body, meta.content_type, now, from_cache=True, stale=False)
+      else:
+        response.raise_for_status()
+        body = await response.read()
+        new_meta = _CacheMeta(
+          url=url,
+          etag=response.headers.get("ETag"),
+          last_modified=response.headers.get("Last-Modified"),
+          content_type=response.content_type,
+          validated=now,
+        )
+  except (aiohttp.ClientError, TimeoutError):
+    if meta and stale_if_error and (body := await _read_body(body_path)) is not None:
+      logger.exception(f"请求 {url} 失败，使用 {meta.validated} 的缓存")
+      return CachedResponse(
+        url,
+        body,
+        meta.content_type,
+        meta.validated,
+        from_cache=True,
+        stale=True,
+      )
+    raise
+  if body is None:
+    # 服务器返回 304，但缓存的内容已经被删除，只能不带条件地重新请求
+    return await _fetch_cached(
+      url,
+      session,
+      max_age,
+      stale_if_error,
+      headers,
+      proxy,
+      conditional=False,
+    )
+  # 先删除元数据，写入中途出错时不会留下与内容不匹配的 ETag
+  await _cache_dir.mkdir(parents=True, exist_ok=True)
+  await meta_path.unlink(missing_ok=True)
+  await _write_atomic(body_path, body)
+  await _write_atomic(meta_path, new_meta.model_dump_json().encode())
+  return CachedResponse(url, body, new_meta.content_type, now, from_cache=False, stale=False)
+
+
+async def fetch_cached(
+  url: str,
+  *,
+  session: str = "default",
+  max_age: timedelta = timedelta(),
+  stale_if_error: bool = True,
+  headers: dict[str, str] | None = None,
+  proxy: str | None = None,
+) -> CachedResponse:
+  """
+  获取 URL 的内容并缓存到磁盘，再次请求时使用 ETag 和 Last-Modified 验证缓存是否过时，
+  适用于较大且不经常变化的文件。参数相同的并发请求会被合并。
+
+  :param url: URL。
+  :param session: 使用的会话名称，参见 get_session。
+  :param max_age: 缓存在多长时间内直接使用而不验证，默认每次都验证。
+  :param stale_if_error: 请求失败时是否使用过时的缓存。
+  :param headers: 额外的请求头。
+  :param proxy: 代理。
+  :return: 响应内容。
+  """
+  headers = headers or {}
+  # 参数不同的请求结果可能不同，不能合并
+  key = (url, session, max_age, stale_if_error, tuple(sorted(headers.items())), proxy)
+  return await _cache_flight(
+    key,
+    lambda: _fetch_cached(url, session, max_age, stale_if_error, headers, proxy),
+  )
+
+
+@_driver.on_startup
+async def on_startup() -> None:
+  global _replay_server, _replay_base
+  config = CONFIG()
+  if config.replay_url:
+    _replay_base = URL(config.replay_url)
+  elif config.replay_dir:
+    _replay_server = ReplayServer(
+      config.replay_dir,
+      latency=config.replay_latency,
+      jitter=config.replay_jitter,
+      failure_rate=config.replay_failure_rate,
+    )
+    _replay_base = await _replay_server.start()
+  if _replay_base:
+    logger.warning(f"所有 HTTP 请求都将由回放服务器 {_replay_base} 回答")
+    # 丢弃启动前创建的会话
+    for session in _sessions.values():
+      await session.close()
+    _sessions.clear()
 
 
 @_driver.on_shutdown
 async def on_shutdown() -> None:
-  if _session:
-    await _session.close()
+  global _replay_server
+  for session in _sessions.values():
+    await session.close()
+  _sessions.clear()
+  if _replay_server:
+    await _replay_server.close()
+    _replay_server = None
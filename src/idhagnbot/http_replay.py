@@ -0,0 +1,214 @@
+"""
+录制第三方 API 的响应并在本地回放，用于离线、可重复地测试和压测插件。
+回放服务器可以单独运行（导入 idhagnbot 包需要先初始化 NoneBot，因此不能用 python -m）：
+
+python scripts/http_replay.py <录制目录> [--latency 秒] [--failure-rate 比例]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+import anyio
+from aiohttp import web
+from pydantic import BaseModel, ValidationError
+from yarl import URL
+
+__all__ = [
+  "Fixture",
+  "ReplayServer",
+  "ReplayStats",
+  "fixture_path",
+  "recording_response_class",
+  "replay_request_class",
+]
+# 录制的内容已经解压，这些头不再适用
+SKIP_HEADERS = {
+  "connection",
+  "content-encoding",
+  "content-length",
+  "keep-alive",
+  "set-cookie",
+  "transfer-encoding",
+}
+
+
+class Fixture(BaseModel):
+  method: str
+  url: str
+  status: int
+  headers: list[tuple[str, str]]
+  body: str
+  """Base64 编码的响应体。"""
+
+
+def fixture_path(directory: Path, method: str, url: str) -> Path:
+  """
+  获取请求对应的录制文件路径。
+
+  :param directory: 录制目录。
+  :param method: 请求方法。
+  :param url: 原始 URL。
+  :return: 文件路径。
+  """
+  key = hashlib.sha256(f"{method.upper()} {url}".encode()).hexdigest()
+  return directory / f"{key}.json"
+
+
+def recording_response_class(directory: Path) -> type[aiohttp.ClientResponse]:
+  """
+  创建在读取响应体时把响应保存到录制目录的响应类，用于 ClientSession 的 response_class 参数。
+  只有通过 read、text 或 json 读取的响应会被录制，按块读取的流式响应不会。
+
+  :param directory: 录制目录。
+  :return: 响应类。
+  """
+
+  class RecordingResponse(aiohttp.ClientResponse):
+    async def read(self) -> bytes:
+      body = await super().read()
+      # 重定向时按最初请求的 URL 保存，回放时直接返回最终的响应
+      request = self.history[0].request_info if self.history else self.request_info
+      fixture = Fixture(
+        method=request.method,
+        url=str(request.url),
+        status=self.status,
+        headers=[(k, v) for k, v in self.headers.items() if k.lower() not in SKIP_HEADERS],
+        body=base64.b64encode(body).decode(),
+      )
+      path = anyio.Path(fixture_path(directory, fixture.method, fixture.url))
+      await path.parent.mkdir(parents=True, exist_ok=True)
+      await path.write_text(fixture.model_dump_json(indent=2))
+      return body
+
+  return RecordingResponse
+
+
+def replay_request_class(base: URL) -> type[aiohttp.ClientRequest]:
+  """
+  创建把所有请求改写到回放服务器的请求类，用于 ClientSession 的 request_class 参数。
+  原始 URL 编码在路径中，例如 https://example.com/a?b 会被改写为 {base}/https/example.com/a?b。
+
+  :param base: 回放服务器的地址。
+  :return: 请求类。
+  """
+
+  prefix = str(base).rstrip("/")
+
+  class ReplayRequest(aiohttp.ClientRequest):
+    def __init__(self, method: str, url: URL, *args: Any, **kw: Any) -> None:
+      kw["proxy"] = None
+      url = URL(f"{prefix}/{url.scheme}/{url.raw_authority}{url.raw_path_qs}", encoded=True)
+      super().__init__(method, url, *args, **kw)
+
+  return ReplayRequest
+
+
+@dataclass
+class ReplayStats:
+  served: int = 0
+  """返回录制内容的次数。"""
+
+  missing: int = 0
+  """没有对应录制文件的次数。"""
+
+  failures: int = 0
+  """注入失败的次数。"""
+
+
+class ReplayServer:
+  """在本地回放录制内容的 HTTP 服务器，可以模拟延迟和故障。"""
+
+  def __init__(
+    self,
+    directory: Path,
+    *,
+    latency: float = 0,
+    jitter: float = 0,
+    failure_rate: float = 0,
+    failure_status: int = 503,
+  ) -> None:
+    """
+    创建回放服务器。
+
+    :param directory: 录制目录。
+    :param latency: 每个响应的固定延迟秒数。
+    :param jitter: 在固定延迟之外额外随机延迟的最大秒数。
+    :param failure_rate: 随机返回错误的比例，范围 0 - 1。
+    :param failure_status: 注入错误时返回的状态码。
+    """
+    self.directory = directory
+    self.latency = latency
+    self.jitter = jitter
+    self.failure_rate = failure_rate
+    self.failure_status = failure_status
+    self.stats = ReplayStats()
+    self.app = web.Application()
+    self.app.router.add_route("*", "/{scheme}/{path:.*}", self.handle)
+    self.__runner: web.AppRunner | None = None
+
+  async def handle(self, request: web.Request) -> web.Response:
+    await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+    if random.random() < self.failure_rate:
+      self.stats.failures += 1
+      return web.Response(status=self.failure_status)
+    _, scheme, rest = request.raw_path.split("/", 2)
+    url = f"{scheme}://{rest}"
+    path = anyio.Path(fixture_path(self.directory, request.method, url))
+    try:
+      fixture = Fixture.model_validate_json(await path.read_bytes())
+    except (OSError, ValidationError):
+      self.stats.missing += 1
+      return web.Response(status=404, text=f"没有录制 {request.method} {url}")
+    self.stats.served += 1
+    return web.Response(
+      status=fixture.status,
+      headers=fixture.headers,
+      body=base64.b64decode(fixture.body),
+    )
+
+  async def start(self, host: str = "127.0.0.1", port: int = 0) -> URL:
+    """
+    在后台启动服务器。
+
+    :param host: 监听地址。
+    :param port: 监听端口，为 0 时随机选择。
+    :return: 服务器地址，用于 replay_request_class。
+    """
+    self.__runner = web.AppRunner(self.app)
+    await self.__runner.setup()
+    site = web.TCPSite(self.__runner, host, port)
+    await site.start()
+    port = self.__runner.addresses[0][1]
+    return URL.build(scheme="http", host=host, port=port)
+
+  async def close(self) -> None:
+    if self.__runner:
+      await self.__runner.cleanup()
+      self.__runner = None
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="回放录制的 HTTP 响应")
+  parser.add_argument("directory", type=Path)
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--latency", type=float, default=0)
+  parser.add_argument("--jitter", type=float, default=0)
+  parser.add_argument("--failure-rate", type=float, default=0)
+  parser.add_argument("--failure-status", type=int, default=503)
+  args = parser.parse_args()
+  server = ReplayServer(
+    args.directory,
+    latency=args.latency,
+    jitter=args.jitter,
+    failure_rate=args.failure_rate,
+    failure_status=args.failure_status,
+  )
+  web.run_app(server.app, host=args.host, port=args.port)
@@ -1,23 +1,36 @@
 """Pillow 图像处理配方。"""
 
+import functools
+import hashlib
 import math
 import mimetypes
-from collections.abc import Callable, Generator, Sequence
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from collections.abc import Callable, Generator, Hashable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
-from typing import Any, Literal, Protocol, TypeVar, cast, overload
+from pathlib import Path
+from typing import Any, Literal, ParamSpec, Protocol, TypeVar, cast, overload
 
 import cairo
 import nonebot
+from aiohttp import ClientResponse
 from aiohttp.typedefs import LooseHeaders
 from anyio.to_thread import run_sync
 from nonebot import logger
 from nonebot.adapters import Bot
+from nonebot.matcher import current_bot
 from PIL import Image, ImageChops, ImageFile, ImageOps, ImageSequence, features
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from idhagnbot import color
-from idhagnbot.config import SharedConfig
-from idhagnbot.http import get_session
+from idhagnbot.asyncio import SingleFlight
+from idhagnbot.cache import DirectoryEvictor, LRUCache, sizeof_image
+from idhagnbot.config import CACHE_DIR, SharedConfig
+from idhagnbot.http import get_session, request
 from idhagnbot.url import path_from_url
 
 nonebot.require("nonebot_plugin_alconna")
@@ -31,6 +44,9 @@ except ImportError:
 __all__ = [
   "AnyImage",
   "Color",
+  "ImageTooLargeError",
+  "OutputFormat",
+  "OutputPolicy",
   "PasteColor",
   "PerspectiveData",
   "PixelAccess",
@@ -44,21 +60,29 @@ __all__ = [
   "apply_circle_mask",
   "apply_mask",
   "apply_rounded_rectangle_mask",
+  "cached_primitive",
   "center_pad",
   "contain_down",
+  "encode_static",
   "ensure_mode",
   "ensure_pil",
+  "fingerprint",
   "flatten",
   "frames",
   "from_cairo",
+  "get_output_policy",
   "get_resample",
   "get_scale_resample",
+  "is_graphic",
   "load",
   "make_circle_mask",
+  "make_palette",
   "make_rounded_rectangle_mask",
   "open_url",
   "paste",
   "quantize",
+  "quantize_frames",
+  "read_url",
   "replace",
   "resize_canvas",
   "resize_height",
@@ -79,6 +103,50 @@ ScaleResample = Resample | Literal["box", "hamming", "lanczos"]
 Quantize = Literal["mediancut", "maxcoverage", "fastoctree"]
 """配置文件中使用的，可用于 RGB 图像的量化方式，不包括 libimagequant。"""
 
+OutputFormat = Literal["png", "jpeg", "webp"]
+"""配置文件中使用的，可用于编码静态图的格式。"""
+
+
+class OutputPolicy(BaseModel, use_attribute_docstrings=True):
+  """静态图的编码策略"""
+
+  formats: list[OutputFormat] = Field(default_factory=lambda: ["png", "jpeg"])
+  """
+  按优先级排列的候选格式，依次尝试，使用第一个不超过 max_bytes 的结果。
+  颜色较少的图片（例如文字和图表）总是先尝试 PNG，带透明度的图片不会使用 JPEG。
+  可选，默认为 ["png", "jpeg"]。
+  """
+
+  max_bytes: int = 2 * 1024 * 1024
+  """
+  编码结果的字节数预算，0 代表不限制（总是使用第一个候选格式）。
+  可选，默认为 2MiB。
+  """
+
+  max_time: float = 1
+  """
+  编码耗时预算，单位为秒，超过后不再尝试其他格式，使用已有结果中最小的一个，0 代表不限制。
+  可选，默认为 1。
+  """
+
+  png_compress_level: int = 6
+  """
+  PNG 的压缩等级，0 - 9，越大越慢。
+  可选，默认为 6。
+  """
+
+  jpeg_quality: int = 85
+  """
+  JPEG 的质量，0 - 95。
+  可选，默认为 85。
+  """
+
+  webp_quality: int = 80
+  """
+  WebP 的质量，0 - 100。
+  可选，默认为 80。
+  """
+
 
 class Config(BaseModel, use_attribute_docstrings=True):
   """图像处理全局配置"""
@@ -116,6 +184,73 @@ class Config(BaseModel, use_attribute_docstrings=True):
   可选，默认为 true。
   """
 
+  quantize_workers: int = 0
+  """
+  编码 GIF 时并行量化帧的线程数，0 代表自动（CPU 核心数，最多 8 个）。
+  可选，默认为 0。
+  """
+
+  url_cache_size: int = 64 * 1024 * 1024
+  """
+  open_url 在内存中缓存的已解码图片的总字节数，0 代表禁用内存缓存。动图不会被缓存在内存中。
+  可选，默认为 64MiB。
+  """
+
+  url_disk_cache_size: int = 256 * 1024 * 1024
+  """
+  open_url 在磁盘上缓存的原始图片文件的总字节数，0 代表禁用磁盘缓存。
+  可选，默认为 256MiB。
+  """
+
+  url_cache_ttl: float = 24 * 60 * 60
+  """
+  open_url 缓存的有效秒数，超过后重新下载，0 代表永不过期。
+  可选，默认为 1 天。
+  """
+
+  url_max_bytes: int = 32 * 1024 * 1024
+  """
+  open_url 最多下载的字节数，超过时抛出 ImageTooLargeError，0 代表不限制。
+  可选，默认为 32MiB。
+  """
+
+  url_max_pixels: int = 64 * 1024 * 1024
+  """
+  open_url 允许的最大像素数，在收到图片头时检查，超过时抛出 ImageTooLargeError，0 代表不限制。
+  可选，默认为 64M 像素。
+  """
+
+  segment_cache_size: int = 32 * 1024 * 1024
+  """
+  to_segment(cache=True) 缓存的编码结果的总字节数，0 代表禁用缓存。
+  可选，默认为 32MiB。
+  """
+
+  primitive_cache_size: int = 16 * 1024 * 1024
+  """
+  cached_primitive 缓存的遮罩、渐变等图元的总字节数（按未压缩像素计算），0 代表禁用缓存。
+  可选，默认为 16MiB。
+  """
+
+  preload_assets: bool = True
+  """
+  是否在启动时预加载所有已注册的静态图片资源（参见 idhagnbot.image.asset）。
+  关闭后资源在第一次使用时加载。
+  可选，默认为 true。
+  """
+
+  output: OutputPolicy = Field(default_factory=OutputPolicy)
+  """
+  to_segment 编码静态图的默认策略。
+  可选，默认值参见 OutputPolicy。
+  """
+
+  adapter_output: dict[str, OutputPolicy] = Field(default_factory=dict)
+  """
+  按适配器名称（例如 "Telegram"、"OneBot V11"）覆盖的编码策略。
+  可选，默认为空。
+  """
+
 
 CONFIG = SharedConfig("image", Config)
 """图像处理全局配置"""
@@ -142,6 +277,7 @@ AnyImage = Image.Image | cairo.ImageSurface
 """任何支持的图像，目前包括 Pillow 和 PyCairo 的图像。"""
 
 T = TypeVar("T")
+P = ParamSpec("P")
 
 _libimagequant_available: bool | None = None
 """libimagequant 是否可用，None 代表尚未检测。"""
@@ -149,6 +285,59 @@ _libimagequant_available: bool | None = None
 _libimagequant_warned: bool = False
 """libimagequant 不可用时，是否已发出警告。"""
 
+PALETTE_SAMPLE_FRAMES = 16
+"""生成共享调色板时最多采样的帧数。"""
+
+PALETTE_SAMPLE_PIXELS = 128 * 128
+"""生成共享调色板时每一帧采样的最大像素数。"""
+
+URL_CACHE_DIR = CACHE_DIR / "image"
+_url_cache_evictor = DirectoryEvictor(URL_CACHE_DIR)
+"""open_url 的磁盘缓存目录。"""
+
+_url_index = LRUCache[str, tuple[str, float]]("image_url", 4096)
+"""open_url 的 URL 到图片内容 SHA256 和下载时间的映射。"""
+
+_decoded_cache = LRUCache[tuple[str, Size | None], Image.Image](
+  "image_decoded",
+  Config().url_cache_size,
+  sizeof_image,
+)
+"""以内容 SHA256 和目标大小为键的已解码图片，内容相同的不同 URL 共享同一张图片。"""
+
+ESTIMATE_SAMPLE_SIZE = 256
+"""按策略编码静态图时，用于估算结果大小的中心区域边长。"""
+
+SNIFF_MIN_BYTES = 4096
+"""下载图片时，至少收到多少字节才开始尝试解析图片头。"""
+
+_segment_cache = LRUCache[Hashable, tuple[bytes, str, str]](
+  "image_segment",
+  Config().segment_cache_size,
+  lambda item: len(item[0]),
+)
+"""以图片指纹和编码参数为键的 to_segment 编码结果。"""
+
+_primitive_cache = LRUCache[Hashable, Image.Image](
+  "image_primitive",
+  Config().primitive_cache_size,
+  sizeof_image,
+)
+"""以生成函数和参数为键的图元，只交出副本。"""
+
+_url_flight = SingleFlight[tuple[bytes, float]]("image_url")
+"""合并对同一 URL 的并发下载。"""
+
+
+@CONFIG.onload
+def _(prev: Config | None, curr: Config) -> None:
+  _decoded_cache.max_size = curr.url_cache_size
+  _segment_cache.max_size = curr.segment_cache_size
+  _primitive_cache.max_size = curr.primitive_cache_size
+  # 图元可能用到重采样等配置，编码结果取决于量化、抖动等配置
+  _primitive_cache.clear()
+  _segment_cache.clear()
+
 
 def get_resample() -> Image.Resampling:
   """
@@ -166,6 +355,21 @@ def get_scale_resample() -> Image.Resampling:
   return Image.Resampling[CONFIG().scale_resample.upper()]
 
 
+_CAIRO_FORMATS: dict[cairo.Format, tuple[str, str]] = {
+  # cairo 的 A1 以 32 位整数为单位按平台字节序存放像素，小端序平台上第一个像素是最低位
+  cairo.Format.A1: ("1", "1;R" if sys.byteorder == "little" else "1"),
+  cairo.Format.A8: ("L", "L"),
+  cairo.Format.RGB24: ("RGB", "BGRX"),
+  cairo.Format.ARGB32: ("RGBA", "BGRa"),
+}
+"""PyCairo 格式到 (Pillow 模式, Pillow raw 编解码模式) 的映射。"""
+
+_PIL_MODES: dict[str, tuple[cairo.Format, str]] = {
+  mode: (surface_format, rawmode) for surface_format, (mode, rawmode) in _CAIRO_FORMATS.items()
+}
+"""Pillow 模式到 (PyCairo 格式, Pillow raw 编解码模式) 的映射。"""
+
+
 # TODO: 将 from_cairo 和 to_cairo 替换为 Rust 实现 https://github.com/su226/pil-cairo
 def from_cairo(surface: cairo.ImageSurface) -> Image.Image:
   """
@@ -178,36 +382,22 @@ def from_cairo(surface: cairo.ImageSurface) -> Image.Image:
   | RGB    | RGB24   |
   | RGBA   | ARGB32  |
 
+  直接从 ImageSurface 的缓冲区解码（包括字节序转换和反预乘），只产生一次拷贝。
+  转换后的图片不与 ImageSurface 共享内存，ImageSurface 可以随即销毁。
+
   :param surface: PyCairo 的 ImageSurface。
   :return: 转换后的 Pillow Image。
   """
-  w = surface.get_width()
-  h = surface.get_height()
-  data = surface.get_data()
-  stride = surface.get_stride()
   surface_format = surface.get_format()
-  if surface_format == cairo.Format.A1:
-    # Format.A1 的转换很慢
-    if not data:
-      return Image.new("1", (w, h))
-    data_w = math.ceil(w / 32) * 32
-    im = Image.frombuffer("1", (data_w, h), data.tobytes())
-    for x in range(0, w, 8):
-      im.paste(im.crop((x, 0, x + 8, h)).transpose(Image.Transpose.FLIP_LEFT_RIGHT), (x, 0))
-    return im.crop((0, 0, w, h))
-  if surface_format == cairo.Format.A8:
-    if not data:
-      return Image.new("L", (w, h))
-    return Image.frombuffer("L", (w, h), data.tobytes(), "raw", "L", stride, 1)
-  if surface_format == cairo.Format.RGB24:
-    if not data:
-      return Image.new("RGB", (w, h))
-    return Image.frombuffer("RGB", (w, h), data.tobytes(), "raw", "BGRX", stride)
-  if surface_format == cairo.Format.ARGB32:
-    if not data:
-      return Image.new("RGBA", (w, h))
-    return Image.frombuffer("RGBA", (w, h), data.tobytes(), "raw", "BGRa", stride)
-  raise NotImplementedError(f"Unsupported format: {surface_format}")
+  if surface_format not in _CAIRO_FORMATS:
+    raise NotImplementedError(f"Unsupported format: {surface_format}")
+  mode, rawmode = _CAIRO_FORMATS[surface_format]
+  size = (surface.get_width(), surface.get_height())
+  surface.flush()
+  data = surface.get_data()
+  if not data:
+    return Image.new(mode, size)
+  return Image.frombytes(mode, size, data, "raw", rawmode, surface.get_stride())
 
 
 def to_cairo(im: Image.Image) -> cairo.ImageSurface:
@@ -221,31 +411,34 @@ def to_cairo(im: Image.Image) -> cairo.ImageSurface:
   | RGB    | RGB24   |
   | RGBA   | ARGB32  |
 
+  分块编码（包括字节序转换和预乘）并直接写入 ImageSurface 自身的缓冲区，不产生中间的完整拷贝。
+  编码的流程与 Image.tobytes 相同，只是不拼接输出。
+
   :param im: Pillow 的 Image。
   :return: 转换后的 PyCairo ImageSurface。
   """
-  if im.mode == "1":
-    # 1 模式的转换很慢
-    w, h = im.size
-    data_w = math.ceil(w / 32) * 32
-    im = ImageOps.expand(im, (0, 0, data_w - w, 0))
-    for x in range(0, data_w, 8):
-      im.paste(im.crop((x, 0, x + 8, h)).transpose(Image.Transpose.FLIP_LEFT_RIGHT), (x, 0))
-    data = bytearray(im.tobytes())
-    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_A1, w, h)
-  if im.mode == "L":
-    stride = cairo.Format.A8.stride_for_width(im.width)
-    data = bytearray(im.tobytes("raw", "L", stride))
-    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_A8, im.width, im.height)
-  if im.mode == "RGB":
-    stride = cairo.Format.RGB24.stride_for_width(im.width)
-    data = bytearray(im.tobytes("raw", "BGRX", stride))
-    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_RGB24, im.width, im.height)
-  if im.mode == "RGBA":
-    stride = cairo.Format.ARGB32.stride_for_width(im.width)
-    data = bytearray(im.tobytes("raw", "BGRa", stride))
-    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, im.width, im.height)
-  raise NotImplementedError(f"Unsupported mode: {im.mode}")
+  if im.mode not in _PIL_MODES:
+    raise NotImplementedError(f"Unsupported mode: {im.mode}")
+  surface_format, rawmode = _PIL_MODES[im.mode]
+  surface = cairo.ImageSurface(surface_format, im.width, im.height)
+  data = surface.get_data()
+  if not data:
+    return surface
+  im.load()
+  encoder = Image._getencoder(im.mode, "raw", (rawmode, surface.get_stride()))
+  encoder.setimage(im.im, (0, 0, *im.size))
+  bufsize = max(ImageFile.MAXBLOCK, surface.get_stride())
+  pos = 0
+  while True:
+    _, errcode, chunk = encoder.encode(bufsize)
+    data[pos : pos + len(chunk)] = chunk
+    pos += len(chunk)
+    if errcode:
+      break
+  if errcode < 0:
+    raise RuntimeError(f"Encoder error {errcode} when converting to cairo")
+  surface.mark_dirty()
+  return surface
 
 
 def ensure_pil(im: AnyImage) -> Image.Image:
@@ -294,9 +487,30 @@ def apply_mask(im: Image.Image, mask: Image.Image) -> None:
   im.putalpha(mask)
 
 
+def cached_primitive(func: Callable[P, Image.Image]) -> Callable[P, Image.Image]:
+  """
+  缓存生成遮罩、渐变等图元的函数，参数相同时直接复制缓存的图片，列表或卡片中每一项不再重新绘制。
+  参数必须可哈希。每次返回的都是副本，调用者可以随意修改。
+
+  :param func: 生成图元的函数。
+  :return: 带缓存的函数。
+  """
+
+  @functools.wraps(func)
+  def wrapper(*args: P.args, **kwargs: P.kwargs) -> Image.Image:
+    key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+    if (im := _primitive_cache.get(key)) is None:
+      im = func(*args, **kwargs)
+      _primitive_cache.put(key, im)
+    return im.copy()
+
+  return wrapper
+
+
+@cached_primitive
 def make_circle_mask(size: Size) -> Image.Image:
   """
-  生成圆形或椭圆形遮罩。
+  生成圆形或椭圆形遮罩，结果会被缓存。
 
   :param size: 遮罩尺寸。
   :return: L 模式遮罩。
@@ -319,9 +533,10 @@ def apply_circle_mask(im: Image.Image) -> None:
   apply_mask(im, make_circle_mask(im.size))
 
 
+@cached_primitive
 def make_rounded_rectangle_mask(size: Size, radius: float) -> Image.Image:
   """
-  生成圆角矩形遮罩。
+  生成圆角矩形遮罩，结果会被缓存。
 
   :param size: 遮罩尺寸。
   :param radius: 圆角半径。
@@ -614,15 +829,54 @@ def _check_libimagequant() -> bool:
   return _libimagequant_available
 
 
-def quantize(im: AnyImage) -> Image.Image:
+def _palette_method() -> Image.Quantize:
+  """
+  获取生成调色板时使用的量化方式，会考虑 libimagequant 配置。
+
+  :return: Image.Quantize 枚举值。
+  """
+  config = CONFIG()
+  if config.libimagequant is True and _check_libimagequant():
+    return Image.Quantize.LIBIMAGEQUANT
+  return Image.Quantize[config.quantize.upper()]
+
+
+def _remap(im: Image.Image, palette: Image.Image) -> Image.Image:
+  """
+  使用已有的调色板量化图片，只需一次量化即可应用抖动仿色。
+  有 Alpha 通道的图片会在调色板末尾追加一个透明色。
+
+  :param im: 要量化的图片。
+  :param palette: P 模式的调色板图片，最多 255 色。
+  :return: 量化后的图片。
+  """
+  dither = Image.Dither.FLOYDSTEINBERG if CONFIG().dither else Image.Dither.NONE
+  if not im.has_transparency_data:
+    return ensure_mode(im, "RGB").quantize(palette=palette, dither=dither)
+  im = ensure_mode(im, "RGBA")
+  a = ImageChops.invert(im.getchannel("A").convert("1"))
+  p = flatten(im).quantize(palette=palette, dither=dither)
+  assert p.palette
+  palette_data = p.palette.tobytes()
+  pos = len(palette_data) // 3
+  p.palette.palette = palette_data + b"\0\0\0"
+  p.info["transparency"] = pos
+  p.paste(pos, mask=a)
+  return p
+
+
+def quantize(im: AnyImage, palette: Image.Image | None = None) -> Image.Image:
   """
   量化图片到 P 模式，通常用于 GIF 编码。
 
   :param im: 要量化的图片。
+  :param palette: 使用的调色板（参见 make_palette 函数），为 None 时根据图片自身生成调色板。
   :return: 量化后的图片。
   """
   config = CONFIG()
   im = ensure_pil(im)
+  if palette is not None:
+    return _remap(im, palette)
   if config.libimagequant is True and _check_libimagequant():
     # Image.new 在 RGB 模式下不带 color 参数会给隐藏的 Alpha 通道填充 0 而非 255
     # 也就是颜色实际上是 (0, 0, 0, 0) 而非 (0, 0, 0, 255)
@@ -642,13 +896,10 @@ def quantize(im: AnyImage) -> Image.Image:
   if im.mode == "RGBA":
     # RGBA 图片的 quantize 方法不能用 palette 参数，使用内部 API 强行量化有奇怪的问题
     # 我们手搓一个
-    a = ImageChops.invert(im.getchannel("A").convert("1"))
-    rgb = flatten(im)
     if config.dither:
-      palette = rgb.quantize(255, method=method)
-      p = rgb.quantize(method=method, palette=palette)
-    else:
-      p = rgb.quantize(255, method=method, dither=Image.Dither.NONE)
+      return _remap(im, flatten(im).quantize(255, method=method))
+    a = ImageChops.invert(im.getchannel("A").convert("1"))
+    p = flatten(im).quantize(255, method=method, dither=Image.Dither.NONE)
     assert p.palette
     palette_data = p.palette.tobytes()
     pos = len(palette_data) // 3
@@ -664,6 +915,73 @@ def quantize(im: AnyImage) -> Image.Image:
   return im.quantize(method=method, palette=palette)
 
 
+def make_palette(frames: Sequence[AnyImage]) -> Image.Image:
+  """
+  从动图的各帧中均匀采样，生成所有帧共享的调色板（最多 255 色，为透明色预留一个位置）。
+  采样的帧会先缩小并拼接在一起，因此只需要做一次完整的量化。
+
+  :param frames: 动图的所有帧。
+  :return: P 模式的调色板图片，可传入 quantize 函数。
+  """
+  step = max(1, math.ceil(len(frames) / PALETTE_SAMPLE_FRAMES))
+  samples = [ensure_pil(frame) for frame in frames[::step]]
+  width, height = samples[0].size
+  scale = min(1, math.sqrt(PALETTE_SAMPLE_PIXELS / max(1, width * height)))
+  size = (max(1, round(width * scale)), max(1, round(height * scale)))
+  montage = Image.new("RGB", (size[0], size[1] * len(samples)), (255, 255, 255))
+  for i, sample in enumerate(samples):
+    # 最近邻缩放不会产生原图中没有的颜色
+    montage.paste(flatten(sample).resize(size, Image.Resampling.NEAREST), (0, size[1] * i))
+  p = montage.quantize(255, method=_palette_method(), dither=Image.Dither.NONE)
+  # libimagequant 生成的调色板可能是 RGBA 模式，统一为 RGB 模式
+  palette = Image.new("P", (1, 1))
+  palette.putpalette(p.getpalette("RGB") or [])
+  return palette
+
+
+def quantize_frames(
+  frames: Sequence[AnyImage],
+  palette: Image.Image | None = None,
+) -> Generator[Image.Image, None, None]:
+  """
+  使用共享调色板，在线程池中并行量化动图的各帧，按顺序逐帧产出，通常用于 GIF 编码。
+  已经是 P 模式的帧保持不变。注意 Pillow 的 GIF 编码器会先收集所有帧再写入，
+  传给 Image.save 的 append_images 并不能降低峰值内存。
+
+  :param frames: 动图的所有帧。
+  :param palette: 使用的调色板，为 None 时使用 make_palette 生成。
+  :return: 量化后的帧迭代器。
+  """
+  # cairo 表面只转换一次，下面多次遍历时不再重复转换
+  pil_frames = [ensure_pil(frame) for frame in frames]
+  if all(im.mode == "P" for im in pil_frames):
+    yield from pil_frames
+    return
+  if palette is None:
+    palette = make_palette(pil_frames)
+  # 只要有一帧透明，所有帧都按透明处理，确保各帧的调色板相同，GIF 只需写入一次全局调色板
+  transparent = any(im.has_transparency_data for im in pil_frames)
+
+  def work(im: Image.Image) -> Image.Image:
+    if im.mode == "P":
+      return im
+    return _remap(ensure_mode(im, "RGBA") if transparent else im, palette)
+
+  workers = CONFIG().quantize_workers or min(8, os.cpu_count() or 1)
+  it = iter(pil_frames)
+  pending = deque[Future[Image.Image]]()
+  with ThreadPoolExecutor(workers, "idhagnbot-quantize") as executor:
+    for frame in it:
+      pending.append(executor.submit(work, frame))
+      if len(pending) >= workers * 2:
+        break
+    while pending:
+      result = pending.popleft().result()
+      if (frame := next(it, None)) is not None:
+        pending.append(executor.submit(work, frame))
+      yield result
+
+
 class RemapTransform:
   """
   将一个凸四边形映射到另一个凸四边形的变换（超出部分不会裁剪），使用 NumPy 计算系数。
@@ -792,35 +1110,281 @@ def normalize_url(url: str, bot: Bot) -> str:
   )
 
 
+def _url_cache_path(url: str) -> Path:
+  return URL_CACHE_DIR / hashlib.sha256(url.encode()).hexdigest()
+
+
+def _read_url_cache(url: str) -> tuple[bytes, float] | None:
+  config = CONFIG()
+  path = _url_cache_path(url)
+  try:
+    stat = path.stat()
+  except FileNotFoundError:
+    return None
+  if config.url_cache_ttl and time.time() - stat.st_mtime > config.url_cache_ttl:
+    return None
+  # 修改时间是下载时间，访问时间用于淘汰
+  os.utime(path, (time.time(), stat.st_mtime))
+  return path.read_bytes(), stat.st_mtime
+
+
+def _write_url_cache(url: str, data: bytes) -> None:
+  config = CONFIG()
+  if not config.url_disk_cache_size:
+    return
+  URL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+  path = _url_cache_path(url)
+  # 同一个 URL 可能同时被多个线程写入，每个线程使用自己的临时文件
+  with tempfile.NamedTemporaryFile(dir=URL_CACHE_DIR, suffix=".tmp", delete=False) as f:
+    f.write(data)
+  Path(f.name).replace(path)
+  _url_cache_evictor.written(len(data), config.url_disk_cache_size, path)
+
+
+class ImageTooLargeError(ValueError):
+  pass
+
+
+def _sniff_size(data: bytes | bytearray) -> Size | None:
+  try:
+    with Image.open(BytesIO(data)) as im:
+      return im.size
+  except Image.DecompressionBombError:
+    raise
+  except Exception:
+    # 数据还不完整
+    return None
+
+
+async def _read_response(url: str, response: ClientResponse) -> bytes:
+  config = CONFIG()
+  if config.url_max_bytes and (response.content_length or 0) > config.url_max_bytes:
+    raise ImageTooLargeError(f"图片过大（{response.content_length} 字节）: {url}")
+  data = bytearray()
+  sniff_at = SNIFF_MIN_BYTES
+  async for chunk in response.content.iter_chunked(65536):
+    data += chunk
+    if config.url_max_bytes and len(data) > config.url_max_bytes:
+      raise ImageTooLargeError(f"图片过大（超过 {config.url_max_bytes} 字节）: {url}")
+    # 收到图片头后立刻检查尺寸，不用下载完整个文件
+    if sniff_at and len(data) >= sniff_at:
+      if size := _sniff_size(data):
+        sniff_at = 0
+        if config.url_max_pixels and size[0] * size[1] > config.url_max_pixels:
+          raise ImageTooLargeError(f"图片过大（{size[0]}x{size[1]}）: {url}")
+      else:
+        sniff_at = len(data) * 2
+  return bytes(data)
+
+
+async def _download_url(url: str, headers: LooseHeaders | None) -> tuple[bytes, float]:
+  if cached := await run_sync(_read_url_cache, url):
+    return cached
+  async with request("GET", url, headers=headers, raise_for_status=True) as response:
+    data = await _read_response(url, response)
+  await run_sync(_write_url_cache, url, data)
+  return data, time.time()
+
+
+def _decode(data: bytes, size: Size | None) -> Image.Image:
+  im = Image.open(BytesIO(data))
+  if getattr(im, "is_animated", False):
+    return im
+  if size:
+    # JPEG 可以直接以 1/2、1/4、1/8 分辨率解码，其他格式解码后再整数倍缩小
+    im.draft(None, size)
+    im.load()
+    factor = min(im.width // size[0], im.height // size[1])
+    if factor > 1:
+      return im.reduce(factor)
+  im.load()
+  return im
+
+
+def _decode_url(url: str, data: bytes, downloaded: float, size: Size | None) -> Image.Image:
+  digest = hashlib.sha256(data).hexdigest()
+  _url_index.put(url, (digest, downloaded))
+  if (im := _decoded_cache.get((digest, size))) is not None:
+    return im.copy()
+  im = _decode(data, size)
+  if getattr(im, "is_animated", False):
+    return im
+  _decoded_cache.put((digest, size), im)
+  return im.copy()
+
+
+def _open_url_cached(url: str, size: Size | None) -> Image.Image | None:
+  if (entry := _url_index.get(url)) is None:
+    return None
+  digest, downloaded = entry
+  ttl = CONFIG().url_cache_ttl
+  if ttl and time.time() - downloaded > ttl:
+    _url_index.pop(url)
+    return None
+  if (im := _decoded_cache.get((digest, size))) is None:
+    return None
+  return im.copy()
+
+
+async def read_url(url: str, headers: LooseHeaders | None = None) -> bytes:
+  """
+  异步地读取图片 URL 的原始内容，和 open_url 共享磁盘缓存，用于需要原始文件的场合。
+
+  :param url: 要读取的 http(s):// 图片 URL。
+  :param headers: 额外的 HTTP 头。
+  :return: 图片文件的内容。
+  """
+  data, _ = await _url_flight(url, lambda: _download_url(url, headers))
+  return data
+
+
 async def open_url(
   url: str,
   process: Callable[[Image.Image], Image.Image] | None = None,
   headers: LooseHeaders | None = None,
+  *,
+  size: Size | None = None,
+  cache: bool = True,
 ) -> Image.Image:
   """
   异步地打开图片 URL，支持 file:// 和 http(s)://，可选对图片进行同步处理。
   不支持 Satori 的 internal: URL，请先使用 normalize_url 将其转化为 http:// URL。
+  http(s):// 图片默认会被缓存：原始文件缓存在磁盘上，解码后的静态图片缓存在内存中，
+  容量和有效期参见配置。返回的图片总是副本，可以随意修改。
+  下载的大小和图片的像素数受配置限制，超过时抛出 ImageTooLargeError。
 
   :param url: 要打开的图片 URL。
   :param process: 处理图片的同步函数。
   :param headers: 额外的 HTTP 头。
+  :param size: 需要的大致尺寸，指定时以不小于该尺寸的较低分辨率解码静态图片，减少解码时间和内存，
+    调用者仍需自行缩放到准确的尺寸。
+  :param cache: 是否使用缓存，对于每次内容都不同的 URL（例如验证码）应设为 False。
   """
   if url.startswith("file://"):
     path = path_from_url(url)
     if process:
       return await run_sync(lambda: process(Image.open(path)))
     return await run_sync(lambda: Image.open(path))
-  async with get_session().get(url, headers=headers) as response:
-    parser = ImageFile.Parser()
-    async for chunk in response.content.iter_chunked(65536):
-      await run_sync(parser.feed, chunk)
-    if process:
-      return await run_sync(lambda: process(parser.close()))
-    return await run_sync(parser.close)
+  if cache:
+    im = _open_url_cached(url, size)
+    if im is None:
+      data, downloaded = await _url_flight(url, lambda: _download_url(url, headers))
+      im = await run_sync(_decode_url, url, data, downloaded, size)
+  else:
+    async with get_session().get(url, headers=headers) as response:
+      data = await _read_response(url, response)
+    im = await run_sync(_decode, data, size)
+  if process:
+    return await run_sync(process, im)
+  return im
+
+
+def get_output_policy(adapter: str | None = None) -> OutputPolicy:
+  """
+  获取适配器的编码策略。
+
+  :param adapter: 适配器名称，为 None 时使用当前事件的 Bot 的适配器，不在事件处理中时使用默认策略。
+  :return: 编码策略。
+  """
+  config = CONFIG()
+  if adapter is None:
+    bot = current_bot.get(None)
+    adapter = bot.adapter.get_name() if bot else None
+  return config.adapter_output.get(adapter, config.output) if adapter else config.output
+
+
+def is_graphic(im: Image.Image) -> bool:
+  """
+  判断图片是否颜色较少（例如文字、图表和截图），这类图片使用 PNG 通常比有损格式更小更清晰。
+
+  :param im: 要判断的图片。
+  :return: 颜色数是否不超过 256。
+  """
+  return im.mode in ("1", "P") or im.getcolors(256) is not None
+
+
+def _is_opaque(im: Image.Image) -> bool:
+  if im.mode in ("RGBA", "LA", "PA"):
+    return im.getchannel("A").getextrema()[0] == 255
+  if im.mode in ("RGBa", "La"):
+    return im.getchannel("a").getextrema()[0] == 255
+  return not im.has_transparency_data
+
+
+def _encode(im: Image.Image, fmt: OutputFormat, policy: OutputPolicy) -> bytes:
+  f = BytesIO()
+  if fmt == "png":
+    im.save(f, "PNG", compress_level=policy.png_compress_level)
+  elif fmt == "jpeg":
+    if im.mode not in ("L", "RGB"):
+      im = im.convert("RGB")
+    im.save(f, "JPEG", quality=policy.jpeg_quality)
+  else:
+    if im.mode not in ("RGB", "RGBA"):
+      im = im.convert("RGBA" if im.has_transparency_data else "RGB")
+    im.save(f, "WEBP", quality=policy.webp_quality)
+  return f.getvalue()
+
+
+def _estimate_size(im: Image.Image, fmt: OutputFormat, policy: OutputPolicy) -> float:
+  pixels = im.width * im.height
+  if pixels <= ESTIMATE_SAMPLE_SIZE**2:
+    return 0
+  w = min(im.width, ESTIMATE_SAMPLE_SIZE)
+  h = min(im.height, ESTIMATE_SAMPLE_SIZE)
+  x = (im.width - w) // 2
+  y = (im.height - h) // 2
+  sample = im.crop((x, y, x + w, y + h))
+  return len(_encode(sample, fmt, policy)) * pixels / (w * h)
+
+
+def encode_static(im: Image.Image, policy: OutputPolicy) -> tuple[bytes, OutputFormat]:
+  """
+  按策略编码静态图，依次尝试候选格式，直到结果不超过字节数预算或耗时超过预算。
+
+  :param im: 要编码的图片。
+  :param policy: 编码策略。
+  :return: 编码结果和格式。
+  """
+  formats = list(policy.formats) or ["png"]
+  # 渲染结果通常是 RGBA，但 Alpha 通道可能完全不透明，这时可以当作 RGB 编码
+  if _is_opaque(im):
+    if im.mode in ("RGBA", "RGBa"):
+      im = im.convert("RGB")
+    elif im.mode in ("LA", "La"):
+      im = im.convert("L")
+  elif "jpeg" in formats:
+    formats.remove("jpeg")
+  if is_graphic(im):
+    formats = ["png", *(x for x in formats if x != "png")]
+  start = time.perf_counter()
+  best: tuple[bytes, OutputFormat] | None = None
+  for i, fmt in enumerate(formats):
+    # 先用一小块估算大小，跳过明显超出预算的格式（例如照片类图片的 PNG），最后一个格式总是尝试
+    if (
+      policy.max_bytes
+      and i < len(formats) - 1
+      and _estimate_size(im, fmt, policy) > policy.max_bytes
+    ):
+      continue
+    data = _encode(im, fmt, policy)
+    if best is None or len(data) < len(best[0]):
+      best = (data, fmt)
+    if not policy.max_bytes or len(data) <= policy.max_bytes:
+      return data, fmt
+    if policy.max_time and time.perf_counter() - start > policy.max_time:
+      break
+  return cast("tuple[bytes, OutputFormat]", best)
 
 
 @overload
-def to_segment(im: AnyImage, *, fmt: str = ..., **kw: Any) -> ImageSeg: ...
+def to_segment(
+  im: AnyImage,
+  *,
+  fmt: str | None = ...,
+  cache: bool = ...,
+  **kw: Any,
+) -> ImageSeg: ...
 
 
 @overload
@@ -828,49 +1392,60 @@ def to_segment(
   im: Sequence[AnyImage],
   duration: list[int] | int | Image.Image,
   *,
-  fmt: str = ...,
+  fmt: str | None = ...,
   afmt: str = ...,
+  cache: bool = ...,
   **kw: Any,
 ) -> ImageSeg: ...
 
 
-def to_segment(
-  im: AnyImage | Sequence[AnyImage],
-  duration: list[int] | int | Image.Image = 0,
-  *,
-  fmt: str = "png",
-  afmt: str = "gif",
-  **kw: Any,
-) -> ImageSeg:
+def fingerprint(im: AnyImage) -> bytes:
   """
-  将图片编码为 nonebot-plugin-alconna 的 Image 消息段。
+  计算图片内容的指纹，像素、模式、尺寸和调色板都相同的图片指纹相同。
 
-  :param im: 单张图片或图片列表。
-  :param duration: 以毫秒为单位的帧时长，传入单个 int 表示所有帧的时长相同，传入 int 列表表示每一帧
-    使用不同的时长（长度必须与 im 列表相等），传入 Image 表示每一帧的时长与该图片的对应帧相等（总帧
-    数必须和 im 列表的长度相等）。
-  :param fmt: 编码静态图（单张图片或长度为 1 的图片列表）的格式。
-  :param afmt: 编码动态图（长度大于 1 的图片列表）的格式。
-  :param kw: 传递给编码器的其他参数。
-  :return: Image 消息段，filename 为 `image.拓展名`，带有 mimetype。
+  :param im: 要计算的图片。
+  :return: 16 字节的指纹。
   """
+  h = hashlib.blake2b(digest_size=16)
+  if isinstance(im, cairo.ImageSurface):
+    im.flush()
+    h.update(f"cairo:{im.get_format()}:{im.get_width()}x{im.get_height()}".encode())
+    h.update(im.get_data())
+  else:
+    h.update(f"{im.mode}:{im.width}x{im.height}:{im.info.get('transparency')}".encode())
+    if im.mode in ("P", "PA"):
+      h.update(bytes(im.getpalette() or []))
+    h.update(im.tobytes())
+  return h.digest()
+
+
+def _encode_segment(
+  im: AnyImage | Sequence[AnyImage],
+  duration: list[int] | int,
+  fmt: str | None,
+  afmt: str,
+  kw: dict[str, Any],
+) -> tuple[bytes, str, str]:
   f = BytesIO()
   if not isinstance(im, AnyImage):
     if len(im) > 1:
-      if isinstance(duration, Image.Image):
-        duration = [im.info["duration"] for im in ImageSequence.Iterator(duration)]
       if isinstance(duration, list) and len(duration) != len(im):
         raise ValueError("Duration list length doesn't match frames count.")
       frames = [ensure_pil(x) for x in im]
-      afmt = afmt.lower()
       if afmt == "gif":
-        frames = [x if x.mode == "P" else quantize(x) for x in frames]
         # 只对透明图片使用 disposal，防止不透明图片有鬼影
-        disposal = 2 if any("transparency" in x.info for x in frames) else 0
-        frames[0].save(
+        disposal = (
+          2
+          if any(
+            "transparency" in x.info if x.mode == "P" else x.has_transparency_data for x in frames
+          )
+          else 0
+        )
+        quantized = quantize_frames(frames)
+        next(quantized).save(
           f,
           "GIF",
-          append_images=frames[1:],
+          append_images=quantized,
           save_all=True,
           loop=0,
           disposal=disposal,
@@ -880,14 +1455,63 @@ def to_segment(
       else:
         frames[0].save(f, afmt, append_images=frames[1:], duration=duration)
       mime = mimetypes.suffix_map.get(f".{afmt}", "image/gif")
-      return ImageSeg(raw=f, name=f"image.{afmt}", mimetype=mime)
+      return f.getvalue(), afmt, mime
     im = im[0]
-  fmt = fmt.lower()
+  if fmt is None:
+    if kw:
+      raise ValueError("Encoder arguments require an explicit format.")
+    data, fmt = encode_static(ensure_pil(im), get_output_policy())
+    return data, fmt, f"image/{fmt}"
   if isinstance(im, cairo.ImageSurface):
     if fmt == "png":
       im.write_to_png(f)
-      return ImageSeg(raw=f, name="image.png", mimetype="image/png")
+      return f.getvalue(), "png", "image/png"
     im = from_cairo(im)
   im.save(f, fmt, **kw)
   mime = mimetypes.suffix_map.get(f".{fmt}", "image/png")
-  return ImageSeg(raw=f, name=f"image.{fmt}", mimetype=mime)
+  return f.getvalue(), fmt, mime
+
+
+def to_segment(
+  im: AnyImage | Sequence[AnyImage],
+  duration: list[int] | int | Image.Image = 0,
+  *,
+  fmt: str | None = None,
+  afmt: str = "gif",
+  cache: bool = False,
+  **kw: Any,
+) -> ImageSeg:
+  """
+  将图片编码为 nonebot-plugin-alconna 的 Image 消息段。
+  可选按图片指纹和编码参数缓存编码结果，重复发送相同的图片（例如错误提示）时不会重新编码。
+
+  :param im: 单张图片或图片列表。
+  :param duration: 以毫秒为单位的帧时长，传入单个 int 表示所有帧的时长相同，传入 int 列表表示每一帧
+    使用不同的时长（长度必须与 im 列表相等），传入 Image 表示每一帧的时长与该图片的对应帧相等（总帧
+    数必须和 im 列表的长度相等）。
+  :param fmt: 编码静态图（单张图片或长度为 1 的图片列表）的格式，为 None 时按当前适配器的编码策略
+    （参见 get_output_policy）选择格式，此时不能传入 kw。
+  :param afmt: 编码动态图（长度大于 1 的图片列表）的格式。
+  :param cache: 是否使用编码结果缓存，只应该对经常重复发送的图片启用，因为计算指纹也需要时间。
+  :param kw: 传递给编码器的其他参数。
+  :return: Image 消息段，filename 为 `image.拓展名`，带有 mimetype。
+  """
+  if isinstance(duration, Image.Image):
+    duration = [frame.info["duration"] for frame in ImageSequence.Iterator(duration)]
+  fmt = fmt.lower() if fmt else None
+  afmt = afmt.lower()
+  if not cache or not CONFIG().segment_cache_size:
+    data, ext, mime = _encode_segment(im, duration, fmt, afmt, kw)
+    return ImageSeg(raw=data, name=f"image.{ext}", mimetype=mime)
+  frames = [im] if isinstance(im, AnyImage) else list(im)
+  options = (
+    (afmt, tuple(duration) if isinstance(duration, list) else duration)
+    if len(frames) > 1
+    else (fmt or get_output_policy().model_dump_json(),)
+  )
+  key = (tuple(map(fingerprint, frames)), options, repr(sorted(kw.items())))
+  if (cached := _segment_cache.get(key)) is None:
+    cached = _encode_segment(im, duration, fmt, afmt, kw)
+    _segment_cache.put(key, cached)
+  data, ext, mime = cached
+  return ImageSeg(raw=data, name=f"image.{ext}", mimetype=mime)
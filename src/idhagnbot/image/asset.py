@@ -0,0 +1,122 @@
+"""随包分发的静态图片资源，每个资源只从磁盘加载一次，启动时在主进程和渲染进程中预加载。"""
+
+from pathlib import Path
+from typing import ClassVar
+
+from anyio.to_thread import run_sync
+from nonebot import logger
+from PIL import Image
+
+from idhagnbot.asyncio import before_process_fork, process_initializer
+from idhagnbot.cache import sizeof_image
+from idhagnbot.image import CONFIG
+
+__all__ = ["ImageAsset", "image_assets"]
+
+
+class ImageAsset:
+  """
+  静态图片资源，第一次使用（或启动时预加载）时从磁盘读取并转换模式，之后不再读取磁盘。
+  每次调用返回的都是副本，调用者可以随意修改。
+  主进程和进程池的每个工作进程各自持有一份，工作进程启动时也会预加载。
+  """
+
+  all: ClassVar[dict[tuple[Path, str | None], "ImageAsset"]] = {}
+  """所有已注册的资源，用于预加载和统计。"""
+
+  __slots__ = ("__image", "__mode", "__path")
+
+  def __init__(self, path: Path, mode: str | None = None) -> None:
+    """
+    注册静态资源。
+
+    :param path: 图片路径。
+    :param mode: 加载后转换到的模式，为 None 时保持原样。
+    """
+    self.__path = path
+    self.__mode = mode
+    self.__image: Image.Image | None = None
+    self.all[path, mode] = self
+
+  @property
+  def path(self) -> Path:
+    return self.__path
+
+  @property
+  def mode(self) -> str | None:
+    return self.__mode
+
+  @property
+  def loaded(self) -> bool:
+    return self.__image is not None
+
+  @property
+  def size(self) -> int:
+    """已加载时占用的内存字节数，未加载时为 0。"""
+    return sizeof_image(self.__image) if self.__image else 0
+
+  def __call__(self) -> Image.Image:
+    """
+    获取图片，未加载时会阻塞地从磁盘读取。
+
+    :return: 图片的副本。
+    """
+    return self.__load().copy()
+
+  def __load(self) -> Image.Image:
+    if self.__image is None:
+      with Image.open(self.__path) as im:
+        im.load()
+        self.__image = (
+          im.convert(self.__mode) if self.__mode and im.mode != self.__mode else im.copy()
+        )
+    return self.__image
+
+  @classmethod
+  def preload(cls) -> None:
+    """加载所有已注册但尚未加载的资源，会阻塞。"""
+    for asset in list(cls.all.values()):
+      asset.__load()
+
+  @classmethod
+  def footprint(cls) -> int:
+    """
+    计算所有已加载资源占用的内存。
+
+    :return: 字节数。
+    """
+    return sum(asset.size for asset in list(cls.all.values()))
+
+
+def image_assets(
+  directory: Path,
+  pattern: str = "*.png",
+  mode: str | None = None,
+) -> dict[str, ImageAsset]:
+  """
+  注册目录中的所有图片。
+
+  :param directory: 资源目录。
+  :param pattern: 文件名通配符。
+  :param mode: 加载后转换到的模式。
+  :return: 文件名（不含拓展名）到资源的映射。
+  """
+  return {path.stem: ImageAsset(path, mode) for path in sorted(directory.glob(pattern))}
+
+
+@process_initializer
+def _() -> None:
+  # 工作进程会继承主进程在 fork 之前预加载的素材，这里只补上之后才注册的
+  if CONFIG().preload_assets:
+    ImageAsset.preload()
+
+
+@before_process_fork
+async def _() -> None:
+  if not CONFIG().preload_assets or not ImageAsset.all:
+    return
+  await run_sync(ImageAsset.preload)
+  logger.info(
+    f"已预加载 {len(ImageAsset.all)} 个静态图片资源，共 "
+    f"{ImageAsset.footprint() / 1024 / 1024:.1f}MiB",
+  )
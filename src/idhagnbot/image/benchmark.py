@@ -0,0 +1,70 @@
+"""
+比较静态图编码格式的大小和耗时，用于调整 image 配置中的编码策略（output 和 adapter_output）。
+
+python scripts/image_benchmark.py [图片文件...]
+
+导入 idhagnbot 包需要先初始化 NoneBot，因此不能用 python -m 运行这个模块。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from idhagnbot import text
+from idhagnbot.image import _encode, encode_static, get_output_policy
+
+FORMATS = ("png", "jpeg", "webp")
+SAMPLE_TEXT = "IdhagnBot 是一个基于 NoneBot2 的跨平台聊天机器人。" * 8
+
+
+def make_samples() -> dict[str, Image.Image]:
+  samples = dict[str, Image.Image]()
+
+  noise = Image.effect_noise((1280, 960), 48)
+  fractal = Image.effect_mandelbrot((1280, 960), (-2.2, -1.2, 1, 1.2), 128)
+  gradient = Image.linear_gradient("L").resize((1280, 960))
+  samples["photo"] = Image.merge("RGB", (noise, fractal, gradient))
+
+  card = Image.new("RGB", (640, 960), (255, 255, 255))
+  rendered = text.render(SAMPLE_TEXT, "sans", 32, box=600)
+  card.paste(rendered, (20, 20), rendered)
+  samples["text_card"] = card
+
+  chart = Image.new("RGB", (960, 640), (255, 255, 255))
+  draw = ImageDraw.Draw(chart)
+  for i in range(12):
+    draw.rectangle((40 + i * 76, 600 - i * 45, 100 + i * 76, 600), (66, 133, 244))
+  samples["chart"] = chart
+
+  transparent = samples["photo"].convert("RGBA")
+  transparent.putalpha(gradient)
+  samples["transparent"] = transparent
+  return samples
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="比较静态图编码格式的大小和耗时")
+  parser.add_argument("files", nargs="*", type=Path, help="额外测试的图片文件")
+  parser.add_argument("--adapter", help="同时显示该适配器的编码策略的选择")
+  args = parser.parse_args()
+
+  samples = make_samples()
+  for path in args.files:
+    samples[path.name] = Image.open(path)
+  policy = get_output_policy(args.adapter)
+  out = sys.stdout
+  out.write(f"{'图片':<16}{'尺寸':>12}{'格式':>8}{'字节':>12}{'耗时(ms)':>12}\n")
+  for name, im in samples.items():
+    size = f"{im.width}x{im.height}"
+    for fmt in FORMATS:
+      start = time.perf_counter()
+      data = _encode(im, fmt, policy)
+      elapsed = (time.perf_counter() - start) * 1000
+      out.write(f"{name:<16}{size:>12}{fmt:>8}{len(data):>12}{elapsed:>12.1f}\n")
+    start = time.perf_counter()
+    data, fmt = encode_static(im, policy)
+    elapsed = (time.perf_counter() - start) * 1000
+    out.write(f"{name:<16}{size:>12}{'策略:' + fmt:>8}{len(data):>12}{elapsed:>12.1f}\n")
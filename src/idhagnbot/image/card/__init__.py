@@ -1,11 +1,15 @@
+from collections.abc import Generator
 from pathlib import Path
 from typing import Any, Protocol, Self, overload
 
+import cairo
 from PIL import Image, ImageOps
 from typing_extensions import override
 
 from idhagnbot import image as imutil
 from idhagnbot import text as textutil
+from idhagnbot.color import split_rgb
+from idhagnbot.image.asset import image_assets
 
 Color = tuple[int, int, int]
 PLUGIN_DIR = Path(__file__).resolve().parent
@@ -17,6 +21,7 @@ INFO_MARGIN = 16
 INFO_ICON_MARGIN = 4
 INFO_ICON_SIZE = 48
 DIM_COLOR = (224, 224, 224)
+ICONS = image_assets(PLUGIN_DIR, mode="RGBA")
 
 
 def normalize_10k(count: int) -> str:
@@ -25,11 +30,70 @@ def normalize_10k(count: int) -> str:
   return str(count)
 
 
+def set_color(cr: "cairo.Context[Any]", color: imutil.Color) -> None:
+  if isinstance(color, int):
+    color = split_rgb(color)
+  cr.set_source_rgb(color[0] / 255, color[1] / 255, color[2] / 255)
+
+
+def fill_rect(
+  cr: "cairo.Context[Any]",
+  color: imutil.Color,
+  rect: tuple[float, float, float, float],
+) -> None:
+  set_color(cr, color)
+  cr.rectangle(rect[0], rect[1], rect[2] - rect[0], rect[3] - rect[1])
+  cr.fill()
+
+
+def paint_image(cr: "cairo.Context[Any]", im: Image.Image, x: float, y: float) -> None:
+  """
+  将 Pillow 图片 Alpha 混合到 cairo 上下文的 (x, y) 处。
+
+  :param cr: 目标 cairo 上下文。
+  :param im: 图片，非 RGB、RGBA 模式的图片会先转换为 RGBA。
+  :param x: 横坐标。
+  :param y: 纵坐标。
+  """
+  if im.mode not in ("RGB", "RGBA"):
+    im = im.convert("RGBA")
+  cr.set_source_surface(imutil.to_cairo(im), x, y)
+  cr.rectangle(x, y, im.width, im.height)
+  cr.fill()
+
+
 class Render(Protocol):
+  """
+  卡片组件，分为两个阶段：先用 get_width、get_height 测量尺寸，再绘制到目标位置。
+  render 绘制到 Pillow 图片，paint 直接绘制到共享的 cairo 画布（参见 render_card）。
+  """
+
   def get_width(self) -> int: ...
   def get_height(self) -> int: ...
   def render(self, dst: Image.Image, x: int, y: int) -> None: ...
 
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    """默认实现先用 render 绘制到临时图片再混合，组件应该覆盖这个方法直接绘制。"""
+    im = Image.new("RGBA", (self.get_width(), self.get_height()))
+    self.render(im, 0, 0)
+    paint_image(cr, im, x, y)
+
+
+def render_card(card: Render, bg: imutil.Color = (255, 255, 255)) -> Image.Image:
+  """
+  把卡片的所有组件直接绘制到同一个 cairo 画布上，最后只转换一次为 Pillow 图片。
+
+  :param card: 卡片或任意组件。
+  :param bg: 背景颜色。
+  :return: RGB 模式的图片。
+  """
+  with cairo.ImageSurface(cairo.FORMAT_RGB24, card.get_width(), card.get_height()) as surface:
+    cr = cairo.Context(surface)
+    set_color(cr, bg)
+    cr.paint()
+    card.paint(cr, 0, 0)
+    return imutil.from_cairo(surface)
+
 
 class CardText(Render):
   layout: textutil.Layout
@@ -117,6 +181,17 @@ class CardText(Render):
       stroke_color=self.stroke_color,
     )
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    textutil.paint(
+      cr,
+      (x + PADDING, y),
+      self.layout,
+      color=self.color,
+      stroke=self.stroke,
+      stroke_color=self.stroke_color,
+    )
+
 
 class CardLine(Render):
   @override
@@ -131,6 +206,10 @@ class CardLine(Render):
   def render(self, dst: Image.Image, x: int, y: int) -> None:
     dst.paste(DIM_COLOR, (x, y, x + WIDTH, y + 2))
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    fill_rect(cr, DIM_COLOR, (x, y, x + WIDTH, y + 2))
+
 
 class CardCover(Render):
   im: Image.Image
@@ -154,6 +233,10 @@ class CardCover(Render):
   def render(self, dst: Image.Image, x: int, y: int) -> None:
     dst.paste(self.im, (x, y))
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    paint_image(cr, self.im, x, y)
+
 
 class CardAuthor(Render):
   avatar: Image.Image
@@ -195,6 +278,15 @@ class CardAuthor(Render):
     if self.fans_layout is not None:
       textutil.paste(dst, (x + WIDTH - PADDING, y), self.fans_layout, anchor=(1, 0.5))
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    paint_image(cr, self.avatar, x + PADDING, y + (self.height - self.avatar.height) // 2)
+    y += self.height // 2
+    name_x = PADDING + self.avatar.width + AVATAR_MARGIN
+    textutil.paint(cr, (x + name_x, y), self.name_layout, anchor=(0, 0.5))
+    if self.fans_layout is not None:
+      textutil.paint(cr, (x + WIDTH - PADDING, y), self.fans_layout, anchor=(1, 0.5))
+
 
 class InfoText(Render):
   layout: textutil.Layout
@@ -218,6 +310,10 @@ class InfoText(Render):
   def render(self, dst: Image.Image, x: int, y: int) -> None:
     textutil.paste(dst, (x, y), self.layout)
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    textutil.paint(cr, (x, y), self.layout)
+
 
 class InfoCount(Render):
   icon: str
@@ -243,7 +339,7 @@ class InfoCount(Render):
 
   @override
   def render(self, dst: Image.Image, x: int, y: int) -> None:
-    icon_im = Image.open(PLUGIN_DIR / (self.icon + ".png"))
+    icon_im = ICONS[self.icon]()
     dst.paste(icon_im, (x, y), icon_im)
     textutil.paste(
       dst,
@@ -252,6 +348,16 @@ class InfoCount(Render):
       anchor=(0, 0.5),
     )
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    paint_image(cr, ICONS[self.icon](), x, y)
+    textutil.paint(
+      cr,
+      (x + INFO_ICON_SIZE + INFO_ICON_MARGIN, y + self.height // 2),
+      self.layout,
+      anchor=(0, 0.5),
+    )
+
 
 class CardInfo(Render):
   lines: list[tuple[list[Render], int]]
@@ -303,18 +409,23 @@ class CardInfo(Render):
       height += self.gap_y
     return height
 
-  @override
-  def render(self, dst: Image.Image, x: int, y: int) -> None:
-    for items, height in self.lines:
+  def _place(self, x: int, y: int) -> Generator[tuple[Render, int, int], None, None]:
+    for items, height in [*self.lines, (self.last_line, self.last_line_height)]:
       x1 = x + PADDING
       for item in items:
-        item.render(dst, x1, y + (height - item.get_height()) // 2)
+        yield item, x1, y + (height - item.get_height()) // 2
         x1 += item.get_width() + self.gap_x
       y += height + self.gap_y
-    x1 = x + PADDING
-    for item in self.last_line:
-      item.render(dst, x1, y + (self.last_line_height - item.get_height()) // 2)
-      x1 += item.get_width() + self.gap_x
+
+  @override
+  def render(self, dst: Image.Image, x: int, y: int) -> None:
+    for item, x1, y1 in self._place(x, y):
+      item.render(dst, x1, y1)
+
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    for item, x1, y1 in self._place(x, y):
+      item.paint(cr, x1, y1)
 
 
 class CardMargin(Render):
@@ -336,11 +447,15 @@ class CardMargin(Render):
   def render(self, dst: Image.Image, x: int, y: int) -> None:
     pass
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    pass
+
 
 class CardTab(Render):
   icon: Image.Image | None
-  title_im: Image.Image | None
-  content_im: Image.Image | None
+  title_layout: textutil.Layout | None
+  content_layout: textutil.Layout | None
 
   def __init__(
     self,
@@ -351,43 +466,65 @@ class CardTab(Render):
     super().__init__()
     self.icon = icon
     box = CONTENT_WIDTH - 8
-    self.title_im = textutil.render(title, "sans", 32, box=box) if title else None
+    self.title_layout = textutil.layout(title, "sans", 32, box=box) if title else None
     if icon:
       box -= icon.width + PADDING
-    self.content_im = (
-      textutil.render(content, "sans", 32, box=box, markup=True) if content else None
+    self.content_layout = (
+      textutil.layout(content, "sans", 32, box=box, markup=True) if content else None
     )
 
+  def _title_size(self) -> tuple[int, int]:
+    return self.title_layout.get_pixel_size() if self.title_layout else (0, 0)
+
+  def _content_height(self) -> int:
+    content_h = self.content_layout.get_pixel_size()[1] if self.content_layout else 0
+    if self.icon:
+      content_h = max(content_h, self.icon.height)
+    return content_h
+
   @override
   def get_width(self) -> int:
     return WIDTH
 
   @override
   def get_height(self) -> int:
-    title_h = self.title_im.height if self.title_im else 0
-    content_h = self.content_im.height if self.content_im else 0
-    if self.icon:
-      content_h = max(content_h, self.icon.height)
-    return title_h + content_h + 16
+    return self._title_size()[1] + self._content_height() + 16
 
   @override
   def render(self, dst: Image.Image, x: int, y: int) -> None:
     x += PADDING
-    if self.title_im:
-      dst.paste(DIM_COLOR, (x, y, x + self.title_im.width + 16, y + self.title_im.height))
-      dst.paste(self.title_im, (x + 8, y), self.title_im)
-      y += self.title_im.height
-    content_h = self.content_im.height if self.content_im else 0
-    if self.icon:
-      content_h = max(content_h, self.icon.height)
+    title_w, title_h = self._title_size()
+    if self.title_layout:
+      dst.paste(DIM_COLOR, (x, y, x + title_w + 16, y + title_h))
+      textutil.paste(dst, (x + 8, y), self.title_layout)
+      y += title_h
+    content_h = self._content_height()
     dst.paste(DIM_COLOR, (x, y, WIDTH - PADDING, y + content_h + 16))
     x += 8
     y_ = y + 8 + content_h / 2
     if self.icon:
       imutil.paste(dst, self.icon, (x, y_), (0, 0.5))
       x += self.icon.width + PADDING
-    if self.content_im:
-      imutil.paste(dst, self.content_im, (x, y_), (0, 0.5))
+    if self.content_layout:
+      textutil.paste(dst, (x, y_), self.content_layout, anchor=(0, 0.5))
+
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    x += PADDING
+    title_w, title_h = self._title_size()
+    if self.title_layout:
+      fill_rect(cr, DIM_COLOR, (x, y, x + title_w + 16, y + title_h))
+      textutil.paint(cr, (x + 8, y), self.title_layout)
+      y += title_h
+    content_h = self._content_height()
+    fill_rect(cr, DIM_COLOR, (x, y, WIDTH - PADDING, y + content_h + 16))
+    x += 8
+    y_ = y + 8 + content_h / 2
+    if self.icon:
+      paint_image(cr, self.icon, x, round(y_ - self.icon.height / 2))
+      x += self.icon.width + PADDING
+    if self.content_layout:
+      textutil.paint(cr, (x, y_), self.content_layout, anchor=(0, 0.5))
 
 
 class Card(Render):
@@ -424,3 +561,10 @@ class Card(Render):
     for item in self.items:
       item.render(dst, x, y)
       y += item.get_height() + self.gap
+
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    y += self.padding
+    for item in self.items:
+      item.paint(cr, x, y)
+      y += item.get_height() + self.gap
@@ -523,11 +523,11 @@ class Table:
     align = cell.align or self.align
     return _RenderCell(cell.content, background=background, padding=padding, align=align)
 
-  def render(self) -> Image.Image:
+  def layout(self) -> "TableLayout":
     """
-    渲染表格到图像。
+    测量所有行列，得到可以多次渲染的排版结果。
 
-    :returns: 表格图像，RGB 模式。
+    :returns: 表格排版。
     """
     cells = [
       [self.__prepare_cell_for_render(x, y) for x in range(self.__columns)]
@@ -555,42 +555,98 @@ class Table:
       borders_v = [0] * (column_count + 1)
       borders_h = [0] * (row_count + 1)
       borders_color = (0, 0, 0)
-    borders_width = sum(borders_v)
-    borders_height = sum(borders_h)
-    table_width = sum(column_widths) + borders_width
-    table_height = sum(row_heights) + borders_height
-    image_width = table_width + self.__margin.left + self.__margin.right
-    image_height = table_height + self.__margin.top + self.__margin.bottom
-    image = Image.new("RGB", (image_width, image_height), self.__background_color)
-
-    x = self.__margin.left
+    return TableLayout(
+      cells,
+      column_widths,
+      row_heights,
+      list(borders_v),
+      list(borders_h),
+      borders_color,
+      self.__margin,
+      self.__background_color,
+    )
+
+  def render(self) -> Image.Image:
+    """
+    渲染表格到图像。
+
+    :returns: 表格图像，RGB 模式。
+    """
+    return self.layout().render()
+
+
+@final
+@dataclass(frozen=True)
+class TableLayout:
+  """测量好的表格，渲染时不会重新排版。"""
+
+  cells: list[list[_RenderCell]]
+  """参数已确定的单元格矩阵，先 y 后 x。"""
+
+  column_widths: list[int]
+  """每一列的宽度，不含边框。"""
+
+  row_heights: list[int]
+  """每一行的高度，不含边框。"""
+
+  borders_v: list[int]
+  """纵向边框粗细，元素数量为列数 + 1。"""
+
+  borders_h: list[int]
+  """横向边框粗细，元素数量为行数 + 1。"""
+
+  borders_color: Color
+  """边框颜色。"""
+
+  margin: MPB
+  """外边距。"""
+
+  background_color: RGB
+  """背景颜色，会填充外边距范围。"""
+
+  def render(self) -> Image.Image:
+    """
+    渲染表格到一张图像。
+
+    :returns: 表格图像，RGB 模式。
+    """
+    cells = self.cells
+    column_widths = self.column_widths
+    row_heights = self.row_heights
+    borders_v = self.borders_v
+    borders_h = self.borders_h
+    borders_color = self.borders_color
+    margin = self.margin
+    table_width = sum(column_widths) + sum(borders_v)
+    table_height = sum(row_heights) + sum(borders_h)
+    image_width = table_width + margin.left + margin.right
+    image_height = table_height + margin.top + margin.bottom
+    image = Image.new("RGB", (image_width, image_height), self.background_color)
+
+    x = margin.left
     for border, column_width in zip(borders_v, column_widths, strict=False):
       if border > 0:
-        replace(image, (borders_color, (border, table_height)), (x, self.__margin.top))
+        replace(image, (borders_color, (border, table_height)), (x, margin.top))
         x += border
       x += column_width
     if (border := borders_v[-1]) > 0:
-      replace(image, (borders_color, (border, table_height)), (x, self.__margin.top))
+      replace(image, (borders_color, (border, table_height)), (x, margin.top))
 
-    y = self.__margin.top
+    y = margin.top
     for border, row_height in zip(borders_h, row_heights, strict=False):
       if border > 0:
-        replace(image, (borders_color, (table_width, border)), (self.__margin.left, y))
+        replace(image, (borders_color, (table_width, border)), (margin.left, y))
         y += border
       y += row_height
     if (border := borders_h[-1]) > 0:
-      replace(image, (borders_color, (table_width, border)), (self.__margin.left, y))
-
-    y = self.__margin.top
-    for table_y, (row, border_h) in enumerate(zip(cells, borders_h, strict=False)):
-      if border_h is not None:
-        y += border_h
-      row_height = row_heights[table_y]
-      x = self.__margin.left
-      for table_x, (cell, border_v) in enumerate(zip(row, borders_v, strict=False)):
-        if border_v is not None:
-          x += border_v
-        column_width = column_widths[table_x]
+      replace(image, (borders_color, (table_width, border)), (margin.left, y))
+
+    y = margin.top
+    for row, border_h, row_height in zip(cells, borders_h, row_heights, strict=False):
+      y += border_h
+      x = margin.left
+      for cell, border_v, column_width in zip(row, borders_v, column_widths, strict=False):
+        x += border_v
         if cell.background is not None:
           replace(image, (cell.background, (column_width, row_height)), (x, y))
         if cell.content is not None:
@@ -5,12 +5,11 @@ import anyio
 import nonebot
 from arclet.alconna._internal._util import levenshtein
 from nonebot.adapters import Event
-from nonebot.exception import ActionFailed
 from nonebot.typing import T_State
 
+from idhagnbot import directory
 from idhagnbot.context import get_bot_id
-from idhagnbot.http import get_session
-from idhagnbot.image import normalize_url
+from idhagnbot.image import normalize_url, read_url
 from idhagnbot.message.common import ReplyInfo
 from idhagnbot.url import path_from_url
 
@@ -40,17 +39,11 @@ async def get_member(
   scene_id: str,
   user_id: str,
 ) -> Member | None:
-  try:
-    return await interface.get_member(scene_type, scene_id, user_id)
-  except (ActionFailed, ValueError):
-    return None
+  return await directory.get_member(interface, scene_type, scene_id, user_id)
 
 
 async def get_user(interface: Interface, user_id: str) -> User | None:
-  try:
-    return await interface.get_user(user_id)
-  except (ActionFailed, ValueError):
-    return None
+  return await directory.get_user(interface, user_id)
 
 
 async def fuzzy_get_member(
@@ -60,10 +53,7 @@ async def fuzzy_get_member(
   criterion: str,
   threshold: float = 0.8,
 ) -> Member | None:
-  try:
-    members = await interface.get_members(scene_type, scene_id)
-  except ActionFailed:
-    return None
+  members = await directory.get_members(interface, scene_type, scene_id)
   matches = list[tuple[Member, float]]()
   for member in members:
     nick = member.nick or member.user.nick or member.user.name or member.id
@@ -111,8 +101,7 @@ async def user_fetch(
     async with await anyio.Path(path_from_url(avatar)).open("rb") as f:
       data = await f.read()
   else:
-    async with get_session().get(normalize_url(avatar, interface.bot)) as response:
-      data = await response.read()
+    data = await read_url(normalize_url(avatar, interface.bot))
   if gender not in ("male", "female"):
     gender = "unknown"
   return data, nick, gender
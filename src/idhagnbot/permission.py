@@ -1,14 +1,16 @@
-from collections.abc import Iterable
+from collections.abc import Hashable, Iterable
 from enum import Enum
 from typing import Annotated, Any, Literal, cast
 
 import nonebot
+from nonebot.adapters import Event
 from nonebot.params import Depends
 from nonebot.permission import Permission
 from pydantic import BaseModel, Field, PrivateAttr
 from pygtrie import StringTrie
 from typing_extensions import override
 
+from idhagnbot.cache import CacheStats, LRUCache
 from idhagnbot.config import SharedConfig
 
 nonebot.require("nonebot_plugin_uninfo")
@@ -65,9 +67,16 @@ class Rule(BaseModel):
 
 class Config(BaseModel):
   rules: list[Rule] = Field(default_factory=list)
+  decision_cache_size: int = 16384
 
 
 CONFIG = SharedConfig("permission", Config)
+# 键为 (角色集合, 节点, 默认授予的角色集合)，规则变化时必须调用 invalidate
+_decisions = LRUCache[tuple[frozenset[str], Node, frozenset[str]], bool](
+  "permission",
+  Config().decision_cache_size,
+)
+_role_sets = LRUCache[Hashable, frozenset[str]]("permission_roles", 4096)
 CHANNEL_TYPES = {
   SceneType.CHANNEL_CATEGORY: "category",
   SceneType.CHANNEL_TEXT: "text",
@@ -85,7 +94,28 @@ def is_superuser(adapter: str, user_id: str) -> bool:
   return f"{adapter}:{user_id}" in driver.config.superusers or user_id in driver.config.superusers
 
 
+def _role_key(session: Uninfo) -> Hashable:
+  return (
+    session.adapter,
+    session.scope,
+    session.user.id,
+    session.scene.type,
+    session.scene.id,
+    session.scene.parent.id if session.scene.parent else None,
+    session.member.role.id if session.member and session.member.role else None,
+  )
+
+
 def get_roles(session: Uninfo) -> set[str]:
+  # 角色完全由键中的字段决定，成员角色变化时键也会变化，不需要另外失效
+  key = _role_key(session)
+  if (roles := _role_sets.get(key)) is None:
+    roles = frozenset(_get_roles(session))
+    _role_sets.put(key, roles)
+  return set(roles)
+
+
+def _get_roles(session: Uninfo) -> set[str]:
   scope = session.scope._name_ if isinstance(session.scope, Enum) else session.scope
   adapter = session.adapter._name_ if isinstance(session.adapter, Enum) else session.adapter
   roles = {"default", scope, adapter, f"user_{session.user.id}"}
@@ -109,11 +139,44 @@ def get_roles(session: Uninfo) -> set[str]:
   return roles
 
 
-Roles = Annotated[set[str], Depends(get_roles)]
+def event_roles(session: Uninfo, event: Event) -> set[str]:
+  # 同一个事件的所有事件响应器和帮助、回退建议共享同一个集合，不要修改
+  if (roles := getattr(event, "__idhagnbot_roles__", None)) is not None:
+    return roles
+  roles = get_roles(session)
+  setattr(event, "__idhagnbot_roles__", roles)
+  return roles
+
+
+Roles = Annotated[set[str], Depends(event_roles)]
+
+
+@CONFIG.onload
+def _(prev: Config | None, curr: Config) -> None:
+  _decisions.max_size = curr.decision_cache_size
+  invalidate()
+
+
+def invalidate() -> None:
+  """清空权限判定和角色缓存，在运行时修改规则后需要调用，重新加载配置时会自动调用。"""
+  _decisions.clear()
+  _role_sets.clear()
+
+
+def cache_stats() -> CacheStats:
+  return _decisions.stats()
 
 
 def check(node: Node, roles: set[str], default_grant_to: set[str]) -> bool:
-  config = CONFIG()
+  config = CONFIG()  # 先触发可能的重新加载，使缓存失效
+  key = (frozenset(roles), node, frozenset(default_grant_to))
+  if (result := _decisions.get(key)) is None:
+    result = _check(config, node, roles, default_grant_to)
+    _decisions.put(key, result)
+  return result
+
+
+def _check(config: Config, node: Node, roles: set[str], default_grant_to: set[str]) -> bool:
   values: list[tuple[int, int, Value]] = []
   for priority, rule in enumerate(config.rules):
     if rule.selectors_match(roles):
@@ -4,6 +4,7 @@ from nonebot.exception import IgnoredException
 from nonebot.message import event_preprocessor, run_preprocessor
 from nonebot.typing import T_State
 
+from idhagnbot.command import TEXT_REWRITERS
 from idhagnbot.context import SceneIdOnePrivate
 from idhagnbot.message import OrigUniMsg
 from idhagnbot.plugins.alias.common import COMMAND_UPDATER_REGISTRY, CONFIG
@@ -31,6 +32,16 @@ else:
   register()
 
 
+def rewrite_text(scene_id: str, text: str) -> str | None:
+  text = text.lstrip()
+  if alias := CONFIG().get_replacement(scene_id, text):
+    return alias.definition + text[len(alias.name) :]
+  return None
+
+
+TEXT_REWRITERS.append(rewrite_text)
+
+
 @event_preprocessor
 async def _(bot: Bot, scene_id: SceneIdOnePrivate, event: Event) -> None:
   if event.get_type() != "message":
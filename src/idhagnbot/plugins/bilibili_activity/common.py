@@ -3,7 +3,7 @@ import re
 from PIL import Image, ImageOps
 from pydantic import BaseModel, Field, PrivateAttr
 
-from idhagnbot.asyncio import gather_seq
+from idhagnbot.asyncio import gather_seq, get_limiter
 from idhagnbot.config import Reloadable, SharedConfig
 from idhagnbot.http import BROWSER_UA
 from idhagnbot.image import open_url
@@ -61,4 +61,7 @@ async def fetch_image(url: str) -> Image.Image:
 
 
 async def fetch_images(*urls: str) -> tuple[Image.Image, ...]:
-  return await gather_seq(fetch_image(url) for url in urls)
+  return await gather_seq(
+    (fetch_image(url) for url in urls),
+    limit=get_limiter("bilibili_image", 8),
+  )
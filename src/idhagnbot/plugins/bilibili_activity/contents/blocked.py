@@ -2,11 +2,10 @@ from collections.abc import Callable
 
 import nonebot
 from anyio.to_thread import run_sync
-from PIL import Image
 
 from idhagnbot import image
 from idhagnbot.asyncio import gather
-from idhagnbot.image.card import Card, CardAuthor, CardText
+from idhagnbot.image.card import Card, CardAuthor, CardText, render_card
 from idhagnbot.plugins.bilibili_activity.common import fetch_image
 from idhagnbot.plugins.bilibili_activity.extras import format_extra
 from idhagnbot.third_party.bilibili_activity import ActivityBlocked
@@ -47,8 +46,7 @@ async def format_activity(
   def make() -> UniMessage[Segment]:
     card = Card(0)
     appender(card)
-    im = Image.new("RGB", (card.get_width(), card.get_height()), (255, 255, 255))
-    card.render(im, 0, 0)
+    im = render_card(card)
     content_type = CONTENT_TYPES.get(activity.type, "动态")
     return UniMessage(
       [
@@ -8,7 +8,7 @@ from PIL import Image
 
 from idhagnbot import image as images
 from idhagnbot.asyncio import gather
-from idhagnbot.image.card import Card, CardAuthor, CardCover, CardLine, CardText
+from idhagnbot.image.card import Card, CardAuthor, CardCover, CardLine, CardText, render_card
 from idhagnbot.plugins.bilibili_activity.common import (
   CONFIG,
   IgnoredException,
@@ -321,8 +321,7 @@ async def format_activity(
     card.add(block)
     card.add(CardLine())
     appender(card)
-    im = Image.new("RGB", (card.get_width(), card.get_height()), (255, 255, 255))
-    card.render(im, 0, 0)
+    im = render_card(card)
     return UniMessage(
       [
         Text(f"{activity.name} 转发了{title_label}"),
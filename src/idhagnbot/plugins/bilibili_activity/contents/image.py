@@ -7,7 +7,7 @@ from PIL import Image, ImageOps
 
 from idhagnbot import image
 from idhagnbot.asyncio import gather
-from idhagnbot.image.card import Card, CardAuthor, CardCover
+from idhagnbot.image.card import Card, CardAuthor, CardCover, render_card
 from idhagnbot.plugins.bilibili_activity.common import (
   IMAGE_GAP,
   check_ignore,
@@ -73,8 +73,7 @@ async def format_activity(
   def make() -> UniMessage[Segment]:
     card = Card(0)
     appender(card)
-    im = Image.new("RGB", (card.get_width(), card.get_height()), (255, 255, 255))
-    card.render(im, 0, 0)
+    im = render_card(card)
     return UniMessage(
       [
         Text(f"{activity.name} 发布了动态"),
@@ -7,7 +7,7 @@ from PIL import Image, ImageOps
 
 from idhagnbot import image
 from idhagnbot.asyncio import gather
-from idhagnbot.image.card import Card, CardAuthor, CardCover, CardText
+from idhagnbot.image.card import Card, CardAuthor, CardCover, CardText, render_card
 from idhagnbot.plugins.bilibili_activity.common import (
   IMAGE_GAP,
   check_ignore,
@@ -72,8 +72,7 @@ async def format_activity(activity: ActivityOpus[object], can_ignore: bool) -> U
   def make() -> UniMessage[Segment]:
     card = Card(0)
     appender(card)
-    im = Image.new("RGB", (card.get_width(), card.get_height()), (255, 255, 255))
-    card.render(im, 0, 0)
+    im = render_card(card)
     activity_type = "专栏" if activity.type == "ARTICLE" else "动态"
     return UniMessage(
       [
@@ -9,16 +9,19 @@ from anyio.to_thread import run_sync
 from nonebot import logger
 from nonebot.exception import FinishedException
 from nonebot.typing import T_State
-from PIL import Image, ImageDraw, ImageOps
+from PIL import Image, ImageOps
 from typing_extensions import TypedDict
 
 from idhagnbot.color import split_rgb
 from idhagnbot.command import CommandBuilder
 from idhagnbot.http import BROWSER_UA, get_session
 from idhagnbot.image import (
+  Size,
   apply_circle_mask,
+  cached_primitive,
   get_resample,
   get_scale_resample,
+  make_rounded_rectangle_mask,
   open_url,
   to_segment,
 )
@@ -134,6 +137,26 @@ class LayoutedMedal:
   color_end: int
 
 
+@cached_primitive
+def make_medal_gradient(size: Size, color_start: int, color_end: int) -> Image.Image:
+  ratio = size[0] / size[1]
+  gradient = ImageOps.colorize(
+    Image.linear_gradient("L"),
+    split_rgb(color_start),
+    split_rgb(color_end),
+  ).rotate(45, get_resample(), expand=True)
+  grad_h = int(GRADIENT_45DEG_WH / (1 + ratio))
+  grad_w = int(ratio * grad_h)
+  return gradient.crop(
+    (
+      (gradient.width - grad_w) // 2,
+      (gradient.height - grad_h) // 2,
+      (gradient.width + grad_w) // 2,
+      (gradient.height + grad_h) // 2,
+    ),
+  ).resize(size, get_scale_resample())
+
+
 def make_list_item(name: str, uid: int, medal: MedalInfo | None) -> Image.Image:
   name_im = render(name, "sans", 32)
   uid_im = render(str(uid), "sans", 28)
@@ -168,13 +191,7 @@ def make_list_item(name: str, uid: int, medal: MedalInfo | None) -> Image.Image:
   x = name_im.width + margin
 
   y = (im.height - uid_im.height) // 2
-  rounded_im = Image.new("L", (uid_width * 2, uid_im.height * 2), 0)
-  ImageDraw.Draw(rounded_im).rounded_rectangle(
-    (0, 0, uid_width * 2 - 1, uid_im.height * 2 - 1),
-    8,
-    255,
-  )
-  rounded_im = rounded_im.resize((uid_width, uid_im.height), get_scale_resample())
+  rounded_im = make_rounded_rectangle_mask((uid_width, uid_im.height), 4)
   im.paste((221, 221, 221), (x, y), rounded_im)
   im.paste(uid_im, (x + padding, y), uid_im)
   x += uid_width + margin
@@ -190,22 +207,11 @@ def make_list_item(name: str, uid: int, medal: MedalInfo | None) -> Image.Image:
   im.paste(border_color, (x, y, x + layouted_medal.width, y + medal_height))
 
   medal_name_bg_width = medal_name_im.width + padding * 2
-  ratio = medal_name_bg_width / medal_name_im.height
-  gradient = ImageOps.colorize(
-    Image.linear_gradient("L"),
-    split_rgb(layouted_medal.color_start),
-    split_rgb(layouted_medal.color_end),
-  ).rotate(45, get_resample(), expand=True)
-  grad_h = int(GRADIENT_45DEG_WH / (1 + ratio))
-  grad_w = int(ratio * grad_h)
-  gradient = gradient.crop(
-    (
-      (gradient.width - grad_w) // 2,
-      (gradient.height - grad_h) // 2,
-      (gradient.width + grad_w) // 2,
-      (gradient.height + grad_h) // 2,
-    ),
-  ).resize((medal_name_bg_width, medal_name_im.height), get_scale_resample())
+  gradient = make_medal_gradient(
+    (medal_name_bg_width, medal_name_im.height),
+    layouted_medal.color_start,
+    layouted_medal.color_end,
+  )
   im.paste(gradient, (x + border, y + border))
   im.paste(medal_name_im, (x + border + padding, y + border), medal_name_im)
 
@@ -263,13 +269,7 @@ def make_header(
   im.paste(name_im, (x, 0), name_im)
 
   y = (name_im.height - uid_im.height) // 2
-  rounded_im = Image.new("L", (uid_width * 2, uid_im.height * 2), 0)
-  ImageDraw.Draw(rounded_im).rounded_rectangle(
-    (0, 0, rounded_im.width - 1, rounded_im.height - 1),
-    8,
-    255,
-  )
-  rounded_im = rounded_im.resize((uid_width, uid_im.height), get_scale_resample())
+  rounded_im = make_rounded_rectangle_mask((uid_width, uid_im.height), 4)
   im.paste((221, 221, 221), (x + name_im.width + margin, y), rounded_im)
   im.paste(uid_im, (x + name_im.width + margin + padding, y), uid_im)
 
@@ -304,7 +304,7 @@ async def handle_bilibili_check(id_or_name: str, state: T_State) -> None:
     # 2024-05-08: Cookie 为空时不能搜索，但任意非空字符串都可以搜索
     "Cookie": cookie or "SESSDATA=",
   }
-  session = get_session()
+  session = get_session("bilibili")
 
   try:
     uid = int(id_or_name)
@@ -7,7 +7,7 @@ from Crypto.Hash import HMAC, SHA256
 from pydantic import TypeAdapter
 from typing_extensions import TypedDict
 
-from idhagnbot.http import get_session
+from idhagnbot.http import fetch_cached
 
 
 class Meta(TypedDict):
@@ -78,7 +78,7 @@ def get_description() -> str:
 
 
 async def get_uids() -> set[int]:
-  async with get_session().get("https://furup.me/data/users.json") as response:
-    encrypted = EncryptedAdapter.validate_json(await response.text())
+  response = await fetch_cached("https://furup.me/data/users.json")
+  encrypted = EncryptedAdapter.validate_json(response.body)
   users = UsersAdapter.validate_json(decrypt(encrypted))
   return {int(user["uid"]) for user in users["users"]}
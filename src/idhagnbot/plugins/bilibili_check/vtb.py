@@ -1,7 +1,7 @@
 from pydantic import TypeAdapter
 from typing_extensions import TypedDict
 
-from idhagnbot.http import get_session
+from idhagnbot.http import fetch_cached
 from idhagnbot.plugins.bilibili_check.common import CONFIG
 
 
@@ -31,6 +31,6 @@ def get_description() -> str:
 
 
 async def get_uids() -> set[int]:
-  async with get_session().get(str(CONFIG().vtbs_api)) as response:
-    infos = VTBInfosAdapter.validate_json(await response.text())
+  response = await fetch_cached(str(CONFIG().vtbs_api))
+  infos = VTBInfosAdapter.validate_json(response.body)
   return {info["mid"] for info in infos}
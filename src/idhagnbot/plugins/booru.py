@@ -13,7 +13,7 @@ from nonebot.typing import T_State
 from pydantic import BaseModel, Field, RootModel
 
 from idhagnbot import SUPPORTED_ADAPTERS
-from idhagnbot.asyncio import gather_seq
+from idhagnbot.asyncio import gather_seq, get_limiter
 from idhagnbot.command import CommandBuilder
 from idhagnbot.config import SharedConfig
 from idhagnbot.http import get_session
@@ -380,7 +380,7 @@ async def handle_booru(
     page_current = 1
   offset = (page_current - 1) * page_size
 
-  http = get_session()
+  http = get_session("booru")
   api_url = url_to_absolute(
     site.origin,
     site.api_url.format(
@@ -424,7 +424,10 @@ async def handle_booru(
           await file.write(chunk)
       await file.flush()
 
-    await gather_seq(download_post(post, file) for post, file in zip(posts, files, strict=True))
+    await gather_seq(
+      (download_post(post, file) for post, file in zip(posts, files, strict=True)),
+      limit=get_limiter("booru_download", 8)(site.origin),
+    )
     message = UniMessage()
     for post, file in zip(posts, files, strict=True):
       post_id = site.id_ptr.select(post)
@@ -2,13 +2,14 @@ import random
 from pathlib import Path
 
 import nonebot
-from anyio.to_thread import run_sync
 from PIL import Image
 
+from idhagnbot.asyncio import run_process
 from idhagnbot.color import RGB, blend, parse, split_rgb
 from idhagnbot.command import CommandBuilder
 from idhagnbot.help import COMMAND_PREFIX
 from idhagnbot.image import to_segment
+from idhagnbot.image.asset import ImageAsset
 from idhagnbot.message import send_image_or_animation
 
 nonebot.require("nonebot_plugin_alconna")
@@ -19,6 +20,33 @@ DIR = Path(__file__).resolve().parent
 IMAGES = 50
 DURATION = 75
 MIDPOINT = 172
+FRAMES = [ImageAsset(DIR / f"{i}.png") for i in range(IMAGES)]
+
+
+def make(color_values: list[RGB]) -> ImageSeg:
+  frames = list[Image.Image]()
+  for i in range(IMAGES):
+    index, ratio = divmod(i / (IMAGES - 1) * (len(color_values) - 1), 1)
+    index = int(index)
+    if index + 1 >= len(color_values):
+      # 防止到最后一个颜色时越界
+      value = color_values[index]
+    else:
+      value = blend(color_values[index + 1], color_values[index], ratio)
+    im = FRAMES[i]()
+    upper_total = 255 - MIDPOINT
+    palette = im.getpalette()
+    new_palette = bytearray()
+    assert palette
+    for j in range(0, len(palette), 3):
+      new_palette.extend(
+        blend(value, (0, 0, 0), palette[j] / MIDPOINT)
+        if palette[j] <= MIDPOINT
+        else blend((255, 255, 255), value, (palette[j] - MIDPOINT) / upper_total),
+      )
+    im.putpalette(new_palette)
+    frames.append(im)
+  return to_segment(frames, DURATION)
 
 
 cabbage_doge = (
@@ -54,29 +82,4 @@ async def _(*, colors: tuple[str, ...]) -> None:
   if not color_values:
     color_values.append(split_rgb(random.randint(0, 0xFFFFFF)))
 
-  def make() -> ImageSeg:
-    frames = list[Image.Image]()
-    for i in range(IMAGES):
-      index, ratio = divmod(i / (IMAGES - 1) * (len(color_values) - 1), 1)
-      index = int(index)
-      if index + 1 >= len(color_values):
-        # 防止到最后一个颜色时越界
-        value = color_values[index]
-      else:
-        value = blend(color_values[index + 1], color_values[index], ratio)
-      im = Image.open(DIR / f"{i}.png")
-      upper_total = 255 - MIDPOINT
-      palette = im.getpalette()
-      new_palette = bytearray()
-      assert palette
-      for j in range(0, len(palette), 3):
-        new_palette.extend(
-          blend(value, (0, 0, 0), palette[j] / MIDPOINT)
-          if palette[j] <= MIDPOINT
-          else blend((255, 255, 255), value, (palette[j] - MIDPOINT) / upper_total),
-        )
-      im.putpalette(new_palette)
-      frames.append(im)
-    return to_segment(frames, DURATION)
-
-  await send_image_or_animation(await run_sync(make))
+  await send_image_or_animation(await run_process(make, color_values))
@@ -8,10 +8,11 @@ from nonebot.adapters import Bot
 from nonebot.exception import ActionFailed, NetworkError
 from pydantic import BaseModel, Field
 
-from idhagnbot.asyncio import create_background_task, gather_map, gather_seq
+from idhagnbot.asyncio import create_background_task, gather_map, gather_seq, get_limiter
 from idhagnbot.command import CommandBuilder
 from idhagnbot.config import Reloadable, SharedCache, SharedConfig
 from idhagnbot.context import get_bot_id, get_target_id
+from idhagnbot.directory import get_member, get_user
 from idhagnbot.permission import CHANNEL_TYPES
 from idhagnbot.plugins.daily_push.module import (
   MODULE_REGISTRY,
@@ -195,14 +196,14 @@ async def get_bot_name(bot: Bot, target: Target) -> str:
     return "IdhagnBot"
   self_id = await get_bot_id(bot)
   if target.channel:
-    member = await interface.get_member(SceneType.GUILD, target.parent_id, self_id)
+    member = await get_member(interface, SceneType.GUILD, target.parent_id, self_id)
   elif target.private:
-    member = await interface.get_member(SceneType.PRIVATE, target.id, self_id)
+    member = await get_member(interface, SceneType.PRIVATE, target.id, self_id)
   else:
-    member = await interface.get_member(SceneType.GROUP, target.id, self_id)
+    member = await get_member(interface, SceneType.GROUP, target.id, self_id)
   if member:
     return member.nick or member.user.nick or member.user.name or "IdhagnBot"
-  if user := await interface.get_user(self_id):
+  if user := await get_user(interface, self_id):
     return user.nick or user.name or "IdhagnBot"
   return "IdhagnBot"
 
@@ -241,7 +242,10 @@ async def send_one(target: Target, messages: list[UniMessage[Segment]]) -> None:
 async def send_push(push: Push) -> None:
   targets = [target.target for target in push.targets]
   messages = await format_all(push.modules, targets)
-  await gather_seq(send_one(target, messages[target]) for target in targets)
+  await gather_seq(
+    (send_one(target, messages[target]) for target in targets),
+    limit=get_limiter("daily_push_send", 4),
+  )
 
 
 resend_push = (
@@ -4,8 +4,8 @@ import nonebot
 from sqlalchemy import desc, func, select
 from typing_extensions import override
 
-from idhagnbot.asyncio import gather_seq
 from idhagnbot.context import get_target_id
+from idhagnbot.directory import get_members_of
 from idhagnbot.plugins.daily_push.module import TargetAwareModule
 
 nonebot.require("nonebot_plugin_alconna")
@@ -58,10 +58,14 @@ class RankModule(TargetAwareModule):
     else:
       scene_type = SceneType.GROUP
       scene_id = target.id
-    infos = await gather_seq(
-      interface.get_member(scene_type, scene_id, user_id) for user_id, _ in result
+    infos = await get_members_of(
+      interface,
+      scene_type,
+      scene_id,
+      [user_id for user_id, _ in result],
     )
-    for i, ((user_id, count), info) in enumerate(zip(result, infos, strict=True)):
+    for i, (user_id, count) in enumerate(result):
+      info = infos[user_id]
       prefix = EMOJIS[i] if i < len(EMOJIS) else f"{i + 1}."
       nickname = info.nick or info.user.nick or info.user.name or info.user.id if info else user_id
       lines.append(f"{prefix} {nickname} - {count} 条")
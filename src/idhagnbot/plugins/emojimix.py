@@ -2,6 +2,7 @@ import random
 import re
 from datetime import UTC, datetime, timedelta
 from functools import cached_property
+from pathlib import Path
 
 import nonebot
 from arclet.alconna import AllParam
@@ -10,12 +11,12 @@ from nonebot.typing import T_State
 from pydantic import BaseModel, Field, HttpUrl, TypeAdapter
 from typing_extensions import TypedDict
 
-from idhagnbot.asyncio import create_background_task
+from idhagnbot.asyncio import SingleFlight, create_background_task
 from idhagnbot.command import CommandBuilder
 from idhagnbot.config import SharedCache, SharedConfig
 from idhagnbot.context import BotAnyNick, BotId
 from idhagnbot.help import COMMAND_PREFIX
-from idhagnbot.http import get_session
+from idhagnbot.http import fetch_cached, get_session
 from idhagnbot.itertools import batched
 from idhagnbot.message import UniMsg
 from idhagnbot.permission import permission
@@ -98,8 +99,8 @@ def clear_emoji(emoji: str) -> str:
 async def update_cache() -> None:
   try:
     logger.info("正在更新 emojimix 数据")
-    async with get_session().get(API, proxy=CONFIG().proxy_aiohttp) as response:
-      data = ApiResponseAdapter.validate_json(await response.text())
+    response = await fetch_cached(API, proxy=CONFIG().proxy_aiohttp)
+    data = ApiResponseAdapter.validate_json(response.body)
     dates = list[str]()
     dates_map = dict[str, int]()
     emojis = dict[str, str]()
@@ -140,6 +141,17 @@ def get_code(emoji: str) -> str:
   return "-".join(f"u{ord(char):x}" for char in emoji)
 
 
+DOWNLOAD_FLIGHT = SingleFlight[None]("emojimix_download")
+
+
+async def download(url: str, path: Path) -> None:
+  async with get_session().get(url, proxy=CONFIG().proxy_aiohttp) as response:
+    data = await response.read()
+  # 读取完再打开文件，否则其他调用者可能看到空文件
+  with path.open("wb") as f:
+    f.write(data)
+
+
 async def handle_emojimix_common(emoji1: str, emoji2: str, swap: bool, show: bool) -> None:
   code1 = get_code(emoji1)
   code2 = get_code(emoji2)
@@ -154,9 +166,8 @@ async def handle_emojimix_common(emoji1: str, emoji2: str, swap: bool, show: boo
     url = f"{URL_PREFIX}/{date}/{code1}/{filename}"
   path = CACHE_DIR / filename
   if not path.exists():
-    async with get_session().get(url, proxy=CONFIG().proxy_aiohttp) as response:
-      with path.open("wb") as f:
-        f.write(await response.read())
+    # 同时请求同一个组合时只下载一次
+    await DOWNLOAD_FLIGHT(filename, lambda: download(url, path))
   message = UniMessage(Image(path=path, sticker=True))
   if show:
     message = Text(f"{emoji1}+{emoji2}=") + message
@@ -206,7 +206,8 @@ async def post_run(
       im.paste((205, 49, 49), (0, 32, im.width, 32 + header.height))
       paste(im, header, (im.width // 2, 32), (0.5, 0))
       im.paste(content, (32, 48 + header.height), content)
-      return to_segment(im)
+      # 同样的错误经常重复出现
+      return to_segment(im, cache=True)
 
     try:
       await UniMessage(await run_sync(make)).send(event, bot)
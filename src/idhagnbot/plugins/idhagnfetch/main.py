@@ -509,7 +509,10 @@ async def _(*, bot: Bot, bot_nick: BotAnyNick, bot_info: BotUser) -> None:
     gather_seq(BAR_ITEMS[name](bot) for name in config.bar_items),
   )
   avatar = (
-    await open_url(normalize_url(bot_info.avatar, bot))
+    await open_url(
+      normalize_url(bot_info.avatar, bot),
+      size=(config.avatar_size, config.avatar_size),
+    )
     if bot_info.avatar and config.avatar_size
     else None
   )
@@ -41,7 +41,10 @@ async def match_link(link: str, last_state: dict[str, Any]) -> MatchState:
   slug = match[1]
   if EXCLUDE_RE.match(slug) or is_same(slug, last_state):
     return MatchState(matched=False, state={})
-  async with get_session().get(f"https://b23.tv/{slug}", allow_redirects=False) as response:
+  async with get_session("bilibili").get(
+    f"https://b23.tv/{slug}",
+    allow_redirects=False,
+  ) as response:
     location = response.headers.get("Location")
   if not location:
     return MatchState(matched=False, state={})
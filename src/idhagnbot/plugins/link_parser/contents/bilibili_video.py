@@ -4,11 +4,10 @@ from typing import Any, Literal
 
 import nonebot
 from anyio.to_thread import run_sync
-from PIL import Image
 from pydantic import TypeAdapter, ValidationError
 from typing_extensions import TypedDict
 
-from idhagnbot.asyncio import gather
+from idhagnbot.asyncio import SingleFlight, gather
 from idhagnbot.http import BROWSER_UA, get_session
 from idhagnbot.image import open_url, to_segment
 from idhagnbot.image.card import (
@@ -19,6 +18,7 @@ from idhagnbot.image.card import (
   CardText,
   InfoCount,
   InfoText,
+  render_card,
 )
 from idhagnbot.plugins.link_parser.common import FormatState, MatchState
 from idhagnbot.third_party.bilibili_auth import validate_result
@@ -112,6 +112,19 @@ class ApiResult(TypedDict):
   Tags: list[ApiTag]
 
 
+# 同一个链接经常被同时发到多个群
+INFO_FLIGHT = SingleFlight[Any]("bilibili_video_info", ttl=30)
+
+
+async def fetch_info(params: dict[str, str]) -> Any:
+  async with get_session("bilibili").get(
+    INFO_API,
+    headers={"User-Agent": BROWSER_UA},
+    params=params,
+  ) as response:
+    return await response.json()
+
+
 def format_duration(seconds: int) -> str:
   minutes, seconds = divmod(seconds, 60)
   hours, minutes = divmod(minutes, 24)
@@ -133,12 +146,7 @@ async def match_link(link: str, last_state: dict[str, Any]) -> MatchState:
     if is_bvid_same(video, last_state):
       return MatchState(matched=False, state={})
     params = {"bvid": video}
-  async with get_session().get(
-    INFO_API,
-    headers={"User-Agent": BROWSER_UA},
-    params=params,
-  ) as response:
-    data = await response.json()
+  data = await INFO_FLIGHT(tuple(params.items()), lambda: fetch_info(params))
   if data["code"] in (-404, 62002, 62004, 62012):  # 不存在、不可见、审核中、仅UP主自己可见
     return MatchState(matched=False, state={})
   result = validate_result(data, ApiResult)
@@ -155,7 +163,7 @@ async def format_link(
   data_stat = data_view["stat"]
 
   avatar, cover = await gather(
-    open_url(data_card["face"], headers={"User-Agent": BROWSER_UA}),
+    open_url(data_card["face"], headers={"User-Agent": BROWSER_UA}, size=(40, 40)),
     open_url(data_view["pic"], headers={"User-Agent": BROWSER_UA}),
   )
 
@@ -199,8 +207,7 @@ async def format_link(
     card.add(block)
 
     # 3. 渲染卡片并发送
-    im = Image.new("RGB", (card.get_width(), card.get_height()), (255, 255, 255))
-    card.render(im, 0, 0)
+    im = render_card(card)
     return to_segment(im)
 
   bvid = data_view["bvid"]
@@ -18,7 +18,7 @@ from pydantic import BaseModel, HttpUrl, TypeAdapter
 from idhagnbot.asyncio import create_background_task
 from idhagnbot.command import CommandBuilder
 from idhagnbot.config import Reloadable, SharedConfig
-from idhagnbot.http import get_session
+from idhagnbot.http import RetryPolicy, get_session
 from idhagnbot.meme_common import FetchError, MemeImage, MemeParam, handle_params
 from idhagnbot.message import send_image_or_animation
 from idhagnbot.message.common import MaybeReplyInfo
@@ -105,6 +105,7 @@ CONFIG = SharedConfig("meme_generator", Config, Reloadable.EAGER)
 lock = anyio.Lock()
 matchers = list[type[Matcher]]()
 memes = dict[str, MemeInfo]()
+INIT_RETRY = RetryPolicy(base_delay=1, max_delay=300)
 
 
 @CONFIG.onload
@@ -152,6 +153,7 @@ async def add_matchers() -> None:
     if not config.base_url:
       return
     http = get_session()
+    attempt = 0
     while True:
       try:
         async with http.get(f"{config.base_url}memes/keys", raise_for_status=True) as response:
@@ -159,7 +161,8 @@ async def add_matchers() -> None:
           break
       except ClientError:
         logger.exception("初始化 meme_generator 失败")
-        await anyio.sleep(10)
+        await anyio.sleep(INIT_RETRY.delay(attempt))
+        attempt += 1
     async with anyio.create_task_group() as tg:
       for key in keys:
         tg.start_soon(add_matcher, key)
@@ -99,7 +99,7 @@ def avatar_process(im: Image.Image) -> Image.Image:
 async def fetch_avatar(info: UserInfo) -> Image.Image:
   if info.avatar.startswith("avatar://"):
     return await run_sync(generate_avatar, info)
-  return await open_url(info.avatar, avatar_process)
+  return await open_url(info.avatar, avatar_process, size=(64, 64))
 
 
 async def fetch_avatars(users: dict[str, UserInfo]) -> dict[str, Image.Image]:
@@ -14,6 +14,7 @@ from idhagnbot.command import COMMAND_LIKE_KEY, CommandBuilder
 from idhagnbot.config import Reloadable, SharedConfig
 from idhagnbot.context import SceneId, SceneIdRaw, get_scene
 from idhagnbot.datetime import DATE_ARGS_USAGE, parse_date_range
+from idhagnbot.directory import get_member, get_members_of, get_user
 from idhagnbot.message import EventTime, UniMsg
 
 nonebot.require("nonebot_plugin_alconna")
@@ -72,9 +73,9 @@ async def get_member_name(
   scene_id: str,
   user_id: str,
 ) -> str:
-  if member := await interface.get_member(scene_type, scene_id, user_id):
+  if member := await get_member(interface, scene_type, scene_id, user_id):
     return member.nick or member.user.nick or member.user.name or member.user.id
-  if user := await interface.get_user(user_id):
+  if user := await get_user(interface, user_id):
     return user.nick or user.name or user.id
   return user_id
 
@@ -255,7 +256,10 @@ def register(counter: Counter) -> Generator[type[Matcher], None, None]:
       f"{scene.name} 内 {start_date:%Y-%m-%d %H:%M:%S} 到 {end_date:%Y-%m-%d %H:%M:%S} "
       f"的{counter.name}次数排行",
     ]
-    for rank, (user_id, count) in enumerate(result, 1):
+    rows = list(result)
+    # 一次性获取成员列表填充缓存，下面逐个获取名字时就不需要调用 API 了
+    await get_members_of(interface, scene.type, scene.id, [user_id for user_id, _ in rows])
+    for rank, (user_id, count) in enumerate(rows, 1):
       member_name = await get_member_name(interface, scene.type, scene.id, user_id)
       lines.append(f"{rank}. {member_name} × {count} 条")
     await UniMessage("\n".join(lines)).send()
@@ -111,7 +111,7 @@ class Parser(HTMLParser):
 
 
 async def get_free_games() -> list[Game]:
-  async with get_session().get(API, proxy=CONFIG().proxy) as response:
+  async with get_session("steam").get(API, proxy=CONFIG().proxy) as response:
     data = ApiResultAdapter.validate_python(await response.json())
   return Parser.parse(data["results_html"])
 
@@ -74,7 +74,7 @@ class Item:
 
 
 async def get_free_items() -> list[Item]:
-  async with get_session().get(API, proxy=CONFIG().proxy) as response:
+  async with get_session("steam").get(API, proxy=CONFIG().proxy) as response:
     result = ApiResultAdapter.validate_python(await response.json())
   items = list[Item]()
   for item in result["response"]["definitions"]:
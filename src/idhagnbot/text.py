@@ -1,4 +1,6 @@
 import math
+import threading
+from collections.abc import Callable, Hashable
 from typing import Any, ClassVar, Literal, Self, TypeAlias, Union, cast, overload
 
 import cairo
@@ -7,6 +9,8 @@ from PIL import Image
 from pydantic import BaseModel, Field
 
 from idhagnbot import image
+from idhagnbot.asyncio import process_initializer
+from idhagnbot.cache import LRUCache, sizeof_image
 from idhagnbot.color import split_rgb
 from idhagnbot.config import SharedConfig
 
@@ -28,9 +32,12 @@ class Config(BaseModel):
   text_subpixel: CairoSubpixel = "default"
   text_hint_metrics: CairoHintMetrics = True
   text_hint_style: CairoHintStyle = "slight"
+  render_cache_size: int = 32 * 1024 * 1024
 
 
 CONFIG = SharedConfig("text", Config)
+# 缓存中的图片不会直接交给调用者，每次返回副本；键包含文本、字体、排版参数和颜色
+RENDER_CACHE = LRUCache[Hashable, Image.Image]("text", Config().render_cache_size, sizeof_image)
 Layout: TypeAlias = Pango.Layout
 Wrap = Literal["word", "char", "word_char"]
 Ellipsize = Literal["start", "middle", "end"] | None
@@ -82,6 +89,61 @@ HINT_STYLES: dict[CairoHintStyle, cairo.HintStyle] = {
 }
 
 
+_font_options: cairo.FontOptions | None = None
+_font_options_revision = 0
+
+
+class _ThreadContext(threading.local):
+  # Pango.Context 不是线程安全的，每个线程（包括 run_sync 的工作线程）各自持有一个
+  context: Pango.Context | None = None
+  revision = -1
+
+
+_thread_context = _ThreadContext()
+
+
+@CONFIG.onload
+def _(prev: Config | None, curr: Config) -> None:
+  global _font_options, _font_options_revision
+  _font_options = None
+  _font_options_revision += 1
+  # 字体替换和字体选项都会影响渲染结果
+  RENDER_CACHE.clear()
+  RENDER_CACHE.max_size = curr.render_cache_size
+
+
+def _compiled_font_options() -> cairo.FontOptions:
+  global _font_options
+  config = CONFIG()  # 配置重载后，这里会触发 onload 使旧的字体选项失效
+  if _font_options is None:
+    options = cairo.FontOptions()
+    options.set_antialias(ANTIALIASES[config.text_antialias])
+    options.set_subpixel_order(SUBPIXEL_ORDERS[config.text_subpixel])
+    options.set_hint_metrics(HINT_METRICS[config.text_hint_metrics])
+    options.set_hint_style(HINT_STYLES[config.text_hint_style])
+    _font_options = options
+  return _font_options
+
+
+def _new_context() -> Pango.Context:
+  context = Pango.Context()
+  context.set_font_map(PangoCairo.FontMap.get_default())
+  PangoCairo.context_set_font_options(context, _compiled_font_options())
+  return context
+
+
+def _pooled_context() -> Pango.Context:
+  # 同一线程中不含图片的 RichText 共享一个 Pango.Context，保留字体和字形缓存
+  options = _compiled_font_options()
+  if _thread_context.context is None:
+    _thread_context.context = _new_context()
+  elif _thread_context.revision != _font_options_revision:
+    PangoCairo.context_set_font_options(_thread_context.context, options)
+    _thread_context.context.changed()
+  _thread_context.revision = _font_options_revision
+  return _thread_context.context
+
+
 # 增加一个辅助类，防止 Pango.Context 和 RichText 循环引用导致内存泄漏
 class ImageHolder:
   _images: dict[int, cairo.ImageSurface]
@@ -114,25 +176,53 @@ class RichText:
   _IMAGE_REPLACEMENT: ClassVar[bytes] = "￼".encode()
 
   _context: Pango.Context
-  _images: ImageHolder
+  _images: ImageHolder | None
   _utf8: bytearray
   _attrs: Pango.AttrList
   _layout: Layout
+  _key: list[Hashable] | None
 
   def __init__(self) -> None:
     super().__init__()
-    self._context = Pango.Context()
-    self._context.set_font_map(PangoCairo.FontMap.get_default())
-    self._images = ImageHolder()
-    font_options(self._context)
-    self._images.bind(self._context)
+    self._context = _pooled_context()
+    self._images = None
     self._utf8 = bytearray()
     self._attrs = Pango.AttrList()
     self._layout = Layout.new(self._context)
+    self._key = []
+
+  def _own_context(self) -> ImageHolder:
+    # 图片通过 shape renderer 绘制，它绑定在 Pango.Context 上，不能使用共享的 Context
+    # 换用独立的 Context 并重建 Layout，文本和属性在 unwrap 时才设置，无需复制
+    if self._images is not None:
+      return self._images
+    context = _new_context()
+    images = ImageHolder()
+    images.bind(context)
+    layout = Layout.new(context)
+    if desc := self._layout.get_font_description():
+      layout.set_font_description(desc)
+    layout.set_width(self._layout.get_width())
+    layout.set_height(self._layout.get_height())
+    layout.set_wrap(self._layout.get_wrap())
+    layout.set_ellipsize(self._layout.get_ellipsize())
+    layout.set_spacing(self._layout.get_spacing())
+    layout.set_line_spacing(self._layout.get_line_spacing())
+    layout.set_alignment(self._layout.get_alignment())
+    self._context = context
+    self._images = images
+    self._layout = layout
+    return images
+
+  def _record(self, *op: Hashable) -> None:
+    # 记录构建操作，作为渲染缓存的键
+    if self._key is not None:
+      self._key.append(op)
 
   def append(self, text: str) -> Self:
     text = text.replace("\r", "").replace("\n", "\u2028")
     self._utf8.extend(text.encode())
+    self._record("text", text)
     return self
 
   def append_markup(self, markup: str) -> Self:
@@ -141,12 +231,16 @@ class RichText:
     utf8 = text.encode()
     self._attrs.splice(attrs, len(self._utf8), len(utf8))
     self._utf8.extend(utf8)
+    self._record("markup", markup)
     return self
 
   def append_image(self, im: Image.Image, align: ImageAlign = "middle") -> Self:
+    # 图片内容无法廉价地作为键，含有图片的富文本不缓存
+    self._key = None
+    images = self._own_context()
     image_id = id(im)
-    if image_id not in self._images:
-      self._images[image_id] = image.to_cairo(im)
+    if image_id not in images:
+      images[image_id] = image.to_cairo(im)
     metrics = self._context.get_metrics(self._layout.get_font_description())
     rect = Pango.Rectangle()
     if align == "top":
@@ -172,13 +266,16 @@ class RichText:
     desc = Pango.FontDescription.from_string(font)
     desc.set_absolute_size(Pango.SCALE * size)
     self._layout.set_font_description(desc)
+    self._record("font", font, size)
     return self
 
   def set_width(self, width: int) -> Self:
     self._layout.set_width(width * Pango.SCALE)
+    self._record("width", width)
     return self
 
   def set_height(self, height: int) -> Self:
+    self._record("height", height)
     if height > 0:
       height *= Pango.SCALE
     self._layout.set_height(height)
@@ -186,10 +283,12 @@ class RichText:
 
   def set_wrap(self, wrap: Wrap) -> Self:
     self._layout.set_wrap(WRAPS[wrap])
+    self._record("wrap", wrap)
     return self
 
   def set_ellipsize(self, ellipsize: Ellipsize) -> Self:
     self._layout.set_ellipsize(ELLIPSIZES[ellipsize])
+    self._record("ellipsize", ellipsize)
     return self
 
   def set_spacing(self, spacing: float) -> Self:
@@ -199,28 +298,40 @@ class RichText:
     else:
       self._layout.set_line_spacing(0)
       self._layout.set_spacing(int(spacing * Pango.SCALE))
+    self._record("spacing", spacing)
     return self
 
   def set_align(self, align: Align) -> Self:
     self._layout.set_alignment(ALIGNS[align])
+    self._record("align", align)
     return self
 
   def size(self) -> tuple[int, int]:
     _, rect = self._layout.get_pixel_extents()
     return (rect.width, rect.height)
 
-  def unwrap(self) -> Layout:
+  def _unwrap(self) -> Layout:
     self._layout.set_text(self._utf8.decode())
     self._layout.set_attributes(self._attrs)
     return self._layout
 
+  def unwrap(self) -> Layout:
+    # 调用者可能直接修改 Layout，之后的渲染结果不能再缓存
+    self._key = None
+    return self._unwrap()
+
   def render(
     self,
     color: image.Color = (0, 0, 0),
     stroke: float = 0,
     stroke_color: image.Color = (255, 255, 255),
+    *,
+    cache: bool = True,
   ) -> Image.Image:
-    return render(self.unwrap(), color=color, stroke=stroke, stroke_color=stroke_color)
+    if not cache or self._key is None:
+      return _render_layout(self._unwrap(), color, stroke, stroke_color)
+    key = ("rich", tuple(self._key), color, stroke, stroke_color)
+    return _render_cached(key, self._unwrap, color, stroke, stroke_color)
 
   def paste(
     self,
@@ -230,8 +341,10 @@ class RichText:
     color: image.Color = (0, 0, 0),
     stroke: float = 0,
     stroke_color: image.Color = (255, 255, 255),
+    *,
+    cache: bool = True,
   ) -> Image.Image:
-    src = render(self.unwrap(), color=color, stroke=stroke, stroke_color=stroke_color)
+    src = self.render(color, stroke, stroke_color, cache=cache)
     image.paste(im, src, xy, anchor=anchor)
     return src
 
@@ -249,12 +362,7 @@ def special_font(name: str, fallback: str) -> str:
 def font_options(
   context: Union[None, Pango.Context, "cairo.Context[Any]"] = None,
 ) -> cairo.FontOptions:
-  config = CONFIG()
-  options = cairo.FontOptions()
-  options.set_antialias(ANTIALIASES[config.text_antialias])
-  options.set_subpixel_order(SUBPIXEL_ORDERS[config.text_subpixel])
-  options.set_hint_metrics(HINT_METRICS[config.text_hint_metrics])
-  options.set_hint_style(HINT_STYLES[config.text_hint_style])
+  options = _compiled_font_options().copy()
   if isinstance(context, Pango.Context):
     PangoCairo.context_set_font_options(context, options)
   elif isinstance(context, cairo.Context):
@@ -290,6 +398,63 @@ def layout(
   return render.unwrap()
 
 
+def _render_layout(
+  l: Layout,
+  color: image.Color,
+  stroke: float,
+  stroke_color: image.Color,
+) -> Image.Image:
+  _, rect = l.get_pixel_extents()
+  margin = math.ceil(stroke)
+  w = rect.width + margin * 2
+  h = rect.height + margin * 2
+  with cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h) as surface:
+    cr = cairo.Context(surface)
+    _draw_layout(cr, l, -rect.x + margin, -rect.y + margin, color, stroke, stroke_color)
+    return image.from_cairo(surface)
+
+
+def _draw_layout(
+  cr: "cairo.Context[Any]",
+  l: Layout,
+  x: float,
+  y: float,
+  color: image.Color,
+  stroke: float,
+  stroke_color: image.Color,
+) -> None:
+  if stroke:
+    if isinstance(stroke_color, int):
+      stroke_color = split_rgb(stroke_color)
+    cr.move_to(x, y)
+    PangoCairo.layout_path(cr, l)
+    cr.set_line_width(stroke * 2)
+    cr.set_source_rgb(stroke_color[0] / 255, stroke_color[1] / 255, stroke_color[2] / 255)
+    cr.stroke()
+  if isinstance(color, int):
+    color = split_rgb(color)
+  cr.move_to(x, y)
+  cr.set_source_rgb(color[0] / 255, color[1] / 255, color[2] / 255)
+  PangoCairo.show_layout(cr, l)
+
+
+def _render_cached(
+  key: Hashable,
+  make_layout: Callable[[], Layout],
+  color: image.Color,
+  stroke: float,
+  stroke_color: image.Color,
+) -> Image.Image:
+  # 配置重载后，这里会触发 onload 清空缓存，避免命中时继续返回旧配置下的渲染结果
+  CONFIG()
+  # 调用者可能会原地修改返回的图片，所以缓存中的图片只能交出副本
+  if (im := RENDER_CACHE.get(key)) is not None:
+    return im.copy()
+  im = _render_layout(make_layout(), color, stroke, stroke_color)
+  RENDER_CACHE.put(key, im)
+  return im.copy()
+
+
 @overload
 def render(
   content: Layout,
@@ -307,6 +472,7 @@ def render(
   color: image.Color = ...,
   stroke: float = ...,
   stroke_color: image.Color = ...,
+  cache: bool = ...,
   box: int | None = ...,
   wrap: Wrap = ...,
   ellipsize: Ellipsize = ...,
@@ -321,31 +487,22 @@ def render(
   color: image.Color = (0, 0, 0),
   stroke: float = 0,
   stroke_color: image.Color = (255, 255, 255),
+  cache: bool = True,
   **kw: Any,
 ) -> Image.Image:
-  l = content if isinstance(content, Layout) else layout(content, *args, **kw)
-  _, rect = l.get_pixel_extents()
-  margin = math.ceil(stroke)
-  x = -rect.x + margin
-  y = -rect.y + margin
-  w = rect.width + margin * 2
-  h = rect.height + margin * 2
-  with cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h) as surface:
-    cr = cairo.Context(surface)
-    if stroke:
-      if isinstance(stroke_color, int):
-        stroke_color = split_rgb(stroke_color)
-      cr.move_to(x, y)
-      PangoCairo.layout_path(cr, l)
-      cr.set_line_width(stroke * 2)
-      cr.set_source_rgb(stroke_color[0] / 255, stroke_color[1] / 255, stroke_color[2] / 255)
-      cr.stroke()
-    if isinstance(color, int):
-      color = split_rgb(color)
-    cr.move_to(x, y)
-    cr.set_source_rgb(color[0] / 255, color[1] / 255, color[2] / 255)
-    PangoCairo.show_layout(cr, l)
-    return image.from_cairo(surface)
+  # Layout 是可变对象，只有从字符串排版的结果可以缓存
+  if isinstance(content, Layout):
+    return _render_layout(content, color, stroke, stroke_color)
+  if not cache:
+    return _render_layout(layout(content, *args, **kw), color, stroke, stroke_color)
+  key = ("render", content, args, frozenset(kw.items()), color, stroke, stroke_color)
+  return _render_cached(
+    key,
+    lambda: layout(content, *args, **kw),
+    color,
+    stroke,
+    stroke_color,
+  )
 
 
 @overload
@@ -371,6 +528,7 @@ def paste(
   color: image.Color = ...,
   stroke: float = ...,
   stroke_color: image.Color = ...,
+  cache: bool = ...,
   box: int | None = ...,
   wrap: Wrap = ...,
   ellipsize: Ellipsize = ...,
@@ -389,3 +547,39 @@ def paste(
   text = render(*args, **kw)
   image.paste(im, text, xy, anchor=anchor)
   return text
+
+
+def paint(
+  cr: "cairo.Context[Any]",
+  xy: tuple[float, float],
+  content: Layout,
+  *,
+  anchor: image.Point = (0, 0),
+  color: image.Color = (0, 0, 0),
+  stroke: float = 0,
+  stroke_color: image.Color = (255, 255, 255),
+) -> None:
+  """
+  直接在 cairo 上下文中绘制排版好的文本，位置与 paste 相同，但不产生中间图片。
+  用于在一张画布上绘制大量不会重复的文本（例如卡片），会重复的文本用 paste 利用渲染缓存更快。
+
+  :param cr: 目标 cairo 上下文。
+  :param xy: 文本矩形的位置。
+  :param content: 排版好的文本。
+  :param anchor: 文本矩形的对齐方式。
+  :param color: 文本颜色。
+  :param stroke: 描边宽度。
+  :param stroke_color: 描边颜色。
+  """
+  _, rect = content.get_pixel_extents()
+  margin = math.ceil(stroke)
+  x = round(xy[0] - (rect.width + margin * 2) * anchor[0]) - rect.x + margin
+  y = round(xy[1] - (rect.height + margin * 2) * anchor[1]) - rect.y + margin
+  _draw_layout(cr, content, x, y, color, stroke, stroke_color)
+
+
+@process_initializer
+def _() -> None:
+  # 在工作进程中预先加载字体配置和常用字体，避免第一次渲染变慢
+  for font in ("sans", "sans bold", "serif", "monospace"):
+    layout("IdhagnBot", font, 16).get_pixel_extents()
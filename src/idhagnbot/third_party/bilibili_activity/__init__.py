@@ -11,7 +11,7 @@ from typing import (
 from pydantic import TypeAdapter
 from typing_extensions import TypedDict, override
 
-from idhagnbot.http import BROWSER_UA, get_session
+from idhagnbot.http import BROWSER_UA, request
 from idhagnbot.third_party.bilibili_auth import get_cookie, validate_result
 
 TContent_co = TypeVar("TContent_co", covariant=True)
@@ -323,25 +323,25 @@ class ApiDetailResult(TypedDict):
 
 
 async def fetch(uid: int, offset: str = "") -> tuple[list[ApiDynamic], str | None]:
-  http = get_session()
   headers = {
     "Cookie": get_cookie(),
     "User-Agent": BROWSER_UA,
   }
-  async with http.get(LIST_API.format(uid=uid, offset=offset), headers=headers) as response:
+  url = LIST_API.format(uid=uid, offset=offset)
+  async with request("GET", url, session="bilibili", headers=headers) as response:
     data = validate_result(await response.json(), ApiSpaceResult)
   next_offset = data["offset"] if data["has_more"] else None
   return data["items"], next_offset
 
 
 async def get(activity_id: int) -> ApiDynamic:
-  http = get_session()
   headers = {
     "Referer": f"https://t.bilibili.com/{activity_id}",
     "Cookie": get_cookie(),
     "User-Agent": BROWSER_UA,
   }
-  async with http.get(DETAIL_API.format(id=activity_id), headers=headers) as response:
+  url = DETAIL_API.format(id=activity_id)
+  async with request("GET", url, session="bilibili", headers=headers) as response:
     data = validate_result(await response.json(), ApiDetailResult)
   return data["item"]
 
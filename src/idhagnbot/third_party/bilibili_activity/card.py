@@ -1,14 +1,19 @@
+from typing import TYPE_CHECKING, Any
+
 from PIL import Image
 from typing_extensions import override
 
 from idhagnbot.asyncio import gather_map
 from idhagnbot.image import get_scale_resample, open_url
-from idhagnbot.image.card import CONTENT_WIDTH, PADDING, WIDTH, Render
+from idhagnbot.image.card import CONTENT_WIDTH, PADDING, WIDTH, Render, paint_image
+from idhagnbot.text import Layout, escape, paint, paste, render
 from idhagnbot.text import RichText as RichTextRender
-from idhagnbot.text import escape, render
 
 from . import RichText, RichTextEmotion, RichTextText, Topic
 
+if TYPE_CHECKING:
+  import cairo
+
 EMOTION_SIZE = 48
 
 
@@ -50,9 +55,16 @@ class CardTopic(Render):
     if self._im:
       dst.paste(self._im, (x + PADDING, y), self._im)
 
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    # 话题经常重复，使用渲染缓存中的图片
+    if self._im:
+      paint_image(cr, self._im, x + PADDING, y)
+
 
 class CardRichText(Render):
-  _im: Image.Image
+  _layout: Layout
+  _height: int
 
   def __init__(
     self,
@@ -71,7 +83,8 @@ class CardRichText(Render):
         render.append_image(emotions[node.url])
       else:
         render.append_markup(f"<span color='#008ac5'>{escape(node.text)}</span>")
-    self._im = render.render()
+    self._layout = render.unwrap()
+    self._height = self._layout.get_pixel_size()[1]
 
   @override
   def get_width(self) -> int:
@@ -79,8 +92,12 @@ class CardRichText(Render):
 
   @override
   def get_height(self) -> int:
-    return self._im.height
+    return self._height
 
   @override
   def render(self, dst: Image.Image, x: int, y: int) -> None:
-    dst.paste(self._im, (x + PADDING, y), self._im)
+    paste(dst, (x + PADDING, y), self._layout)
+
+  @override
+  def paint(self, cr: "cairo.Context[Any]", x: int, y: int) -> None:
+    paint(cr, (x + PADDING, y), self._layout)
@@ -11,7 +11,7 @@ from pydantic import AliasChoices, BaseModel, Field
 from yarl import URL
 
 from idhagnbot.config import SharedCache
-from idhagnbot.http import get_session
+from idhagnbot.http import fetch_cached
 
 nonebot.require("nonebot_plugin_apscheduler")
 from nonebot_plugin_apscheduler import scheduler
@@ -112,13 +112,10 @@ async def update_tlds() -> None:
   if now - data.last_update < timedelta(7):
     return
   logger.info("正在更新 URL 数据")
-  http = get_session()
-  async with http.get("https://data.iana.org/TLD/tlds-alpha-by-domain.txt") as response:
-    tlds = await response.text()
-  data.tlds = set(tlds.lower().splitlines()[1:])
-  async with http.get("https://rules2.clearurls.xyz/data.minify.json") as response:
-    rules = ClearURLsRules.model_validate(await response.json())
-  data.clearurls_rules = list(rules.providers.values())
+  tlds = await fetch_cached("https://data.iana.org/TLD/tlds-alpha-by-domain.txt")
+  data.tlds = set(tlds.text().lower().splitlines()[1:])
+  rules = await fetch_cached("https://rules2.clearurls.xyz/data.minify.json")
+  data.clearurls_rules = list(ClearURLsRules.model_validate_json(rules.body).providers.values())
   data.last_update = now
   CACHE.dump()
 
@@ -0,0 +1,62 @@
+import nonebot
+import pytest
+
+nonebot.init(command_start={"/"})
+
+from arclet.alconna import Alconna, CommandMeta
+
+from idhagnbot.command import CommandIndex
+
+
+def make_parser(name: str, use_command_start: bool, *, compact: bool = False) -> Alconna[str]:
+  # 与 nonebot-plugin-alconna 相同：使用命令起始符时把它们作为命令前缀，否则没有前缀
+  prefixes = list(nonebot.get_driver().config.command_start) if use_command_start else []
+  return Alconna(
+    prefixes,
+    name,
+    meta=CommandMeta(compact=compact),
+    namespace=f"test_command_{use_command_start}",
+  )
+
+
+@pytest.mark.parametrize("use_command_start", [True, False])
+def test_candidates_follow_prefixes(use_command_start: bool) -> None:
+  index = CommandIndex()
+  parser = make_parser("签到", use_command_start)
+  index.add(parser, {"打卡"})
+  expected = {"/签到", "/打卡"} if use_command_start else {"签到", "打卡"}
+  for word in ("签到", "/签到", "打卡", "/打卡", "签到了", "/"):
+    candidates = index.candidates(word)
+    # 索引找出的候选必须包括 Alconna 实际能匹配的命令
+    if parser.parse(word).matched:
+      assert parser.path in candidates
+    assert (parser.path in candidates) == (word in expected)
+  assert index.candidates("你好") == set()
+  index.remove(parser)
+  assert index.candidates("/签到" if use_command_start else "签到") == set()
+  assert parser not in index
+
+
+@pytest.mark.parametrize("use_command_start", [True, False])
+def test_compact_candidates(use_command_start: bool) -> None:
+  index = CommandIndex()
+  parser = make_parser("今日运势", use_command_start, compact=True)
+  index.add(parser, ())
+  word = "/今日运势abc" if use_command_start else "今日运势abc"
+  assert index.candidates(word) == {parser.path}
+  assert index.candidates("运势") == set()
+
+
+@pytest.mark.parametrize("use_command_start", [True, False])
+def test_shortcut_candidates(use_command_start: bool) -> None:
+  index = CommandIndex()
+  parser = make_parser("抽签", use_command_start)
+  index.add(parser, ())
+  word = "/来一签" if use_command_start else "来一签"
+  assert index.candidates(word) == set()
+  # 快捷命令可以在运行时添加，添加之后必须能被找到
+  parser.shortcut("来一签", {"prefix": True})
+  assert parser.parse(word).matched
+  assert parser.path in index.candidates(word)
+  parser.shortcut("来一签", delete=True)
+  assert index.candidates(word) == set()